@@ -0,0 +1,318 @@
+"""
+Admin bulk jobs on the todos of one user: purge them, or reassign them to
+another user (started when an admin deactivates the user).
+
+A job works in small chunks, each one its own short transaction, with a
+pause between chunks, so an account with millions of todos never holds the
+write lock for long. Each chunk is complete on its own: a cancelled (or
+failed) job leaves every todo either fully processed or untouched, and can
+be started again for the rest.
+
+The hot table is processed first, then the archive, so a todo archived
+while the job runs is still reached. Every chunk writes tombstones for the
+todos leaving the user, so clients drop them through delta sync. A
+reassigned todo gets a new version, so the new owner's clients fetch it.
+"""
+# == Import necessary libraries ==
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import bindparam, delete, exists, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from .changes import record_tombstones, reserve_versions
+from .events import event_hub
+from .metrics import metrics
+from .models import AdminJobRecords, Todos, TodosArchive
+from .next_cache import next_todos_cache
+
+logger = logging.getLogger(__name__)
+
+# Settings (can be overridden through environment variables)
+# Todos processed per transaction
+ADMIN_JOB_CHUNK_SIZE = int(os.getenv("TODO_ADMIN_JOB_CHUNK_SIZE", "500"))
+# Pause between two chunks, lets request writers take the write lock (milliseconds)
+ADMIN_JOB_CHUNK_PAUSE_MS = float(os.getenv("TODO_ADMIN_JOB_CHUNK_PAUSE_MS", "50"))
+# Finished jobs kept for GET /admin/jobs
+ADMIN_JOB_KEEP = int(os.getenv("TODO_ADMIN_JOB_KEEP", "100"))
+# An unfinished job without progress for this long is reported as failed, its process is gone (seconds)
+ADMIN_JOB_STALE_AFTER = float(os.getenv("TODO_ADMIN_JOB_STALE_AFTER", "300"))
+
+_todos = Todos.__table__
+_archive = TodosArchive.__table__
+
+FINISHED = ("done", "cancelled", "failed")
+
+
+def _ids_of_owner(table, owner_id, chunk_size):
+    return select(table.c.id).where(table.c.owner_id == owner_id).order_by(table.c.id).limit(chunk_size)
+
+
+def count_todos(db, owner_id) -> int:
+    """
+    Hot and archived todos of a user (the total of a job, for its progress).
+    """
+    return sum(
+        db.execute(select(func.count()).select_from(table).where(table.c.owner_id == owner_id)).scalar_one()
+        for table in (_todos, _archive)
+    )
+
+
+def purge_chunk(db, table, owner_id, chunk_size=ADMIN_JOB_CHUNK_SIZE) -> int:
+    """
+    Deletes up to `chunk_size` todos of the user from `table` in one transaction. Returns the count.
+    """
+    deleted = db.execute(
+        delete(table).where(table.c.id.in_(_ids_of_owner(table, owner_id, chunk_size))).returning(table.c.id)
+    ).scalars().all()
+    record_tombstones(db.connection(), [(todo_id, owner_id) for todo_id in deleted])
+    db.commit()
+    return len(deleted)
+
+
+def reassign_chunk(db, table, owner_id, new_owner_id, chunk_size=ADMIN_JOB_CHUNK_SIZE) -> int:
+    """
+    Moves up to `chunk_size` todos of the user in `table` to `new_owner_id` in one transaction. Returns the count.
+    """
+    ids = db.scalars(_ids_of_owner(table, owner_id, chunk_size)).all()
+    if not ids:
+        db.rollback()
+        return 0
+
+    connection = db.connection()
+    if table is _todos:
+        # New versions, so the todos show up in the new owner's delta sync
+        first_version = reserve_versions(connection, len(ids))
+        db.execute(
+            update(_todos).where(_todos.c.id == bindparam("b_id"))
+            .values(owner_id=new_owner_id, version=bindparam("b_version"), updated_at=datetime.utcnow()),
+            [{"b_id": todo_id, "b_version": first_version + offset} for offset, todo_id in enumerate(ids)],
+        )
+    else:
+        db.execute(update(table).where(table.c.id.in_(ids)).values(owner_id=new_owner_id))
+    record_tombstones(connection, [(todo_id, owner_id) for todo_id in ids])
+    db.commit()
+    return len(ids)
+
+
+class AdminJob:
+    __slots__ = ("id", "kind", "user_id", "target_id", "status", "total", "done", "chunks",
+                 "created_at", "updated_at", "finished_at", "error", "cancel_requested")
+
+    def __init__(self, kind, user_id, target_id=None, total=0):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.user_id = user_id
+        self.target_id = target_id  # new owner of a reassign job
+        self.status = "pending"
+        self.total = total
+        self.done = 0
+        self.chunks = 0
+        self.created_at = self.updated_at = datetime.utcnow()
+        self.finished_at = None
+        self.error = None
+        self.cancel_requested = False
+
+    @classmethod
+    def from_record(cls, record: AdminJobRecords, stale_after=ADMIN_JOB_STALE_AFTER):
+        job = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(job, name, getattr(record, name))
+        # Not written for a long time: the process running it is gone (crash, kill)
+        if not job.finished and job.updated_at < datetime.utcnow() - timedelta(seconds=stale_after):
+            job.status = "failed"
+            job.error = "Lost, the process running it stopped."
+        return job
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "user_id": self.user_id,
+            "target_id": self.target_id,
+            "status": self.status,
+            "total": self.total,
+            "done": self.done,
+            "progress": round(min(self.done / self.total, 1.0), 4) if self.total else 1.0,
+            "chunks": self.chunks,
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error": self.error,
+        }
+
+
+class AdminJobs:
+    """
+    Registry and runner of the admin jobs.
+
+    The jobs are rows of `admin_jobs`, so every worker process lists them,
+    follows their progress and cancels them, whichever one runs the job.
+    The running job writes its progress after every chunk and reads the
+    cancel flag in the same statement.
+    """
+
+    def __init__(self, chunk_size=ADMIN_JOB_CHUNK_SIZE, chunk_pause_ms=ADMIN_JOB_CHUNK_PAUSE_MS, keep=ADMIN_JOB_KEEP):
+        self.chunk_size = chunk_size
+        self.chunk_pause_ms = chunk_pause_ms
+        self.keep = keep
+        self.running = 0  # jobs run by this process
+
+    def create(self, db, kind, user_id, target_id=None, total=0) -> AdminJob | None:
+        """
+        Records a pending job (the caller commits). Returns None when an unfinished job
+        already touches `user_id`: the check is part of the INSERT, so two workers
+        handling the same deactivation cannot both start a job.
+        """
+        job = AdminJob(kind, user_id, target_id, total)
+        table = AdminJobRecords.__table__
+        values = select(*(literal(getattr(job, name), table.c[name].type) for name in AdminJob.__slots__))
+        inserted = db.execute(
+            insert(table).from_select(list(AdminJob.__slots__), values.where(~exists(self._unfinished(user_id))))
+        ).rowcount
+        if not inserted:
+            return None
+
+        # Forget the oldest finished jobs
+        kept = select(AdminJobRecords.id).order_by(AdminJobRecords.created_at.desc()).limit(self.keep)
+        db.execute(delete(AdminJobRecords).where(AdminJobRecords.status.in_(FINISHED))
+                   .where(AdminJobRecords.id.not_in(kept)))
+        return job
+
+    @staticmethod
+    def _unfinished(user_id, stale_after=ADMIN_JOB_STALE_AFTER):
+        # Unfinished jobs on the todos of `user_id`, except the lost ones (see AdminJob.from_record)
+        return select(AdminJobRecords.id).where(AdminJobRecords.status.not_in(FINISHED)) \
+            .where(AdminJobRecords.updated_at >= datetime.utcnow() - timedelta(seconds=stale_after)) \
+            .where((AdminJobRecords.user_id == user_id) | (AdminJobRecords.target_id == user_id))
+
+    def get(self, db, job_id) -> AdminJob | None:
+        record = db.get(AdminJobRecords, job_id)
+        return AdminJob.from_record(record) if record is not None else None
+
+    def list(self, db):
+        records = db.scalars(select(AdminJobRecords).order_by(AdminJobRecords.created_at.desc()).limit(self.keep))
+        return [AdminJob.from_record(record).to_dict() for record in records]
+
+    def active_for(self, db, user_id) -> AdminJob | None:
+        """
+        The unfinished job touching the todos of `user_id`, if any.
+        """
+        record = db.scalars(select(AdminJobRecords).where(AdminJobRecords.id.in_(self._unfinished(user_id)))).first()
+        return AdminJob.from_record(record) if record is not None else None
+
+    def cancel(self, db, job: AdminJob):
+        """
+        Asks the job to stop, it does after the chunk in progress (in any process).
+        """
+        db.execute(update(AdminJobRecords).where(AdminJobRecords.id == job.id)
+                   .where(AdminJobRecords.status.not_in(FINISHED)).values(cancel_requested=True))
+        db.commit()
+        job.cancel_requested = True
+
+    def _save(self, db, job: AdminJob):
+        """
+        Writes the progress of the job, returns whether it was asked to stop meanwhile.
+        """
+        job.updated_at = datetime.utcnow()
+        cancel_requested = db.execute(
+            update(AdminJobRecords).where(AdminJobRecords.id == job.id)
+            .values(status=job.status, done=job.done, chunks=job.chunks, error=job.error,
+                    updated_at=job.updated_at, finished_at=job.finished_at)
+            .returning(AdminJobRecords.cancel_requested)
+        ).scalar()
+        db.commit()
+        return bool(cancel_requested)
+
+    def _save_in_thread(self, job, bind):
+        def save():
+            with Session(bind) as db:
+                return self._save(db, job)
+        return run_in_threadpool(save)
+
+    async def run(self, job: AdminJob, bind):
+        """
+        Runs the job chunk by chunk, each chunk in a worker thread with its own session on `bind`.
+        """
+        job.status = "running"
+        self.running += 1
+        try:
+            # Cancelled before it started
+            job.cancel_requested = await self._save_in_thread(job, bind)
+            for table in (_todos, _archive):
+                if not await self._run_table(job, bind, table):
+                    job.status = "cancelled"
+                    break
+            else:
+                job.status = "done"
+        except asyncio.CancelledError:
+            # Server shutdown, the committed chunks stay
+            job.status = "cancelled"
+            raise
+        except Exception as error:
+            logger.exception("Admin job %s (%s of user %s) failed", job.id, job.kind, job.user_id)
+            job.status = "failed"
+            job.error = str(error)
+        finally:
+            self.running -= 1
+            job.finished_at = datetime.utcnow()
+            metrics.inc(f"admin_jobs.{job.status}")
+            try:
+                await self._save_in_thread(job, bind)
+            except Exception:
+                logger.exception("Could not save the end of admin job %s", job.id)
+
+        # The new owner's clients catch up with /todo/changes
+        if job.kind == "reassign" and job.done and event_hub.has_subscribers(job.target_id):
+            event_hub.publish(job.target_id, "reassigned", {"count": job.done, "from_user_id": job.user_id})
+
+    async def _run_table(self, job, bind, table) -> bool:
+        """
+        Processes every todo of the user in `table`. Returns False when the job was cancelled.
+        """
+        while True:
+            if job.cancel_requested:
+                return False
+
+            # Step 1: One chunk in a worker thread, with its own session and transaction,
+            # then the progress (which tells whether an admin cancelled the job meanwhile)
+            def run_chunk():
+                with Session(bind) as db:
+                    if job.kind == "purge":
+                        count = purge_chunk(db, table, job.user_id, self.chunk_size)
+                    else:
+                        count = reassign_chunk(db, table, job.user_id, job.target_id, self.chunk_size)
+                    job.done += count
+                    job.chunks += 1
+                    return count, self._save(db, job)
+
+            started = time.perf_counter()
+            count, job.cancel_requested = await run_in_threadpool(run_chunk)
+            metrics.observe("admin_jobs.chunk_ms", (time.perf_counter() - started) * 1000)
+
+            # Step 2: The cached top todos of both users are outdated
+            next_todos_cache.invalidate(job.user_id)
+            if job.target_id is not None:
+                next_todos_cache.invalidate(job.target_id)
+            if count < self.chunk_size:
+                return True
+
+            # Step 3: Give the writers a turn before the next chunk
+            await asyncio.sleep(self.chunk_pause_ms / 1000)
+
+    def stats(self):
+        return {"running": self.running}
+
+
+# Shared job registry used by the admin router
+admin_jobs = AdminJobs()
+metrics.register_collector("admin_jobs", admin_jobs.stats)
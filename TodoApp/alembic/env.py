@@ -1,3 +1,5 @@
+import os
+import sys
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
@@ -5,7 +7,10 @@ from sqlalchemy import pool
 
 from alembic import context
 
-import models 
+# `prepend_sys_path = .` makes TodoApp/ importable (migration scripts import `migration_helpers`).
+# The models use relative imports, so they are imported through the package, from its parent directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from TodoApp import models
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -13,7 +18,9 @@ config = context.config
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
-fileConfig(config.config_file_name)
+# (Skipped when the migrations are run from code without an ini file, e.g. the tests)
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
 
 # add your model's MetaData object here
 # for 'autogenerate' support
@@ -45,6 +52,8 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        # SQLite cannot ALTER most columns, let autogenerate emit batch (copy and move) operations
+        render_as_batch=True,
     )
 
     with context.begin_transaction():
@@ -66,7 +75,11 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata,
+            # SQLite cannot ALTER most columns, let autogenerate emit batch (copy and move) operations
+            render_as_batch=True,
+            # One transaction per migration, chunked data migrations (migration_helpers) commit as they go
+            transaction_per_migration=True,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,57 @@
+"""Add change versions and tombstones to todos
+
+Revision ID: a7e2c4f81b90
+Revises: 3c1f7a9d2e54
+Create Date: 2026-10-19 10:02:17.554120
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7e2c4f81b90'
+down_revision: Union[str, None] = '3c1f7a9d2e54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("todos", sa.Column("version", sa.Integer(), nullable=True))
+    op.add_column("todos", sa.Column("updated_at", sa.DateTime(), nullable=True))
+    op.create_index("ix_todos_owner_id_version", "todos", ["owner_id", "version"])
+
+    # Existing todos: version 0 sorts before every real change, so a full sync (`since=0`) returns them.
+    # Their last write time is unknown, archival counts their age from this migration
+    todos = sa.table("todos", sa.column("version", sa.Integer()), sa.column("updated_at", sa.DateTime()))
+    op.execute(todos.update().values(version=0, updated_at=datetime.utcnow()))
+
+    op.create_table(
+        "todo_tombstones",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("todo_id", sa.Integer(), nullable=True),
+        sa.Column("owner_id", sa.Integer(), nullable=True),
+        sa.Column("version", sa.Integer(), nullable=True),
+        sa.Column("deleted_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_todo_tombstones_id", "todo_tombstones", ["id"])
+    op.create_index("ix_todo_tombstones_owner_id_version", "todo_tombstones", ["owner_id", "version"])
+
+    op.create_table(
+        "change_counter",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("value", sa.Integer(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("change_counter")
+    op.drop_index("ix_todo_tombstones_owner_id_version", table_name="todo_tombstones")
+    op.drop_index("ix_todo_tombstones_id", table_name="todo_tombstones")
+    op.drop_table("todo_tombstones")
+    op.drop_index("ix_todos_owner_id_version", table_name="todos")
+    op.drop_column("todos", "updated_at")
+    op.drop_column("todos", "version")
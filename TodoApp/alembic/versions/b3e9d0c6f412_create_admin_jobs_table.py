@@ -0,0 +1,43 @@
+"""Create admin jobs table
+
+Revision ID: b3e9d0c6f412
+Revises: c8f1a2d7e395
+Create Date: 2026-10-19 18:42:10.581336
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e9d0c6f412'
+down_revision: Union[str, None] = 'c8f1a2d7e395'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "admin_jobs",
+        sa.Column("id", sa.String(length=12), primary_key=True),
+        sa.Column("kind", sa.String(), nullable=True),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("target_id", sa.Integer(), nullable=True),
+        sa.Column("status", sa.String(), nullable=True),
+        sa.Column("total", sa.Integer(), nullable=True),
+        sa.Column("done", sa.Integer(), nullable=True),
+        sa.Column("chunks", sa.Integer(), nullable=True),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column("cancel_requested", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_admin_jobs_status", "admin_jobs", ["status"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_admin_jobs_status", table_name="admin_jobs")
+    op.drop_table("admin_jobs")
@@ -0,0 +1,79 @@
+"""Never reuse todo ids (AUTOINCREMENT)
+
+Revision ID: c8f1a2d7e395
+Revises: f0c3b8a61e27
+Create Date: 2026-10-19 18:05:43.219874
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migration_helpers import online_rebuild_table
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8f1a2d7e395'
+down_revision: Union[str, None] = 'f0c3b8a61e27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+UPGRADE_JOB = "c8f1a2d7e395_todos_autoincrement"
+DOWNGRADE_JOB = "c8f1a2d7e395_todos_autoincrement_downgrade"
+
+
+def _todos_table(autoincrement: bool) -> sa.Table:
+    """
+    The todos table under the name `todos_new`, with the indexes of the model.
+    """
+    metadata = sa.MetaData()
+    sa.Table("users", metadata, sa.Column("id", sa.Integer(), primary_key=True))
+    todos = sa.Table(
+        "todos_new", metadata,
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String()),
+        sa.Column("description", sa.String()),
+        sa.Column("priority", sa.Integer()),
+        sa.Column("complete", sa.Boolean()),
+        sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("version", sa.Integer()),
+        sa.Column("updated_at", sa.DateTime()),
+        sqlite_autoincrement=autoincrement,
+    )
+    # Same names as the old table's indexes, online_rebuild_table creates them after the swap
+    sa.Index("ix_todos_id", todos.c.id)
+    sa.Index("ix_todos_owner_id_version", todos.c.owner_id, todos.c.version)
+    sa.Index("ix_todos_owner_id_complete_priority",
+             todos.c.owner_id, todos.c.complete, todos.c.priority.desc(), todos.c.id)
+    return todos
+
+
+def upgrade() -> None:
+    # A plain INTEGER PRIMARY KEY gives the id of the highest deleted or archived todo to the
+    # next new todo. The archive, the tombstones and the clients still know that id.
+    # SQLite cannot add AUTOINCREMENT to a table, so the table is rebuilt (chunked copy)
+    online_rebuild_table(UPGRADE_JOB, "todos", _todos_table(autoincrement=True))
+
+    # New ids start above every id already handed out, archived and deleted todos included
+    op.execute(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT 'todos', 0 "
+        "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'todos')"
+    )
+    op.execute(
+        "UPDATE sqlite_sequence SET seq = MAX(seq, "
+        "(SELECT COALESCE(MAX(id), 0) FROM todos_archive), "
+        "(SELECT COALESCE(MAX(todo_id), 0) FROM todo_tombstones)) "
+        "WHERE name = 'todos'"
+    )
+    # A later downgrade runs its rebuild again
+    op.execute(f"DELETE FROM migration_progress WHERE name = '{DOWNGRADE_JOB}'")
+
+
+def downgrade() -> None:
+    # Back to a plain INTEGER PRIMARY KEY (ids of deleted and archived todos can be reused again).
+    # Dropping the AUTOINCREMENT table also drops its sqlite_sequence row
+    online_rebuild_table(DOWNGRADE_JOB, "todos", _todos_table(autoincrement=False))
+    # A later upgrade runs its rebuild again
+    op.execute(f"DELETE FROM migration_progress WHERE name = '{UPGRADE_JOB}'")
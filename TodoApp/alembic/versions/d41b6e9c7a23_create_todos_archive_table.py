@@ -0,0 +1,42 @@
+"""Create todos archive table
+
+Revision ID: d41b6e9c7a23
+Revises: a7e2c4f81b90
+Create Date: 2026-10-19 14:21:05.318402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41b6e9c7a23'
+down_revision: Union[str, None] = 'a7e2c4f81b90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "todos_archive",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(), nullable=True),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("priority", sa.Integer(), nullable=True),
+        sa.Column("complete", sa.Boolean(), nullable=True),
+        sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("version", sa.Integer(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("archived_at", sa.DateTime(), nullable=True),
+        sa.Column("archive_month", sa.String(length=7), nullable=True),
+    )
+    op.create_index("ix_todos_archive_owner_id", "todos_archive", ["owner_id"])
+    op.create_index("ix_todos_archive_archive_month", "todos_archive", ["archive_month"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_todos_archive_archive_month", table_name="todos_archive")
+    op.drop_index("ix_todos_archive_owner_id", table_name="todos_archive")
+    op.drop_table("todos_archive")
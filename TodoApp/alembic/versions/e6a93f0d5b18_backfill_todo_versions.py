@@ -0,0 +1,36 @@
+"""Backfill change versions and write times of todos created before versioning
+
+Revision ID: e6a93f0d5b18
+Revises: d41b6e9c7a23
+Create Date: 2026-10-19 15:48:40.902716
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migration_helpers import chunked_backfill
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6a93f0d5b18'
+down_revision: Union[str, None] = 'd41b6e9c7a23'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Databases upgraded before a7e2c4f81b90 had its own backfill still have rows with a NULL
+    # version (missed by /todo/changes) and a NULL updated_at (never archived).
+    # Version 0 sorts before every real change, so a full sync still returns them.
+    todos = sa.table("todos", sa.column("id"), sa.column("version"), sa.column("updated_at", sa.DateTime()))
+    chunked_backfill("e6a93f0d5b18_todos_version", todos, {"version": 0}, where=todos.c.version.is_(None))
+    chunked_backfill("e6a93f0d5b18_todos_updated_at", todos, {"updated_at": datetime.utcnow()},
+                     where=todos.c.updated_at.is_(None))
+
+
+def downgrade() -> None:
+    # Nothing to undo, version 0 and NULL mean the same for clients
+    pass
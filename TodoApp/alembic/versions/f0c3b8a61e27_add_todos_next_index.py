@@ -0,0 +1,29 @@
+"""Add the index of the next todos query
+
+Revision ID: f0c3b8a61e27
+Revises: e6a93f0d5b18
+Create Date: 2026-10-19 16:37:12.640391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f0c3b8a61e27'
+down_revision: Union[str, None] = 'e6a93f0d5b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_todos_owner_id_complete_priority", "todos",
+        ["owner_id", "complete", sa.text("priority DESC"), "id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_todos_owner_id_complete_priority", table_name="todos")
@@ -0,0 +1,157 @@
+"""
+Hot / cold archival of completed todos.
+
+Completed todos that have not changed for `ARCHIVE_AFTER_DAYS` are moved from
+the hot `todos` table to `todos_archive`, so per-user reads and the todos
+B-tree only hold live work.
+
+The move runs in small chunks, each one its own short transaction
+(DELETE ... RETURNING, then INSERT into the archive), with a pause between
+chunks so request writers never wait behind one long archival transaction.
+The chunks walk the primary key with a cursor, so a pass reads each hot row
+at most once and no extra index on `todos` is needed.
+
+Archiving is not a change for delta sync: the todo is unchanged and still
+readable with `include_archived` and by id, so no tombstone is written.
+Updating an archived todo by id moves it back to the hot table.
+"""
+# == Import necessary libraries ==
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, insert, select
+
+from .metrics import metrics
+from .models import Todos, TodosArchive
+
+logger = logging.getLogger(__name__)
+
+# Settings (can be overridden through environment variables)
+# Completed todos untouched for this many days are archived (0 disables archival)
+ARCHIVE_AFTER_DAYS = float(os.getenv("TODO_ARCHIVE_AFTER_DAYS", "30"))
+# Rows moved per transaction
+ARCHIVE_CHUNK_SIZE = int(os.getenv("TODO_ARCHIVE_CHUNK_SIZE", "500"))
+# Pause between two chunks, lets request writers take the write lock (milliseconds)
+ARCHIVE_CHUNK_PAUSE_MS = float(os.getenv("TODO_ARCHIVE_CHUNK_PAUSE_MS", "50"))
+# Seconds between two archival passes
+ARCHIVE_INTERVAL = float(os.getenv("TODO_ARCHIVE_INTERVAL", "3600"))
+
+_todos = Todos.__table__
+_archive = TodosArchive.__table__
+_columns = [column.name for column in _todos.columns]
+
+
+def archive_month(updated_at) -> str | None:
+    return updated_at.strftime("%Y-%m") if updated_at is not None else None
+
+
+def archive_chunk(db, cutoff: datetime, after_id: int = 0, chunk_size: int = ARCHIVE_CHUNK_SIZE):
+    """
+    Moves up to `chunk_size` completed todos last written before `cutoff`
+    (with an id above `after_id`) in one transaction.
+    Returns (rows moved, last id seen), the id is the cursor of the next chunk.
+    """
+    # Step 1: The next candidates, walking the primary key from the cursor
+    candidates = select(_todos.c.id).where(_todos.c.id > after_id) \
+        .where(_todos.c.complete == True).where(_todos.c.updated_at < cutoff) \
+        .order_by(_todos.c.id).limit(chunk_size)
+
+    # Step 2: Remove them from the hot table, re-checking the condition in the same statement,
+    # so a todo reopened meanwhile stays where it is
+    rows = db.execute(
+        delete(_todos).where(_todos.c.id.in_(candidates))
+        .where(_todos.c.complete == True).where(_todos.c.updated_at < cutoff)
+        .returning(*_todos.columns)
+    ).mappings().all()
+    if not rows:
+        db.rollback()
+        return 0, after_id
+
+    # Step 3: Write them to the archive with their partition key, same transaction
+    now = datetime.utcnow()
+    db.execute(insert(_archive), [
+        {**{name: row[name] for name in _columns}, "archived_at": now, "archive_month": archive_month(row["updated_at"])}
+        for row in rows
+    ])
+    db.commit()
+    return len(rows), max(row["id"] for row in rows)
+
+
+class Archiver:
+    """
+    Background job running archival passes every `interval` seconds.
+    """
+
+    def __init__(self, after_days=ARCHIVE_AFTER_DAYS, chunk_size=ARCHIVE_CHUNK_SIZE,
+                 chunk_pause_ms=ARCHIVE_CHUNK_PAUSE_MS, interval=ARCHIVE_INTERVAL):
+        self.after_days = after_days
+        self.chunk_size = chunk_size
+        self.chunk_pause_ms = chunk_pause_ms
+        self.interval = interval
+        self.last_run = None
+        self.last_moved = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.after_days > 0
+
+    async def run_once(self, session_factory, now: datetime | None = None) -> int:
+        """
+        Archives every eligible todo, chunk by chunk. Returns the number of rows moved.
+        """
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.after_days)
+        moved = 0
+        cursor = 0
+
+        while True:
+            # Step 1: One chunk in a worker thread, with its own session and transaction
+            def run_chunk():
+                db = session_factory()
+                try:
+                    return archive_chunk(db, cutoff, cursor, self.chunk_size)
+                finally:
+                    db.close()
+
+            started = time.perf_counter()
+            count, cursor = await run_in_threadpool(run_chunk)
+            metrics.observe("archive.chunk_ms", (time.perf_counter() - started) * 1000)
+            moved += count
+            metrics.inc("archive.moved", count)
+            if count < self.chunk_size:
+                break
+
+            # Step 2: Give the writers a turn before the next chunk
+            await asyncio.sleep(self.chunk_pause_ms / 1000)
+
+        self.last_run = datetime.utcnow()
+        self.last_moved = moved
+        return moved
+
+    async def run_loop(self, session_factory):
+        """
+        Background task: one archival pass every `interval` seconds.
+        """
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                moved = await self.run_once(session_factory)
+                if moved:
+                    logger.info("Archived %d completed todos", moved)
+            except Exception:
+                logger.exception("Could not archive completed todos")
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "last_moved": self.last_moved,
+        }
+
+
+# Shared archiver started by the app lifespan
+archiver = Archiver()
+metrics.register_collector("archive", archiver.stats)
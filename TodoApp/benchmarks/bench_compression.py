@@ -0,0 +1,71 @@
+"""
+Bytes-on-wire and CPU cost of response compression on a 10k-todo payload.
+
+Run from the repository root:
+    python -m TodoApp.benchmarks.bench_compression
+"""
+# == Import necessary libraries ==
+import json
+import time
+
+from ..compression import available_encodings, make_encoder
+
+TODO_COUNT = 10_000
+REPEAT = 5
+CHUNK_SIZE = 16 * 1024
+
+
+def build_payload(count=TODO_COUNT):
+    todos = [
+        {
+            "id": i,
+            "title": f"todo number {i}",
+            "description": "need to learn everyday!",
+            "priority": i % 5 + 1,
+            "complete": i % 3 == 0,
+            "owner_id": i % 50 + 1,
+        }
+        for i in range(1, count + 1)
+    ]
+    return json.dumps(todos).encode("utf-8")
+
+
+def measure(encoding, payload, streaming, **levels):
+    # CPU time only (process_time), averaged over REPEAT runs
+    started = time.process_time()
+    for _ in range(REPEAT):
+        encoder = make_encoder(encoding, **levels)
+        if streaming:
+            size = 0
+            chunks = [payload[i:i + CHUNK_SIZE] for i in range(0, len(payload), CHUNK_SIZE)]
+            for chunk in chunks[:-1]:
+                size += len(encoder.compress(chunk))
+            size += len(encoder.finish(chunks[-1]))
+        else:
+            size = len(encoder.finish(payload))
+    cpu_ms = (time.process_time() - started) / REPEAT * 1000
+    return size, cpu_ms
+
+
+def main():
+    payload = build_payload()
+    print(f"payload: {TODO_COUNT} todos, {len(payload):,} bytes raw\n")
+    print(f"{'encoding':<10}{'level':>6}{'mode':>11}{'bytes':>12}{'ratio':>8}{'cpu ms':>9}{'MB/s':>9}")
+
+    settings = {
+        "gzip": [("gzip_level", level) for level in (1, 6, 9)],
+        "br": [("brotli_quality", level) for level in (1, 4, 11)],
+        "zstd": [("zstd_level", level) for level in (1, 3, 19)],
+    }
+    for encoding in available_encodings():
+        for name, level in settings[encoding]:
+            for streaming in (False, True):
+                size, cpu_ms = measure(encoding, payload, streaming, **{name: level})
+                throughput = len(payload) / (cpu_ms / 1000) / 1e6 if cpu_ms else float("inf")
+                mode = f"chunk{CHUNK_SIZE // 1024}k" if streaming else "whole"
+                print(f"{encoding:<10}{level:>6}{mode:>11}{size:>12,}{len(payload) / size:>8.1f}"
+                      f"{cpu_ms:>9.2f}{throughput:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
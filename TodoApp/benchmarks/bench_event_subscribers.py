@@ -0,0 +1,59 @@
+"""
+Memory per idle subscriber of the todo event hub, and fan-out cost.
+
+Run from the repository root:
+    python -m TodoApp.benchmarks.bench_event_subscribers
+"""
+# == Import necessary libraries ==
+import asyncio
+import gc
+import time
+import tracemalloc
+
+from ..events import EventHub
+
+SUBSCRIBER_COUNTS = (1_000, 5_000, 10_000)
+USERS = 100
+
+
+async def measure(count):
+    hub = EventHub(queue_size=100, heartbeat_interval=3600)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    # Step 1: Open `count` idle streams, each one parked waiting for an event
+    async def consume(stream):
+        async for _ in stream:
+            pass
+
+    streams = [hub.stream(hub.subscribe(i % USERS)) for i in range(count)]
+    tasks = [asyncio.create_task(consume(stream)) for stream in streams]
+    await asyncio.sleep(0.1)
+
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # Step 2: Fan one event out to every stream of one user
+    started = time.perf_counter()
+    for user_id in range(USERS):
+        hub.publish(user_id, "updated", {"id": 1, "version": 1})
+    publish_us = (time.perf_counter() - started) / USERS * 1e6
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return (after - before) / count, publish_us
+
+
+def main():
+    print(f"{'subscribers':>12}{'bytes/sub':>12}{'publish us/user':>18}")
+    for count in SUBSCRIBER_COUNTS:
+        per_subscriber, publish_us = asyncio.run(measure(count))
+        print(f"{count:>12,}{per_subscriber:>12,.0f}{publish_us:>18,.1f}")
+
+
+if __name__ == "__main__":
+    main()
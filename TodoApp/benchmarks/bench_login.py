@@ -0,0 +1,58 @@
+"""
+Login throughput per CPU core for each bcrypt cost, and the cost the
+startup calibration picks on this machine.
+
+A login is one user lookup plus one bcrypt verify, the verify dominates.
+Logins run in worker threads (bcrypt releases the GIL), so the whole
+machine serves about `logins/s per core x TODO_HASHING_CONCURRENCY`.
+
+Run from the repository root:
+    python -m TodoApp.benchmarks.bench_login
+"""
+# == Import necessary libraries ==
+import os
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from .. import passwords
+from ..database import Base
+from ..models import Users
+from ..routers.auth import _auth_user
+
+ROUNDS = range(8, 15)
+# Logins timed per cost, at least
+MIN_LOGINS = 3
+MIN_SECONDS = 1.0
+
+
+def measure(db, rounds):
+    db.query(Users).update({"hashed_password": passwords.hash_with_rounds("secret", rounds)})
+    db.commit()
+    logins, started = 0, time.perf_counter()
+    while logins < MIN_LOGINS or time.perf_counter() - started < MIN_SECONDS:
+        assert _auth_user("bench", "secret", db)
+        logins += 1
+    return (time.perf_counter() - started) / logins * 1000
+
+
+def main():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    calibrated = passwords.calibrate()
+    print(f"calibrated cost: {calibrated} (target {passwords.PASSWORD_TARGET_MS:.0f} ms, "
+          f"estimated {passwords.stats['estimated_verify_ms']} ms), {os.cpu_count()} cores")
+
+    print(f"{'cost':>4}{'login ms':>11}{'logins/s/core':>15}")
+    with Session(engine) as db:
+        db.add(Users(username="bench", email="bench@xyz.com", role="user"))
+        db.commit()
+        for rounds in ROUNDS:
+            login_ms = measure(db, rounds)
+            marker = "  <- calibrated" if rounds == calibrated else ""
+            print(f"{rounds:>4}{login_ms:>11.1f}{1000 / login_ms:>15.1f}{marker}")
+
+
+if __name__ == "__main__":
+    main()
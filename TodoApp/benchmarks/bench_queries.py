@@ -0,0 +1,72 @@
+"""
+Python-side cost per query of the hot lookups: legacy `db.query(...).filter(...)`
+against the prebuilt statements of `TodoApp.queries`, with and without the
+engine's compiled cache.
+
+Run from the repository root:
+    python -m TodoApp.benchmarks.bench_queries
+"""
+# == Import necessary libraries ==
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from .. import queries
+from ..database import Base
+from ..models import Todos, Users
+
+ITERATIONS = 5_000
+ROUNDS = 3
+
+
+def make_engine(query_cache_size):
+    engine = create_engine("sqlite://", query_cache_size=query_cache_size)
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(Users(username="bench", email="bench@xyz.com", role="user"))
+        db.add_all(Todos(title=f"todo {i}", description="bench", priority=1 + i % 5, complete=False, owner_id=1)
+                   for i in range(20))
+        db.commit()
+    return engine
+
+
+LOOKUPS = {
+    "todo by id and owner": (
+        lambda db: db.query(Todos).filter(Todos.id == 7).filter(Todos.owner_id == 1).first(),
+        lambda db: db.scalars(queries.todo_of_owner, {"todo_id": 7, "owner_id": 1}).first(),
+    ),
+    "user by id": (
+        lambda db: db.query(Users).filter(Users.id == 1).first(),
+        lambda db: db.scalars(queries.user_by_id, {"user_id": 1}).first(),
+    ),
+    "todos of owner": (
+        lambda db: db.query(Todos).filter(Todos.owner_id == 1).all(),
+        lambda db: db.scalars(queries.todos_of_owner, {"owner_id": 1}).all(),
+    ),
+}
+
+
+def measure(engine, lookup):
+    # Best of a few rounds, objects are expunged each time so every call loads its rows
+    best = float("inf")
+    with Session(engine) as db:
+        for _ in range(ROUNDS):
+            started = time.perf_counter()
+            for _ in range(ITERATIONS):
+                lookup(db)
+                db.expunge_all()
+            best = min(best, (time.perf_counter() - started) / ITERATIONS)
+    return best * 1e6
+
+
+def main():
+    cached, uncached = make_engine(500), make_engine(0)
+    print(f"{'query':<24}{'legacy us':>11}{'prebuilt us':>13}{'no cache us':>13}")
+    for name, (legacy, prebuilt) in LOOKUPS.items():
+        print(f"{name:<24}{measure(cached, legacy):>11.1f}{measure(cached, prebuilt):>13.1f}"
+              f"{measure(uncached, legacy):>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Throughput of `python -m TodoApp.serve` for a growing number of workers.
+
+For each worker count, the launcher is started on a fresh database, one user
+with 20 todos is created, and client processes send authenticated
+GET /todo requests on keep-alive connections for a few seconds.
+Scaling stops at the number of cores (the client processes use some too).
+
+Run from the repository root:
+    python -m TodoApp.benchmarks.bench_workers [max workers]
+"""
+# == Import necessary libraries ==
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CLIENTS = 8
+DURATION = 5.0
+TODOS = 20
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def request(connection, method, path, body=None, headers=None):
+    connection.request(method, path, body=body, headers=headers or {})
+    response = connection.getresponse()
+    data = response.read()
+    return response.status, data
+
+
+def wait_ready(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            if request(connection, "GET", "/")[0] == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("the server did not start")
+
+
+def setup(port) -> str:
+    """
+    Creates the user and its todos, returns an access token.
+    """
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    user = {"username": "bench", "email": "bench@xyz.com", "first_name": "b", "last_name": "b",
+            "password": "secret", "role": "user", "phone_number": "1"}
+    request(connection, "POST", "/auth", json.dumps(user), {"Content-Type": "application/json"})
+    _, data = request(connection, "POST", "/auth/token", urlencode({"username": "bench", "password": "secret"}),
+                      {"Content-Type": "application/x-www-form-urlencoded"})
+    token = json.loads(data)["access_token"]
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    for i in range(TODOS):
+        todo = {"title": f"todo {i}", "description": "benchmark", "priority": 1 + i % 5, "complete": False}
+        request(connection, "POST", "/todo", json.dumps(todo), headers)
+    return token
+
+
+def client(port, token, deadline, results):
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    headers = {"Authorization": f"Bearer {token}"}
+    count = 0
+    while time.time() < deadline:
+        status, _ = request(connection, "GET", "/todo", headers=headers)
+        assert status == 200, status
+        count += 1
+    results.put(count)
+
+
+def measure(workers) -> float:
+    port = free_port()
+    env = {**os.environ, "PYTHONPATH": ROOT, "TODO_PASSWORD_ROUNDS": "4"}
+    with tempfile.TemporaryDirectory() as directory:
+        server = subprocess.Popen(
+            [sys.executable, "-m", "TodoApp.serve", "--workers", str(workers), "--port", str(port),
+             "--no-access-log", "--log-level", "warning"],
+            cwd=directory, env=env,
+        )
+        try:
+            wait_ready(port)
+            token = setup(port)
+            results = multiprocessing.Queue()
+            deadline = time.time() + DURATION
+            clients = [multiprocessing.Process(target=client, args=(port, token, deadline, results))
+                       for _ in range(CLIENTS)]
+            for process in clients:
+                process.start()
+            total = sum(results.get() for _ in clients)
+            for process in clients:
+                process.join()
+            return total / DURATION
+        finally:
+            server.terminate()
+            server.wait(timeout=60)
+
+
+def main():
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else max(4, os.cpu_count() or 1)
+    counts = [1]
+    while counts[-1] * 2 <= max_workers:
+        counts.append(counts[-1] * 2)
+
+    print(f"{os.cpu_count()} cores, {CLIENTS} client processes, GET /todo ({TODOS} todos)")
+    print(f"{'workers':>7}{'req/s':>10}{'speedup':>9}")
+    baseline = None
+    for workers in counts:
+        rate = measure(workers)
+        baseline = baseline or rate
+        print(f"{workers:>7}{rate:>10.0f}{rate / baseline:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Precompresses the static assets served under /static.
+
+Writes `name.gz` (and `name.br` when the `brotli` package is installed)
+next to every compressible file, at the highest levels: this runs once
+per build, not per request. Up-to-date variants are skipped. A variant
+that is not smaller than its file is removed.
+
+Run from the repository root:
+    python -m TodoApp.build_static [directory]
+"""
+# == Import necessary libraries ==
+import gzip
+import os
+import sys
+from mimetypes import guess_type
+
+from .compression import COMPRESSIBLE_TYPES, brotli
+
+# Default directory, the one mounted by main.py
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
+# Files smaller than this are not worth a variant (bytes)
+MIN_SIZE = 256
+
+VARIANT_SUFFIXES = (".gz", ".br")
+
+
+def _compressors():
+    compressors = {".gz": lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressors[".br"] = lambda data: brotli.compress(data, quality=11)
+    return compressors
+
+
+def _is_compressible(path):
+    media_type = guess_type(path)[0] or ""
+    return media_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def precompress(directory=STATIC_DIR, log=print):
+    """
+    Writes the missing or outdated variants. Returns (files written, bytes before, bytes after).
+    """
+    compressors = _compressors()
+    written, size_in, size_out = 0, 0, 0
+
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            if name.endswith(VARIANT_SUFFIXES) or not _is_compressible(path):
+                continue
+            source_stat = os.stat(path)
+            if source_stat.st_size < MIN_SIZE:
+                continue
+
+            data = None
+            for suffix, compress in compressors.items():
+                variant = path + suffix
+                # Step 1: Skip variants at least as new as their file
+                if os.path.exists(variant) and os.stat(variant).st_mtime_ns >= source_stat.st_mtime_ns:
+                    continue
+
+                # Step 2: Compress, keep the variant only when it is smaller
+                if data is None:
+                    with open(path, "rb") as file:
+                        data = file.read()
+                compressed = compress(data)
+                if len(compressed) >= len(data):
+                    if os.path.exists(variant):
+                        os.remove(variant)
+                    continue
+                with open(variant, "wb") as file:
+                    file.write(compressed)
+                written += 1
+                size_in += len(data)
+                size_out += len(compressed)
+                log(f"{os.path.relpath(variant, directory)}: {len(data):,} -> {len(compressed):,} bytes")
+
+    return written, size_in, size_out
+
+
+def main():
+    directory = sys.argv[1] if len(sys.argv) > 1 else STATIC_DIR
+    if not os.path.isdir(directory):
+        sys.exit(f"No static directory at {directory}")
+    written, size_in, size_out = precompress(directory)
+    print(f"{written} variants written ({size_in:,} -> {size_out:,} bytes)")
+
+
+if __name__ == "__main__":
+    main()
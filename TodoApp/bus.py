@@ -0,0 +1,163 @@
+"""
+Invalidation bus between the worker processes started by `serve.py`.
+
+Each worker keeps in-memory state that other workers' writes make stale:
+revoked tokens, deactivated users, cached user records, the cached top
+todos, and the event streams of its clients. A worker publishes a small
+message for each such write. The master process relays it to every other
+worker, where the handler registered for its kind applies it locally.
+
+Messages are datagrams on a unix socket pair per worker (one message, one
+datagram, no framing). When a worker falls behind and the master has to
+drop messages for it, the worker later gets a `reset` message and drops
+or reloads all of its cached state.
+
+In a single process (plain `uvicorn TodoApp.main:app`) the bus is not
+attached and `publish` does nothing.
+"""
+# == Import necessary libraries ==
+import json
+import logging
+import threading
+from collections import deque
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Largest message sent on the bus, larger ones are refused (bytes)
+MAX_MESSAGE_BYTES = 64 * 1024
+# Messages queued while the master is not reading, older ones are dropped past this
+MAX_PENDING = 10_000
+
+
+def encode_message(kind, data) -> bytes:
+    return json.dumps({"kind": kind, **data}, separators=(",", ":")).encode("utf-8")
+
+
+def decode_message(raw: bytes):
+    data = json.loads(raw)
+    return data.pop("kind"), data
+
+
+class InvalidationBus:
+    """
+    Worker side of the bus. `attach` is called by `serve.py` in each worker.
+    """
+
+    def __init__(self):
+        self._sock = None
+        self._loop = None
+        self._loop_thread = None
+        self._handlers = {}  # kind -> handler(**data)
+        self._pending = deque()
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+
+    @property
+    def attached(self) -> bool:
+        return self._sock is not None
+
+    def subscribe(self, kind, handler):
+        """
+        Registers the local handler of a message kind, called with the message fields as keyword arguments.
+        """
+        self._handlers[kind] = handler
+
+    def attach(self, sock, loop):
+        sock.setblocking(False)
+        self._sock = sock
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+        loop.add_reader(sock.fileno(), self._on_readable)
+
+    def detach(self):
+        if self._sock is None:
+            return
+        self._loop.remove_reader(self._sock.fileno())
+        if self._pending:
+            self._loop.remove_writer(self._sock.fileno())
+            self._pending.clear()
+        self._sock = None
+
+    def publish(self, kind, **data) -> bool:
+        """
+        Sends a message to the other workers. Returns False when it is too large to be sent.
+        """
+        if self._sock is None:
+            return True
+        message = encode_message(kind, data)
+        if len(message) > MAX_MESSAGE_BYTES:
+            return False
+        if threading.get_ident() != self._loop_thread:
+            self._loop.call_soon_threadsafe(self._send, message)
+        else:
+            self._send(message)
+        return True
+
+    def _send(self, message):
+        if self._sock is None:
+            return
+        if not self._pending:
+            try:
+                self._sock.send(message)
+                self.sent += 1
+                return
+            except BlockingIOError:
+                self._loop.add_writer(self._sock.fileno(), self._flush)
+        # The master is behind, keep the order
+        if len(self._pending) >= MAX_PENDING:
+            self._pending.popleft()
+            self.dropped += 1
+            metrics.inc("bus.dropped")
+        self._pending.append(message)
+
+    def _flush(self):
+        while self._pending:
+            try:
+                self._sock.send(self._pending[0])
+            except BlockingIOError:
+                return
+            self._pending.popleft()
+            self.sent += 1
+        self._loop.remove_writer(self._sock.fileno())
+
+    def _on_readable(self):
+        while self._sock is not None:
+            try:
+                raw = self._sock.recv(MAX_MESSAGE_BYTES)
+            except BlockingIOError:
+                return
+            except OSError:
+                logger.exception("Bus socket failed, detaching")
+                self.detach()
+                return
+            # Nothing sends empty messages: the master closed its end
+            if not raw:
+                logger.warning("Bus closed by the master, detaching")
+                self.detach()
+                return
+            self.received += 1
+            self.dispatch(raw)
+
+    def dispatch(self, raw: bytes):
+        kind = None
+        try:
+            kind, data = decode_message(raw)
+            handler = self._handlers.get(kind)
+            if handler is None:
+                logger.warning("No handler for bus message %r", kind)
+                return
+            handler(**data)
+        except Exception:
+            logger.exception("Could not apply bus message %r", kind)
+
+    def stats(self):
+        return {"attached": self.attached, "sent": self.sent, "received": self.received,
+                "dropped": self.dropped, "pending": len(self._pending)}
+
+
+# Shared bus, attached by serve.py in worker processes
+bus = InvalidationBus()
+metrics.register_collector("bus", bus.stats)
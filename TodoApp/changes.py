@@ -0,0 +1,86 @@
+"""
+Change versions for delta sync.
+
+Every insert / update of a `Todos` row takes the next value of the global
+change counter as its `version`, and every delete leaves a tombstone with
+its own version. A client holding version N asks for rows with version > N.
+
+The counter row is updated inside the writing transaction, so versions are
+issued in commit order (SQLite allows a single writer at a time).
+"""
+# == Import necessary libraries ==
+from datetime import datetime
+
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import object_session
+
+from .models import ChangeCounter, TodoTombstones, Todos
+
+_counter = ChangeCounter.__table__
+_tombstones = TodoTombstones.__table__
+
+
+def reserve_versions(connection, count: int) -> int:
+    """
+    Takes `count` consecutive change versions at once and returns the first one.
+    """
+    # Step 1: Advance the single counter row (takes the write lock first)
+    result = connection.execute(update(_counter).where(_counter.c.id == 1).values(value=_counter.c.value + count))
+
+    # Step 2: First write ever, create the counter row
+    if result.rowcount == 0:
+        connection.execute(insert(_counter).values(id=1, value=count))
+        return 1
+
+    return connection.execute(select(_counter.c.value).where(_counter.c.id == 1)).scalar_one() - count + 1
+
+
+def next_version(connection) -> int:
+    """
+    Increments the change counter and returns the new value.
+    """
+    return reserve_versions(connection, 1)
+
+
+def current_version(db) -> int:
+    """
+    Returns the last issued change version (0 before the first write).
+    """
+    return db.execute(select(_counter.c.value).where(_counter.c.id == 1)).scalar() or 0
+
+
+def record_tombstones(connection, rows):
+    """
+    Writes tombstones for rows deleted in bulk (`query.delete()` skips the ORM events).
+    `rows` is an iterable of (todo_id, owner_id).
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    now = datetime.utcnow()
+    first_version = reserve_versions(connection, len(rows))
+    connection.execute(insert(_tombstones), [
+        {"todo_id": todo_id, "owner_id": owner_id, "version": first_version + offset, "deleted_at": now}
+        for offset, (todo_id, owner_id) in enumerate(rows)
+    ])
+
+
+@event.listens_for(Todos, "before_insert")
+def _stamp_new_todo(mapper, connection, target):
+    target.version = next_version(connection)
+    target.updated_at = datetime.utcnow()
+
+
+@event.listens_for(Todos, "before_update")
+def _stamp_updated_todo(mapper, connection, target):
+    # Flushes also visit objects whose attributes were set to the same values
+    session = object_session(target)
+    if session is not None and not session.is_modified(target, include_collections=False):
+        return
+    target.version = next_version(connection)
+    target.updated_at = datetime.utcnow()
+
+
+@event.listens_for(Todos, "after_delete")
+def _tombstone_deleted_todo(mapper, connection, target):
+    record_tombstones(connection, [(target.id, target.owner_id)])
@@ -0,0 +1,261 @@
+# == Import necessary libraries ==
+import os
+import zlib
+
+from .metrics import metrics
+
+# Optional encoders, only offered when the package is installed
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+# Settings (can be overridden through environment variables)
+# Responses smaller than this are sent uncompressed (bytes)
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("TODO_COMPRESSION_MIN_SIZE", "1024"))
+# Compression level per encoding
+GZIP_LEVEL = int(os.getenv("TODO_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("TODO_BROTLI_QUALITY", "4"))
+ZSTD_LEVEL = int(os.getenv("TODO_ZSTD_LEVEL", "3"))
+
+# Content types worth compressing
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+# Never compressed: event streams must reach the client event by event, not sit in the encoder
+SKIPPED_TYPES = (
+    "text/event-stream",
+)
+
+
+class _GzipEncoder:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = gzip container
+
+    def compress(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data=b""):
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliEncoder:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data=b""):
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class _ZstdEncoder:
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data=b""):
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+def available_encodings():
+    """
+    Returns the supported encodings in order of preference.
+    """
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def select_encoding(accept_encoding: str, supported=None):
+    """
+    Picks the best encoding for an `Accept-Encoding` header value.
+    Higher q-values win, ties are broken by server preference.
+    """
+    supported = supported or available_encodings()
+
+    # Step 1: Parse "gzip;q=0.8, br, *;q=0" into {coding: q}
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding] = q
+
+    # Step 2: Keep the acceptable codings we can produce
+    candidates = []
+    for preference, coding in enumerate(supported):
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > 0:
+            candidates.append((-q, preference, coding))
+
+    return min(candidates)[2] if candidates else None
+
+
+def make_encoder(encoding, gzip_level=GZIP_LEVEL, brotli_quality=BROTLI_QUALITY, zstd_level=ZSTD_LEVEL):
+    if encoding == "zstd":
+        return _ZstdEncoder(zstd_level)
+    if encoding == "br":
+        return _BrotliEncoder(brotli_quality)
+    return _GzipEncoder(gzip_level)
+
+
+def _merge_vary(values):
+    """
+    Adds Accept-Encoding to the `Vary` header values of the response (kept once).
+    """
+    fields = [field.strip() for value in values for field in value.split(b",") if field.strip()]
+    if b"*" in fields:
+        return b"*"
+    if b"accept-encoding" not in (field.lower() for field in fields):
+        fields.append(b"Accept-Encoding")
+    return b", ".join(fields)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses with gzip, and brotli/zstd when installed.
+
+    Complete responses under `minimum_size` are sent as-is. Streaming responses
+    are compressed chunk by chunk and flushed, so clients get data as it is produced.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESSION_MINIMUM_SIZE, gzip_level=GZIP_LEVEL,
+                 brotli_quality=BROTLI_QUALITY, zstd_level=ZSTD_LEVEL):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {"gzip_level": gzip_level, "brotli_quality": brotli_quality, "zstd_level": zstd_level}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Step 1: Content negotiation through Accept-Encoding
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = select_encoding(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Step 2: Wrap `send` so the body gets compressed on its way out
+        responder = _CompressionResponder(send, encoding, self.minimum_size, self.levels)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, send, encoding, minimum_size, levels):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.levels = levels
+        self.start_message = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def send(self, message):
+        message_type = message["type"]
+
+        # Hold the start message until the first body chunk tells us the size
+        if message_type == "http.response.start":
+            self.start_message = message
+            return
+        if message_type != "http.response.body" or self.passthrough:
+            # e.g. http.response.pathsend (zero-copy file): cannot be compressed, send the held start first
+            if not self.passthrough and self.encoder is None and self.start_message is not None:
+                self.passthrough = True
+                await self._send(self.start_message)
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        # First body chunk: decide whether to compress at all
+        if self.encoder is None:
+            if not self._should_compress(body, more_body):
+                self.passthrough = True
+                await self._send(self.start_message)
+                await self._send(message)
+                return
+
+            self.encoder = make_encoder(self.encoding, **self.levels)
+            headers = []
+            vary = []
+            for name, value in self.start_message["headers"]:
+                if name == b"content-length":
+                    continue
+                if name == b"vary":
+                    vary.append(value)
+                elif name == b"etag" and not value.startswith(b"W/"):
+                    # The compressed body differs byte for byte, a strong validator would be wrong
+                    headers.append((name, b"W/" + value))
+                else:
+                    headers.append((name, value))
+            headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+            headers.append((b"vary", _merge_vary(vary)))
+
+            if not more_body:
+                # Complete response: compress in one go and send the final length
+                compressed = self.encoder.finish(body)
+                headers.append((b"content-length", str(len(compressed)).encode("latin-1")))
+                self._record(len(body), len(compressed))
+                await self._send({**self.start_message, "headers": headers})
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+
+            # Streaming response: length is unknown, chunks are flushed as they come
+            await self._send({**self.start_message, "headers": headers})
+
+        compressed = self.encoder.compress(body) if more_body else self.encoder.finish(body)
+        self._record(len(body), len(compressed))
+        await self._send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+    def _should_compress(self, body, more_body):
+        headers = {name: value for name, value in self.start_message["headers"]}
+
+        # Already encoded (e.g. precompressed static files)
+        if b"content-encoding" in headers:
+            return False
+
+        content_type = headers.get(b"content-type", b"").decode("latin-1").lower()
+        if not content_type.startswith(COMPRESSIBLE_TYPES) or content_type.startswith(SKIPPED_TYPES):
+            return False
+
+        # Small complete responses are cheaper to send raw
+        if not more_body and len(body) < self.minimum_size:
+            return False
+        return True
+
+    def _record(self, size_in, size_out):
+        metrics.inc(f"compression.{self.encoding}.bytes_in", size_in)
+        metrics.inc(f"compression.{self.encoding}.bytes_out", size_out)
@@ -1,7 +1,9 @@
 # == Import necessary libraries ==
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from .metrics import metrics
 
 # 0 = Define the database URL
 # SQLite database URL in this case, change as per your database configuration
@@ -10,7 +12,16 @@ SQLALCHEMY_DATABASE_URL = "sqlite:///./todosapp.db"
 # 1 = Create the engine
 # The engine is responsible for managing the connection to the database
 # `check_same_thread=False` is specific to SQLite and allows multiple threads to interact with the database
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# `query_cache_size` is the number of compiled statements kept. The app has a few dozen statement
+# shapes, keep it well above that (its fill level is reported at /admin/metrics)
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    query_cache_size=int(os.getenv("TODO_DB_QUERY_CACHE_SIZE", "500")),
+)
+metrics.register_collector("db_compiled_cache", lambda: {
+    "size": len(engine._compiled_cache), "capacity": engine._compiled_cache.capacity,
+})
 
 # 2 = Create a session maker
 # The session maker is a factory for creating new Session objects, which are used to interact with the database
@@ -20,4 +31,63 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # 3 = Create the base class for the declarative model
 # The Base class is used to create the database models (tables)
-Base = declarative_base() 
\ No newline at end of file
+Base = declarative_base() 
+
+# 4 = Create a lazy, request-scoped session
+# The real Session (and its connection) is only created when the request first uses it
+class LazySession:
+    """
+    Stands in for a Session and creates it on first use.
+    Requests rejected before touching the database never open one.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+        self._session = None
+        self.checkouts = 0  # Number of connections checked out by this session
+
+    @property
+    def opened(self) -> bool:
+        return self._session is not None
+
+    def _on_begin(self, session, transaction, connection):
+        # A new transaction means a connection was checked out from the pool
+        self.checkouts += 1
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = self._session_factory()
+            event.listen(self._session, "after_begin", self._on_begin)
+            metrics.inc("db.sessions_opened")
+        return self._session
+
+    def __getattr__(self, name):
+        return getattr(self._get_session(), name)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+# 5 = Define the shared dependency function to provide a database session
+# FastAPI caches a dependency per request, so every dependency asking for
+# `get_db` within one request gets the same LazySession
+def get_db():
+    """
+    Creates a lazy database session, yields it for use,
+    and closes the session to ensure proper resource management.
+    """
+    db = LazySession(SessionLocal)  # Step 1: Create a lazy session object (no connection yet)
+    try:
+        yield db  # Step 2: Yield the session object to the caller
+    finally:
+        metrics.inc("db.requests")
+        metrics.observe("db.checkouts_per_request", db.checkouts, buckets=(0, 1, 2, 3, 5, 10))
+        db.close()  # Step 3: Close the session to release resources
+
+# 6 = Start the transaction of a session explicitly (before its first savepoint)
+# pysqlite only emits BEGIN before an INSERT / UPDATE / DELETE. A SAVEPOINT issued
+# first is then outside any transaction, and releasing it commits right away
+def begin_transaction(db):
+    connection = db.connection()
+    if connection.dialect.driver == "pysqlite" and not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN")
@@ -0,0 +1,178 @@
+# == Import necessary libraries ==
+import asyncio
+import json
+import os
+from collections import defaultdict
+
+from .bus import bus
+from .metrics import metrics
+
+# Settings (can be overridden through environment variables)
+# Seconds between keep-alive comments on an idle stream
+EVENTS_HEARTBEAT_INTERVAL = float(os.getenv("TODO_EVENTS_HEARTBEAT_INTERVAL", "15"))
+# Events buffered per subscriber before it is considered too slow
+EVENTS_QUEUE_SIZE = int(os.getenv("TODO_EVENTS_QUEUE_SIZE", "100"))
+
+HEARTBEAT = b": keep-alive\n\n"
+RESYNC = b"event: resync\ndata: {}\n\n"
+
+
+def todo_payload(todo):
+    """
+    JSON-ready projection of a Todos row for event data.
+    """
+    return {
+        "id": todo.id,
+        "title": todo.title,
+        "description": todo.description,
+        "priority": todo.priority,
+        "complete": todo.complete,
+        "owner_id": todo.owner_id,
+        "version": todo.version,
+        "updated_at": todo.updated_at.isoformat() if todo.updated_at else None,
+    }
+
+
+def encode_event(event_type, data):
+    """
+    Encodes one server-sent event. The version (when known) is used as the
+    event id, so a reconnecting client can catch up with /todo/changes.
+    """
+    lines = []
+    if isinstance(data, dict) and data.get("version") is not None:
+        lines.append(f"id: {data['version']}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+class Subscriber:
+    __slots__ = ("owner_id", "queue", "overflowed")
+
+    def __init__(self, owner_id, queue_size):
+        self.owner_id = owner_id
+        self.queue = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+
+class EventHub:
+    """
+    In-process pub/sub fanning out todo changes to the streams of their owner.
+
+    Each subscriber has a bounded queue. A subscriber whose queue is full is
+    too slow: it stops receiving events, gets a `resync` event and its
+    stream ends, so one slow client never holds memory for everybody.
+    Must be used from the event loop thread.
+    """
+
+    def __init__(self, queue_size=EVENTS_QUEUE_SIZE, heartbeat_interval=EVENTS_HEARTBEAT_INTERVAL):
+        self.queue_size = queue_size
+        self.heartbeat_interval = heartbeat_interval
+        self._subscribers = defaultdict(set)  # owner_id -> {Subscriber}
+
+    def subscribe(self, owner_id) -> Subscriber:
+        subscriber = Subscriber(owner_id, self.queue_size)
+        self._subscribers[owner_id].add(subscriber)
+        metrics.inc("events.subscribed")
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscribers = self._subscribers.get(subscriber.owner_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._subscribers[subscriber.owner_id]
+
+    def has_subscribers(self, owner_id) -> bool:
+        # With several workers, the owner's streams may be held by another one. The other
+        # workers' subscribers are not tracked (a new worker could not learn them), so every
+        # event is relayed while the bus is attached
+        return owner_id in self._subscribers or bus.attached
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, owner_id, event_type, data, broadcast: bool = True):
+        """
+        Queues the event for every stream of `owner_id` (encoded once for all of them),
+        in this process and in the other workers.
+        """
+        # Too large for the bus: the streams held by other workers resync instead
+        if broadcast and not bus.publish("events.publish", owner_id=owner_id, event_type=event_type, data=data):
+            bus.publish("events.resync", owner_id=owner_id)
+
+        subscribers = self._subscribers.get(owner_id)
+        if not subscribers:
+            return
+
+        message = encode_event(event_type, data)
+        for subscriber in tuple(subscribers):
+            if subscriber.overflowed:
+                continue
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Backpressure: drop the slow consumer instead of buffering without limit
+                subscriber.overflowed = True
+                metrics.inc("events.overflowed")
+        metrics.inc("events.published")
+
+    async def stream(self, subscriber):
+        """
+        Yields the encoded events of one subscriber, with keep-alive comments
+        while idle. Unsubscribes when the client goes away.
+        """
+        try:
+            yield b": connected\n\n"
+            while True:
+                if subscriber.overflowed:
+                    yield RESYNC
+                    return
+                # asyncio.timeout (unlike wait_for) needs no extra task per idle stream
+                try:
+                    async with asyncio.timeout(self.heartbeat_interval):
+                        message = await subscriber.queue.get()
+                except TimeoutError:
+                    yield HEARTBEAT
+                    continue
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
+
+    async def subscribe_and_stream(self, owner_id):
+        """
+        `stream` of a new subscriber of `owner_id`. Subscribing only when the
+        response body starts means a client gone before that leaves no queue behind.
+        """
+        stream = self.stream(self.subscribe(owner_id))
+        try:
+            async for message in stream:
+                yield message
+        finally:
+            await stream.aclose()  # Unsubscribes
+
+    def resync(self, owner_id=None, broadcast: bool = True):
+        """
+        Ends the streams of `owner_id` (of everybody when None) with a `resync` event.
+        """
+        if broadcast:
+            bus.publish("events.resync", owner_id=owner_id)
+        owners = list(self._subscribers) if owner_id is None else [owner_id]
+        for owner in owners:
+            for subscriber in tuple(self._subscribers.get(owner, ())):
+                subscriber.overflowed = True
+                # Wake up the stream, it sees the flag and sends `resync`
+                if subscriber.queue.empty():
+                    subscriber.queue.put_nowait(HEARTBEAT)
+
+    def stats(self):
+        return {"owners": len(self._subscribers), "subscribers": self.subscriber_count()}
+
+
+# Shared hub used by the routers
+event_hub = EventHub()
+metrics.register_collector("event_hub", event_hub.stats)
+bus.subscribe("events.publish", lambda owner_id, event_type, data: event_hub.publish(
+    owner_id, event_type, data, broadcast=False))
+bus.subscribe("events.resync", lambda owner_id: event_hub.resync(owner_id, broadcast=False))
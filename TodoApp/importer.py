@@ -0,0 +1,264 @@
+"""
+Streaming bulk import of todos (CSV or NDJSON request bodies).
+
+The body is read chunk by chunk and cut into records as it arrives. Every
+`IMPORT_BATCH_SIZE` records are validated together and inserted in their
+own transaction, so memory stays bounded by one batch (plus one line)
+whatever the size of the upload, and a failure never loses the batches
+already committed.
+
+A batch is inserted with one multi-row INSERT. Its change versions are
+reserved in one counter update instead of one per row.
+"""
+# == Import necessary libraries ==
+import csv
+import io
+import json
+import os
+import time
+from datetime import datetime
+from functools import lru_cache
+
+from fastapi.concurrency import run_in_threadpool
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import insert
+
+from .changes import reserve_versions
+from .metrics import metrics
+from .models import Todos
+
+# Settings (can be overridden through environment variables)
+# Records validated and inserted per transaction
+IMPORT_BATCH_SIZE = int(os.getenv("TODO_IMPORT_BATCH_SIZE", "500"))
+# Row errors listed in the report (the others are only counted)
+IMPORT_MAX_ERRORS = int(os.getenv("TODO_IMPORT_MAX_ERRORS", "100"))
+# Longest accepted line, the import stops at a longer one
+IMPORT_MAX_LINE_BYTES = int(os.getenv("TODO_IMPORT_MAX_LINE_BYTES", "65536"))
+
+CSV_TYPES = ("text/csv", "application/csv")
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/json-lines")
+
+
+class ImportStopped(Exception):
+    pass
+
+
+def detect_format(content_type: str | None) -> str | None:
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in CSV_TYPES:
+        return "csv"
+    if media_type in NDJSON_TYPES:
+        return "ndjson"
+    return None
+
+
+async def iter_lines(chunks, max_line_bytes=IMPORT_MAX_LINE_BYTES):
+    """
+    Yields (line number, text) for every line of a byte stream, without
+    ever holding more than one chunk plus one line. Text is None for a line
+    that is not valid UTF-8.
+    """
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        # "\n" never appears inside a UTF-8 multi-byte sequence, cutting the bytes first is safe
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            yield line_no, _decode(line, line_no)
+        if len(buffer) > max_line_bytes:
+            raise ImportStopped(f"Line {line_no + 1} is longer than {max_line_bytes} bytes.")
+    if buffer:
+        yield line_no + 1, _decode(buffer, line_no + 1)
+
+
+def _decode(line: bytes, line_no: int) -> str | None:
+    try:
+        return line.decode("utf-8-sig" if line_no == 1 else "utf-8").rstrip("\r")
+    except UnicodeDecodeError:
+        return None
+
+
+async def iter_records(chunks, fmt):
+    """
+    Yields (line number, record dict or None, error or None) for every record of the body.
+    """
+    header = None
+    pending, pending_line = "", 0
+
+    async for line_no, line in iter_lines(chunks):
+        if line is None:
+            yield line_no, None, "Not valid UTF-8."
+            pending = ""
+            continue
+
+        if fmt == "ndjson":
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                yield line_no, None, f"Invalid JSON: {error}"
+                continue
+            if not isinstance(record, dict):
+                yield line_no, None, "Expected a JSON object."
+                continue
+            yield line_no, record, None
+            continue
+
+        # CSV: a quoted field may span lines, keep reading while the quotes are unbalanced
+        if not pending:
+            if not line.strip():
+                continue
+            pending_line = line_no
+        pending = f"{pending}\n{line}" if pending else line
+        if pending.count('"') % 2:
+            if len(pending) > IMPORT_MAX_LINE_BYTES:
+                yield pending_line, None, "Unterminated quoted field."
+                pending = ""
+            continue
+        values = next(csv.reader(io.StringIO(pending)))
+        pending = ""
+
+        if header is None:
+            header = [name.strip().lower() for name in values]
+            continue
+        if len(values) != len(header):
+            yield pending_line, None, f"Expected {len(header)} fields, got {len(values)}."
+            continue
+        yield pending_line, dict(zip(header, values)), None
+
+    if pending:
+        yield pending_line, None, "Unterminated quoted field."
+
+
+class ImportReport:
+    """
+    Counters and (capped) row errors of one import.
+    """
+
+    def __init__(self, max_errors=IMPORT_MAX_ERRORS):
+        self.max_errors = max_errors
+        self.rows = 0
+        self.imported = 0
+        self.failed = 0
+        self.batches = 0
+        self.errors = []
+        self.stopped = None
+        self.started = time.perf_counter()
+
+    def add_error(self, line, detail):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "detail": detail})
+
+    def summary(self, bytes_read):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": sorted(self.errors, key=lambda error: error["line"]),
+            "errors_truncated": self.failed > len(self.errors),
+            "completed": self.stopped is None,
+            "stopped": self.stopped,
+            "batches": self.batches,
+            "bytes": bytes_read,
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "rows_per_second": round(self.rows / elapsed) if elapsed else None,
+        }
+
+
+@lru_cache
+def _list_adapter(row_model):
+    return TypeAdapter(list[row_model])
+
+
+def validate_batch(row_model, batch, report: ImportReport):
+    """
+    Validates a batch of (line, record) against `row_model` with one call,
+    falling back to per-record validation to locate the failing rows.
+    """
+    try:
+        return _list_adapter(row_model).validate_python([record for _, record in batch])
+    except ValidationError:
+        pass
+
+    valid = []
+    for line, record in batch:
+        try:
+            valid.append(row_model.model_validate(record))
+        except ValidationError as error:
+            report.add_error(line, "; ".join(
+                f"{'.'.join(str(part) for part in issue['loc']) or 'row'}: {issue['msg']}" for issue in error.errors()
+            ))
+    return valid
+
+
+def insert_batch(db, owner_id, todo_requests) -> int:
+    """
+    Inserts validated todos in one transaction. Returns the last version used.
+    """
+    connection = db.connection()
+    first_version = reserve_versions(connection, len(todo_requests))
+    now = datetime.utcnow()
+    db.execute(insert(Todos), [
+        {**todo_request.model_dump(), "owner_id": owner_id, "version": first_version + offset, "updated_at": now}
+        for offset, todo_request in enumerate(todo_requests)
+    ])
+    db.commit()
+    return first_version + len(todo_requests) - 1
+
+
+class _CountingStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.bytes_read = 0
+
+    async def __aiter__(self):
+        async for chunk in self.chunks:
+            self.bytes_read += len(chunk)
+            yield chunk
+
+
+async def import_todos(db, owner_id, chunks, fmt, row_model, batch_size=IMPORT_BATCH_SIZE,
+                       max_errors=IMPORT_MAX_ERRORS):
+    """
+    Imports the todos of a CSV / NDJSON byte stream for `owner_id`, each
+    record validated against `row_model` (a pydantic model).
+    Returns (summary dict, last version written or None).
+    """
+    report = ImportReport(max_errors)
+    stream = _CountingStream(chunks)
+    batch = []
+    last_version = None
+
+    async def flush():
+        nonlocal last_version
+        # Validation and the insert run in a worker thread, the loop keeps serving requests
+        todo_requests = await run_in_threadpool(validate_batch, row_model, batch, report)
+        if todo_requests:
+            last_version = await run_in_threadpool(insert_batch, db, owner_id, todo_requests)
+            report.imported += len(todo_requests)
+        report.batches += 1
+        batch.clear()
+
+    try:
+        async for line, record, error in iter_records(stream, fmt):
+            report.rows += 1
+            if error is not None:
+                report.add_error(line, error)
+                continue
+            batch.append((line, record))
+            if len(batch) >= batch_size:
+                await flush()
+    except ImportStopped as stop:
+        report.stopped = str(stop)
+
+    if batch:
+        await flush()
+
+    metrics.inc("import.rows", report.rows)
+    metrics.inc("import.imported", report.imported)
+    return report.summary(stream.bytes_read), last_version
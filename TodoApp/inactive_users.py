@@ -0,0 +1,92 @@
+# == Import necessary libraries ==
+import asyncio
+import logging
+import os
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+
+from .bus import bus
+from .models import Users
+
+logger = logging.getLogger(__name__)
+
+# How often the in-memory set is reloaded from the database (seconds)
+INACTIVE_USERS_SYNC_INTERVAL = float(os.getenv("TODO_INACTIVE_USERS_SYNC_INTERVAL", "30"))
+
+
+class InactiveUsers:
+    """
+    In-memory set of the ids of deactivated users (`Users.is_active` false).
+
+    `is_inactive` is a set lookup, so `get_current_user` rejects the tokens
+    of deactivated users without a DB round trip. Deactivations made by this
+    process are visible immediately, the ones made by other processes after
+    the next `sync`.
+    """
+
+    def __init__(self, sync_interval=INACTIVE_USERS_SYNC_INTERVAL):
+        self.sync_interval = sync_interval
+        self._inactive = frozenset()
+        self._marks_during_sync = []  # one {user_id: inactive} per sync reading the table
+        self.last_sync = None
+
+    def is_inactive(self, user_id) -> bool:
+        return user_id in self._inactive
+
+    def mark(self, user_id, inactive: bool = True, broadcast: bool = True):
+        # Copy on write, readers never see a partial set
+        self._inactive = self._inactive | {user_id} if inactive else self._inactive - {user_id}
+        for marks in self._marks_during_sync:
+            marks[user_id] = inactive
+        if broadcast:
+            bus.publish("inactive_users.mark", user_id=user_id, inactive=inactive)
+
+    def sync(self, db):
+        self._inactive = self._load(db)
+
+    async def sync_in_thread(self, session_factory):
+        """
+        `sync` with its query in a worker thread, the event loop only swaps the set in.
+        """
+        marks = {}
+        self._marks_during_sync.append(marks)
+        try:
+            inactive = await run_in_threadpool(self._load_in_session, session_factory)
+        finally:
+            self._marks_during_sync.remove(marks)
+        # The rows may predate a mark made meanwhile (a deactivation commits before its mark), the mark wins
+        self._inactive = inactive.union(user_id for user_id, value in marks.items() if value) \
+            .difference(user_id for user_id, value in marks.items() if not value)
+
+    def _load_in_session(self, session_factory):
+        db = session_factory()
+        try:
+            return self._load(db)
+        finally:
+            db.close()
+
+    def _load(self, db):
+        return frozenset(db.scalars(select(Users.id).where(Users.is_active == False)).all())
+
+    def clear(self):
+        self._inactive = frozenset()
+
+    def __len__(self):
+        return len(self._inactive)
+
+    async def run_sync_loop(self, session_factory):
+        """
+        Background task: sync now, then every `sync_interval` seconds.
+        """
+        while True:
+            try:
+                await self.sync_in_thread(session_factory)
+            except Exception:
+                logger.exception("Could not sync the inactive users")
+            await asyncio.sleep(self.sync_interval)
+
+
+# Shared set checked by `get_current_user`
+inactive_users = InactiveUsers()
+bus.subscribe("inactive_users.mark", lambda user_id, inactive: inactive_users.mark(user_id, inactive, broadcast=False))
@@ -1,19 +1,93 @@
 # == Import necessary libraries ==
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
 from fastapi import  FastAPI
-from .routers import auth,todos,admin,user
+from fastapi.concurrency import run_in_threadpool
+from .routers import auth,todos,admin,user,batch
 # Import database models
 from .models import Base
 # Import database connection details (engine and session factory)
-from .database import engine
-from starlette import staticfiles
+from .database import engine, SessionLocal
+# Import the response compression middleware
+from .compression import CompressionMiddleware
+# Import the static assets mount and its build directory
+from .static_files import PrecompressedStaticFiles
+from .build_static import STATIC_DIR
+from .metrics import metrics
+# Import the opt-in request profiler
+from .profiling import ProfilingMiddleware
+# Import the token revocation list (kept in sync with the database in the background)
+from .revocation import revocation_list
+# Import the deactivated users (kept in sync with the database in the background)
+from .inactive_users import inactive_users
+# Import the archiver moving old completed todos out of the hot table
+from .archival import archiver
+# Import the password hashing cost calibration
+from . import passwords
+# Import the in-process caches and the bus keeping them in sync across workers (serve.py)
+from .bus import bus
+from .events import event_hub
+from .next_cache import next_todos_cache
+from .user_cache import user_cache
+
+# Startup / shutdown of the background tasks
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Step 0: Pick the bcrypt cost for this machine before serving logins (done once by serve.py when preloading)
+    if not passwords.stats["calibrated"]:
+        await run_in_threadpool(passwords.calibrate)
+    # Step 1: Load the revoked tokens and the deactivated users, keep the in-memory copies in sync
+    revocation_sync = asyncio.create_task(revocation_list.run_sync_loop(SessionLocal))
+    inactive_sync = asyncio.create_task(inactive_users.run_sync_loop(SessionLocal))
+    # Step 2: Archive old completed todos periodically (in one worker only, see serve.py)
+    run_archival = archiver.enabled and os.getenv("TODO_WORKER_INDEX", "0") == "0"
+    archival = asyncio.create_task(archiver.run_loop(SessionLocal)) if run_archival else None
+    yield
+    # Step 3: Stop the background tasks
+    revocation_sync.cancel()
+    inactive_sync.cancel()
+    if archival is not None:
+        archival.cancel()
+
+# A worker that missed bus messages drops or reloads every in-memory copy
+_reloads = set()  # running reloads (the loop only keeps weak references to tasks)
+
+async def reload_shared_state():
+    # Whole-table reads, each one in a worker thread
+    try:
+        await revocation_list.sync_in_thread(SessionLocal)
+        await inactive_users.sync_in_thread(SessionLocal)
+    except Exception:
+        logging.getLogger(__name__).exception("Could not reload the shared state")
+
+def reset_shared_state():
+    user_cache.invalidate(broadcast=False)
+    next_todos_cache.invalidate(broadcast=False)
+    event_hub.resync(broadcast=False)
+    reload = asyncio.get_running_loop().create_task(reload_shared_state())
+    _reloads.add(reload)
+    reload.add_done_callback(_reloads.discard)
+
+bus.subscribe("reset", reset_shared_state)
+
 # Create the FastAPI application
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+# Compress large responses (full todo lists) with gzip / brotli / zstd
+app.add_middleware(CompressionMiddleware)
+# Profile flagged (admin) or sampled requests, added last so it also measures compression
+app.add_middleware(ProfilingMiddleware)
 
 # Create the database tables (if they don't exist)
 Base.metadata.create_all(bind=engine)
 
-# mount static 
-# app.mount("/static", staticfiles(directory="static"), name='static')
+# mount static (precompressed variants, ETags, caching headers), when the app ships assets
+if os.path.isdir(STATIC_DIR):
+    static_files = PrecompressedStaticFiles(directory=STATIC_DIR)
+    app.mount("/static", static_files, name="static")
+    metrics.register_collector("static_files", static_files.stats)
 
 # Root 
 @app.get("/")
@@ -25,4 +99,5 @@ app.include_router(auth.router)
 app.include_router(todos.router)
 app.include_router(admin.router)
 app.include_router(user.router)
+app.include_router(batch.router)
 
@@ -0,0 +1,98 @@
+# == Import necessary libraries ==
+import threading
+from collections import defaultdict
+from itertools import accumulate
+
+# Upper bounds used to bucket observed values (batch sizes, latencies, ...)
+DEFAULT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+class Histogram:
+    """
+    Keeps count, sum, min, max and bucket counts for observed values.
+    The snapshot reports cumulative counts, like Prometheus `le` buckets:
+    the "8" bucket counts every value <= 8.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)  # Last slot is "+Inf"
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        # Step 1: Update the running aggregates
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+        # Step 2: Put the value in the first bucket that can hold it
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[index] += 1
+                return
+        self.bucket_counts[-1] += 1
+
+    def snapshot(self):
+        labels = [str(bound) for bound in self.buckets] + ["+Inf"]
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min,
+            "max": self.max,
+            "avg": self.total / self.count if self.count else None,
+            "buckets": dict(zip(labels, accumulate(self.bucket_counts))),
+        }
+
+
+class Metrics:
+    """
+    Process-wide registry of counters, histograms and collectors.
+    Collectors are callables returning a dict, used by components that
+    already track their own statistics (caches, limiters, ...).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._histograms = {}
+        self._collectors = {}
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(buckets)
+            histogram.observe(value)
+
+    def register_collector(self, name, collector):
+        with self._lock:
+            self._collectors[name] = collector
+
+    def snapshot(self):
+        with self._lock:
+            data = {
+                "counters": dict(self._counters),
+                "histograms": {name: h.snapshot() for name, h in self._histograms.items()},
+            }
+            collectors = dict(self._collectors)
+
+        # Collectors are called outside the lock, they may take their own locks
+        data["collectors"] = {name: collector() for name, collector in collectors.items()}
+        return data
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+# Shared registry used by the whole application
+metrics = Metrics()
@@ -0,0 +1,276 @@
+"""
+Helpers for data migrations on large tables.
+
+A plain `op.execute("UPDATE todos ...")` or `op.batch_alter_table(...)`
+rewrites the whole table in one transaction, and SQLite blocks every
+writer until it commits. These helpers split that work into small
+transactions instead, so the app stays writable while a migration runs:
+
+- `chunked_backfill` updates rows in primary-key ranges.
+- `online_rebuild_table` copies a table into a new definition chunk by chunk.
+  Triggers mirror concurrent writes, then a short transaction swaps the tables.
+
+Both helpers sleep between chunks (throttling), log their progress, and
+save their cursor in the `migration_progress` table. If a run is
+interrupted, running the migration again continues where it stopped.
+
+Inside a migration, call them without `bind`. They commit the migration's
+transaction first (`autocommit_block`), then work on their own connections.
+Use `transaction_per_migration` (set in env.py) for those migrations.
+
+This module is imported by migration scripts as `migration_helpers`, so it
+only depends on SQLAlchemy and Alembic.
+"""
+# == Import necessary libraries ==
+import logging
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+# Settings (can be overridden through environment variables)
+# Rows per transaction
+MIGRATION_CHUNK_SIZE = int(os.getenv("TODO_MIGRATION_CHUNK_SIZE", "1000"))
+# Pause between two chunks, lets the app take the write lock (milliseconds)
+MIGRATION_CHUNK_PAUSE_MS = float(os.getenv("TODO_MIGRATION_CHUNK_PAUSE_MS", "20"))
+# Attempts of a chunk that hits "database is locked"
+MIGRATION_LOCK_RETRIES = int(os.getenv("TODO_MIGRATION_LOCK_RETRIES", "20"))
+
+# Progress of the chunked migrations, one row per named job
+_progress_metadata = sa.MetaData()
+migration_progress = sa.Table(
+    "migration_progress",
+    _progress_metadata,
+    sa.Column("name", sa.String(), primary_key=True),
+    sa.Column("last_key", sa.Integer(), nullable=True),
+    sa.Column("rows_done", sa.Integer(), nullable=False, default=0),
+    sa.Column("done", sa.Boolean(), nullable=False, default=False),
+    sa.Column("updated_at", sa.DateTime(), nullable=True),
+)
+
+
+@contextmanager
+def _engine_scope(bind):
+    """
+    Yields the engine the chunks run on. Inside a migration, the migration
+    transaction is committed first so it does not hold the write lock.
+    """
+    if bind is not None:
+        yield bind.engine if isinstance(bind, sa.engine.Connection) else bind
+        return
+
+    from alembic import op
+
+    with op.get_context().autocommit_block():
+        yield op.get_bind().engine
+
+
+def _retry_locked(fn, pause_ms, retries=MIGRATION_LOCK_RETRIES):
+    """
+    Runs `fn`, retrying while SQLite reports the database as locked by another writer.
+    """
+    for attempt in range(retries):
+        try:
+            return fn()
+        except OperationalError as error:
+            if "locked" not in str(error) or attempt == retries - 1:
+                raise
+            time.sleep(max(pause_ms, 10) / 1000 * (attempt + 1))
+
+
+def load_progress(connection, name):
+    """
+    Returns the saved progress row of job `name`, or None when it never ran.
+    """
+    _progress_metadata.create_all(connection, checkfirst=True)
+    return connection.execute(
+        sa.select(migration_progress).where(migration_progress.c.name == name)
+    ).mappings().first()
+
+
+def save_progress(connection, name, last_key, rows_done, done=False):
+    values = {"last_key": last_key, "rows_done": rows_done, "done": done, "updated_at": datetime.utcnow()}
+    result = connection.execute(
+        sa.update(migration_progress).where(migration_progress.c.name == name).values(**values)
+    )
+    if result.rowcount == 0:
+        connection.execute(sa.insert(migration_progress).values(name=name, **values))
+
+
+def _next_upper_key(connection, key_column, after_key, chunk_size):
+    """
+    Highest key of the next `chunk_size` rows after `after_key` (None when there are none left).
+    """
+    keys = sa.select(key_column).where(key_column > after_key).order_by(key_column).limit(chunk_size).subquery()
+    return connection.execute(sa.select(sa.func.max(keys.c[0]))).scalar()
+
+
+def _run_chunks(engine, name, table, key_column, copy_chunk, chunk_size, pause_ms, log):
+    """
+    Walks `table` in key ranges, running `copy_chunk(connection, low, high)` and
+    saving the cursor in the same transaction. Returns the rows processed.
+    """
+    # Step 1: Resume from the saved cursor
+    with engine.begin() as connection:
+        progress = load_progress(connection, name)
+        max_key = connection.execute(sa.select(sa.func.max(key_column))).scalar() or 0
+    if progress is not None and progress["done"]:
+        log("%s: already done, skipping", name)
+        return progress["rows_done"]
+    last_key = progress["last_key"] if progress is not None and progress["last_key"] is not None else -1
+    rows_done = progress["rows_done"] if progress is not None else 0
+    started = time.perf_counter()
+
+    while True:
+        # Step 2: Find the range of the next chunk (read only, no lock held between chunks)
+        with engine.connect() as connection:
+            upper_key = _next_upper_key(connection, key_column, last_key, chunk_size)
+        if upper_key is None:
+            break
+
+        # Step 3: Process the range and save the cursor in one short transaction
+        def run_chunk():
+            with engine.begin() as connection:
+                count = copy_chunk(connection, last_key, upper_key)
+                save_progress(connection, name, upper_key, rows_done + count)
+                return count
+
+        rows_done += _retry_locked(run_chunk, pause_ms)
+        last_key = upper_key
+
+        # Step 4: Report and give the app a turn
+        elapsed = time.perf_counter() - started
+        log("%s: key %s / %s (%.0f%%), %d rows, %.1fs", name, last_key, max_key,
+            100 * min(last_key / max_key, 1) if max_key else 100, rows_done, elapsed)
+        time.sleep(pause_ms / 1000)
+
+    return rows_done
+
+
+def chunked_backfill(name, table, values, where=None, *, key="id", chunk_size=MIGRATION_CHUNK_SIZE,
+                     pause_ms=MIGRATION_CHUNK_PAUSE_MS, bind=None, log=logger.info):
+    """
+    Runs `UPDATE table SET values WHERE where` in primary-key chunks, one
+    transaction per chunk. `name` identifies the job in `migration_progress`.
+    Returns the number of rows updated (over all runs).
+
+        chunked_backfill("todos_version", sa.table("todos", sa.column("id"), sa.column("version")),
+                         {"version": 0}, where=sa.column("version").is_(None))
+    """
+    key_column = table.c[key]
+
+    def update_chunk(connection, low, high):
+        statement = sa.update(table).where(key_column > low).where(key_column <= high).values(values)
+        if where is not None:
+            statement = statement.where(where)
+        return connection.execute(statement).rowcount
+
+    with _engine_scope(bind) as engine:
+        rows_done = _run_chunks(engine, name, table, key_column, update_chunk, chunk_size, pause_ms, log)
+        with engine.begin() as connection:
+            save_progress(connection, name, None, rows_done, done=True)
+    return rows_done
+
+
+def _trigger_names(table_name):
+    return [f"_{table_name}_rebuild_{action}" for action in ("insert", "update", "delete")]
+
+
+def online_rebuild_table(name, table_name, new_table, *, column_map=None, key="id",
+                         chunk_size=MIGRATION_CHUNK_SIZE, pause_ms=MIGRATION_CHUNK_PAUSE_MS,
+                         bind=None, log=logger.info):
+    """
+    Rebuilds `table_name` as `new_table` (a `sa.Table` with another name,
+    with the new columns, constraints and indexes) without a long write lock.
+    This is the chunked version of SQLite's batch mode "move and copy".
+
+    1. Create `new_table` and triggers that mirror every write on the old table.
+    2. Copy the existing rows in key chunks (`INSERT OR IGNORE`, so rows
+       already mirrored by the triggers, which are newer, are kept).
+    3. In one short transaction, drop the triggers and the old table and rename
+       `new_table` to `table_name`.
+
+    `column_map` maps new column names to old column names (default: the
+    columns present in both tables). Other new columns get their defaults,
+    transform values afterwards with `chunked_backfill`.
+    The old indexes are dropped with the old table. The indexes of
+    `new_table` are created with it, except the ones reusing a name of the
+    old table: those are created by the swap transaction, on the renamed
+    table (a longer swap on a big table). Foreign keys pointing to the
+    rebuilt table are not checked during the swap (SQLite's default).
+    """
+    insert_trigger, update_trigger, delete_trigger = _trigger_names(table_name)
+
+    with _engine_scope(bind) as engine:
+        # Step 1: Columns copied from the old rows, index names still taken by the old table
+        with engine.connect() as connection:
+            inspector = sa.inspect(connection)
+            old_columns = {column["name"] for column in inspector.get_columns(table_name)}
+            taken_names = {index["name"] for index in inspector.get_indexes(table_name)}
+        if column_map is None:
+            column_map = {column.name: column.name for column in new_table.columns if column.name in old_columns}
+        # Same definitions bound to `table_name`, created once `new_table` has been renamed
+        swap_indexes = [index for index in new_table.to_metadata(sa.MetaData(), name=table_name).indexes
+                        if index.name in taken_names]
+        targets = ", ".join(column_map)
+        sources = ", ".join(column_map.values())
+        row_sources = ", ".join(f"NEW.{source}" for source in column_map.values())
+
+        # Step 2: New table and mirroring triggers (created once, kept when resuming)
+        with engine.begin() as connection:
+            progress = load_progress(connection, name)
+            if progress is None:
+                if not sa.inspect(connection).has_table(new_table.name):
+                    connection.execute(sa.schema.CreateTable(new_table))
+                    for index in new_table.indexes:
+                        if index.name not in taken_names:
+                            index.create(connection)
+                connection.exec_driver_sql(
+                    f"CREATE TRIGGER IF NOT EXISTS {insert_trigger} AFTER INSERT ON {table_name} BEGIN "
+                    f"INSERT OR REPLACE INTO {new_table.name} ({targets}) VALUES ({row_sources}); END"
+                )
+                connection.exec_driver_sql(
+                    f"CREATE TRIGGER IF NOT EXISTS {update_trigger} AFTER UPDATE ON {table_name} BEGIN "
+                    f"DELETE FROM {new_table.name} WHERE {key} = OLD.{key}; "
+                    f"INSERT OR REPLACE INTO {new_table.name} ({targets}) VALUES ({row_sources}); END"
+                )
+                connection.exec_driver_sql(
+                    f"CREATE TRIGGER IF NOT EXISTS {delete_trigger} AFTER DELETE ON {table_name} BEGIN "
+                    f"DELETE FROM {new_table.name} WHERE {key} = OLD.{key}; END"
+                )
+                save_progress(connection, name, None, 0)
+
+        # Step 3: Copy the existing rows chunk by chunk
+        old_table = sa.table(table_name, sa.column(key))
+        old_key = old_table.c[key]
+
+        def copy_chunk(connection, low, high):
+            return connection.exec_driver_sql(
+                f"INSERT OR IGNORE INTO {new_table.name} ({targets}) "
+                f"SELECT {sources} FROM {table_name} WHERE {key} > ? AND {key} <= ?",
+                (low, high),
+            ).rowcount
+
+        rows_done = _run_chunks(engine, name, old_table, old_key, copy_chunk, chunk_size, pause_ms, log)
+
+        # Step 4: Swap the tables in one short transaction
+        def swap():
+            with engine.begin() as connection:
+                for trigger in _trigger_names(table_name):
+                    connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+                if sa.inspect(connection).has_table(new_table.name):
+                    connection.exec_driver_sql(f"DROP TABLE {table_name}")
+                    connection.exec_driver_sql(f"ALTER TABLE {new_table.name} RENAME TO {table_name}")
+                    # On the connection that renamed it, its schema is current
+                    for index in swap_indexes:
+                        index.create(connection)
+                save_progress(connection, name, None, rows_done, done=True)
+
+        _retry_locked(swap, pause_ms)
+        log("%s: %s rebuilt, %d rows copied", name, table_name, rows_done)
+    return rows_done
@@ -1,6 +1,6 @@
 # === Import necessary libraries ===
 from .database import Base  # Import the Base class from your database.py file
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey  # Import column types from SQLAlchemy
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Index  # Import column types from SQLAlchemy
 
 # === Define the Todos model ===
 
@@ -56,3 +56,119 @@ class Todos(Base):
     
     # Column to establish a foreign key relationship with the Users table
     owner_id = Column(Integer, ForeignKey("users.id"))
+
+    # Column for the change version, set from the global change counter on every write
+    version = Column(Integer, default=0)
+
+    # Column for the time of the last write
+    updated_at = Column(DateTime)
+
+    __table_args__ = (
+        # Index used by the delta sync endpoint (changes of one owner since a version)
+        Index("ix_todos_owner_id_version", "owner_id", "version"),
+        # Index in the order of GET /todo/next, the top N open todos are its first N entries
+        Index("ix_todos_owner_id_complete_priority", owner_id, complete, priority.desc(), id),
+        # AUTOINCREMENT: the id of a deleted or archived todo is never given to a new one
+        {"sqlite_autoincrement": True},
+    )
+
+# Archived todos model (completed todos moved out of the hot `todos` table)
+class TodosArchive(Base):
+    __tablename__ = "todos_archive"  # Name of the table in the database
+
+    # Same columns as Todos, the id is kept so archived todos keep their identity
+    id = Column(Integer, primary_key=True)
+    title = Column(String)
+    description = Column(String)
+    priority = Column(Integer)
+    complete = Column(Boolean, default=True)
+    owner_id = Column(Integer, ForeignKey("users.id"))
+    version = Column(Integer)
+    updated_at = Column(DateTime)
+
+    # Column for the time the todo was archived
+    archived_at = Column(DateTime)
+
+    # Column for the partition key ("YYYY-MM" of `updated_at`), a whole month can be exported or dropped at once
+    archive_month = Column(String(7))
+
+    # Indexes used by `include_archived` reads and by month-wise maintenance
+    __table_args__ = (
+        Index("ix_todos_archive_owner_id", "owner_id"),
+        Index("ix_todos_archive_archive_month", "archive_month"),
+    )
+
+# Revoked tokens model
+class RevokedTokens(Base):
+    __tablename__ = "revoked_tokens"  # Name of the table in the database
+
+    # Column for the unique id (jti claim) of the revoked token, which is the primary key
+    jti = Column(String, primary_key=True)
+
+    # Column for the expiry of the token, rows can be purged once it has passed
+    expires_at = Column(DateTime, index=True)
+
+# Todo tombstones model (one row per deleted todo, for delta sync)
+class TodoTombstones(Base):
+    __tablename__ = "todo_tombstones"  # Name of the table in the database
+
+    # Column for the primary key, which is an auto-incrementing integer
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Column for the id of the deleted todo
+    todo_id = Column(Integer)
+
+    # Column for the owner of the deleted todo
+    owner_id = Column(Integer)
+
+    # Column for the change version of the delete
+    version = Column(Integer)
+
+    # Column for the time of the delete
+    deleted_at = Column(DateTime)
+
+    # Index used by the delta sync endpoint
+    __table_args__ = (Index("ix_todo_tombstones_owner_id_version", "owner_id", "version"),)
+
+# Change counter model (a single row holding the last issued change version)
+class ChangeCounter(Base):
+    __tablename__ = "change_counter"  # Name of the table in the database
+
+    # Column for the primary key, always 1
+    id = Column(Integer, primary_key=True)
+
+    # Column for the last issued change version
+    value = Column(Integer, nullable=False, default=0)
+
+# Admin jobs model (state of the purge / reassign jobs, shared by every worker process)
+class AdminJobRecords(Base):
+    __tablename__ = "admin_jobs"  # Name of the table in the database
+
+    # Column for the job id (12 hex characters), which is the primary key
+    id = Column(String(12), primary_key=True)
+
+    # Columns for what the job does: "purge" or "reassign" the todos of `user_id` (to `target_id`)
+    kind = Column(String)
+    user_id = Column(Integer)
+    target_id = Column(Integer)
+
+    # Columns for the progress: "pending", "running", "done", "cancelled" or "failed"
+    status = Column(String)
+    total = Column(Integer, default=0)
+    done = Column(Integer, default=0)
+    chunks = Column(Integer, default=0)
+    error = Column(String)
+
+    # Column set by POST /admin/jobs/{id}/cancel in any worker, read by the running job after every chunk
+    cancel_requested = Column(Boolean, default=False)
+
+    # Columns for the times of the job (`updated_at` is written after every chunk)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    # Index used to find the unfinished job of a user
+    __table_args__ = (Index("ix_admin_jobs_status", "status"),)
+
+
+from . import changes  # noqa: E402,F401
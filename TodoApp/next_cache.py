@@ -0,0 +1,135 @@
+# == Import necessary libraries ==
+import os
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from .bus import bus
+from .metrics import metrics
+
+# Settings (can be overridden through environment variables)
+# Enable the in-process cache of GET /todo/next (only correct with a single app process)
+NEXT_CACHE_ENABLED = os.getenv("TODO_NEXT_CACHE", "0") == "1"
+# Users kept in the cache (least recently used are evicted)
+NEXT_CACHE_MAX_USERS = int(os.getenv("TODO_NEXT_CACHE_MAX_USERS", "10000"))
+# Open todos kept per user, GET /todo/next?n= above this always reads the database
+NEXT_CACHE_DEPTH = int(os.getenv("TODO_NEXT_CACHE_DEPTH", "50"))
+
+
+def next_key(priority, todo_id):
+    """
+    Sort key of GET /todo/next: highest priority first, then oldest id.
+    """
+    return (-(priority or 0), todo_id)
+
+
+class _UserEntry:
+    __slots__ = ("keys", "todos", "complete")
+
+    def __init__(self, todos, complete):
+        self.todos = {todo["id"]: todo for todo in todos}  # id -> payload
+        self.keys = sorted(next_key(todo["priority"], todo["id"]) for todo in todos)
+        # True when `keys` holds every open todo of the user, not only the top of the list
+        self.complete = complete
+
+
+class NextTodosCache:
+    """
+    Per-user, ordered top of the open todos, kept current by the todo write
+    handlers (see `_notify_change`), so GET /todo/next does not hit the
+    database while the cached prefix is long enough.
+
+    A user entry holds at most `depth` todos. When it is only a prefix of
+    the user's open todos, a todo ranking below the prefix cannot be placed
+    and is not added, and removals shorten the prefix until a request
+    needs more than is left and reloads it.
+    Must be used from the event loop thread.
+    """
+
+    def __init__(self, enabled=NEXT_CACHE_ENABLED, max_users=NEXT_CACHE_MAX_USERS, depth=NEXT_CACHE_DEPTH):
+        self.enabled = enabled
+        self.max_users = max_users
+        self.depth = depth
+        self._users = OrderedDict()  # owner_id -> _UserEntry
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, owner_id, n):
+        """
+        Returns the top `n` open todos of the user, or None when the cache cannot answer.
+        """
+        entry = self._users.get(owner_id) if self.enabled else None
+        if entry is None or (len(entry.keys) < n and not entry.complete):
+            self.misses += 1
+            return None
+        self._users.move_to_end(owner_id)
+        self.hits += 1
+        return [entry.todos[todo_id] for _, todo_id in entry.keys[:n]]
+
+    def fill(self, owner_id, todos):
+        """
+        Stores the top of the user's open todos, as read from the database
+        (at most `depth` + 1 rows, the extra row tells whether there are more).
+        """
+        if not self.enabled:
+            return
+        self._users[owner_id] = _UserEntry(todos[:self.depth], complete=len(todos) <= self.depth)
+        self._users.move_to_end(owner_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    def apply(self, owner_id, todo=None, todo_id=None):
+        """
+        Applies a committed write: `todo` (a payload) was created or updated,
+        or only `todo_id` was deleted.
+        """
+        # Other workers drop the user, their copy may not have seen earlier writes in order
+        bus.publish("next_todos_cache.invalidate", owner_id=owner_id)
+        entry = self._users.get(owner_id)
+        if entry is None:
+            return
+
+        # Step 1: Drop the old position of the todo
+        todo_id = todo["id"] if todo is not None else todo_id
+        old = entry.todos.pop(todo_id, None)
+        if old is not None:
+            del entry.keys[bisect_left(entry.keys, next_key(old["priority"], todo_id))]
+
+        # Step 2: Insert open todos, unless they rank below a partial prefix
+        if todo is None or todo["complete"]:
+            return
+        key = next_key(todo["priority"], todo_id)
+        if not entry.complete and (not entry.keys or key > entry.keys[-1]):
+            return
+        insort(entry.keys, key)
+        entry.todos[todo_id] = todo
+
+        # Step 3: Keep at most `depth` todos
+        if len(entry.keys) > self.depth:
+            _, dropped_id = entry.keys.pop()
+            del entry.todos[dropped_id]
+            entry.complete = False
+
+    def invalidate(self, owner_id=None, broadcast: bool = True):
+        if owner_id is None:
+            self._users.clear()
+        else:
+            self._users.pop(owner_id, None)
+        if broadcast:
+            bus.publish("next_todos_cache.invalidate", owner_id=owner_id)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "users": len(self._users),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+# Shared cache used by the todos router
+next_todos_cache = NextTodosCache()
+metrics.register_collector("next_todos_cache", next_todos_cache.stats)
+bus.subscribe("next_todos_cache.invalidate",
+              lambda owner_id: next_todos_cache.invalidate(owner_id, broadcast=False))
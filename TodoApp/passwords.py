@@ -0,0 +1,128 @@
+"""
+Password hashing shared by the auth and user routers.
+
+There is one `password_context` (bcrypt). At startup, `calibrate()` times
+bcrypt on the current hardware and picks the highest cost whose verify
+time fits `TODO_PASSWORD_TARGET_MS`, within `TODO_PASSWORD_MIN_ROUNDS` and
+`TODO_PASSWORD_MAX_ROUNDS`. `TODO_PASSWORD_ROUNDS` pins the cost and skips
+the measurement.
+
+Stored hashes with a lower cost are rehashed after a successful login
+(`needs_update`), off the request path. Stronger hashes are kept: a slow
+measurement at startup must not weaken existing passwords.
+"""
+# == Import necessary libraries ==
+import math
+import os
+import time
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from passlib.context import CryptContext
+from passlib.hash import bcrypt
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from .metrics import metrics
+from .models import Users
+from .rate_limit import hashing_limiter
+
+# Settings (can be overridden through environment variables)
+# Time one password verification should take on this machine (milliseconds)
+PASSWORD_TARGET_MS = float(os.getenv("TODO_PASSWORD_TARGET_MS", "250"))
+# Bounds of the calibrated bcrypt cost (each round doubles the work)
+PASSWORD_MIN_ROUNDS = int(os.getenv("TODO_PASSWORD_MIN_ROUNDS", "10"))
+PASSWORD_MAX_ROUNDS = int(os.getenv("TODO_PASSWORD_MAX_ROUNDS", "16"))
+# Fixed bcrypt cost, skips the calibration (empty = calibrate at startup)
+PASSWORD_ROUNDS = os.getenv("TODO_PASSWORD_ROUNDS", "")
+
+# passlib's default, used until `calibrate()` runs
+DEFAULT_ROUNDS = 12
+# Cost timed by the calibration, cheap enough to run at every startup
+PROBE_ROUNDS = 8
+
+password_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__default_rounds=DEFAULT_ROUNDS)
+
+stats = {"rounds": DEFAULT_ROUNDS, "calibrated": False, "probe_ms": None, "estimated_verify_ms": None}
+
+
+def configure(rounds: int):
+    """
+    Hashes new passwords with `rounds`, and flags stored hashes below it for a rehash.
+    """
+    password_context.update(bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds)
+    stats["rounds"] = rounds
+
+
+def hash_with_rounds(secret: str, rounds: int) -> str:
+    """
+    Hashes `secret` at a given cost, whatever the context's current default.
+    """
+    return bcrypt.using(rounds=rounds).hash(secret)
+
+
+def measure_ms(rounds=PROBE_ROUNDS, repeat=3) -> float:
+    """
+    Best of `repeat` bcrypt hashes at `rounds` (milliseconds). Verify costs the same.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        hash_with_rounds("calibration", rounds)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def rounds_for(target_ms, probe_ms, probe_rounds=PROBE_ROUNDS,
+               min_rounds=PASSWORD_MIN_ROUNDS, max_rounds=PASSWORD_MAX_ROUNDS) -> int:
+    """
+    Highest cost whose estimated time fits `target_ms`, given the time of one hash at `probe_rounds`.
+    """
+    rounds = probe_rounds + math.floor(math.log2(target_ms / probe_ms))
+    return max(min_rounds, min(max_rounds, rounds))
+
+
+def calibrate(target_ms=PASSWORD_TARGET_MS) -> int:
+    """
+    Picks and applies the bcrypt cost for this machine (blocking, run it in a worker thread).
+    """
+    if PASSWORD_ROUNDS:
+        rounds = int(PASSWORD_ROUNDS)
+    else:
+        probe_ms = measure_ms()
+        rounds = rounds_for(target_ms, probe_ms)
+        stats["probe_ms"] = round(probe_ms, 2)
+        stats["estimated_verify_ms"] = round(probe_ms * 2 ** (rounds - PROBE_ROUNDS), 1)
+    configure(rounds)
+    stats["calibrated"] = True
+    return rounds
+
+
+def _store_hash(bind, user_id, old_hash, new_hash) -> bool:
+    with Session(bind) as db:
+        # Only replace the hash that was verified, a password change in between wins
+        result = db.execute(
+            update(Users)
+            .where(Users.id == user_id, Users.hashed_password == old_hash)
+            .values(hashed_password=new_hash)
+        )
+        db.commit()
+        return result.rowcount == 1
+
+
+async def rehash_password(bind, user_id: int, password: str, old_hash: str):
+    """
+    Background task: stores `password` hashed at the current cost.
+    Skipped when the hashing pool is saturated, the next login tries again.
+    """
+    try:
+        async with hashing_limiter:
+            new_hash = await run_in_threadpool(password_context.hash, password)
+    except HTTPException:
+        metrics.inc("passwords.rehash_skipped")
+        return
+    if await run_in_threadpool(_store_hash, bind, user_id, old_hash, new_hash):
+        metrics.inc("passwords.rehashed")
+
+
+metrics.register_collector("passwords", lambda: dict(stats))
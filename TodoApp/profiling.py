@@ -0,0 +1,273 @@
+"""
+Opt-in statistical profiler for single requests.
+
+When enabled (`TODO_PROFILING=1`), a request is profiled when:
+
+- an admin asks for it with the `X-Profile: 1` header, or
+- it is picked by random sampling (`TODO_PROFILING_SAMPLE_RATE`).
+
+While a request is profiled, a sampler thread records the Python stacks
+every `TODO_PROFILING_INTERVAL_MS`:
+
+- The event loop thread is recorded while the request's task is running.
+  This covers the handlers and the SQLAlchemy calls made on the loop.
+- Busy worker threads are recorded too. This covers the threadpool work:
+  bcrypt, coalesced reads and imports. Work done there for other requests
+  at the same time is included.
+
+Each profile is written as a collapsed-stack file (flamegraph.pl, speedscope)
+and a speedscope JSON file. The recent ones are listed at GET /admin/profiles.
+When profiling is disabled, the middleware costs one attribute check per request.
+"""
+# == Import necessary libraries ==
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime
+
+from fastapi.concurrency import run_in_threadpool
+
+from .metrics import metrics
+
+# Settings (can be overridden through environment variables)
+PROFILING_ENABLED = os.getenv("TODO_PROFILING", "0") == "1"
+# Fraction of all requests profiled without being asked for (0 = only X-Profile requests)
+PROFILING_SAMPLE_RATE = float(os.getenv("TODO_PROFILING_SAMPLE_RATE", "0"))
+# Time between two stack samples (milliseconds)
+PROFILING_INTERVAL_MS = float(os.getenv("TODO_PROFILING_INTERVAL_MS", "2"))
+# Where the profile files are written, and how many are kept
+PROFILING_DIR = os.getenv("TODO_PROFILING_DIR", "profiles")
+PROFILING_KEEP = int(os.getenv("TODO_PROFILING_KEEP", "50"))
+# Requests profiled at the same time, more are served without profiling
+PROFILING_MAX_ACTIVE = int(os.getenv("TODO_PROFILING_MAX_ACTIVE", "2"))
+
+PROFILE_HEADER = b"x-profile"
+_IDLE_FILES = ("threading.py", "queue.py", "selectors.py")
+
+
+def _frame_name(code):
+    path = code.co_filename.replace("\\", "/").split("/")
+    return f"{code.co_qualname} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+def _stack(frame):
+    """
+    Frame names of a stack, outermost first.
+    """
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    names.reverse()
+    return tuple(names)
+
+
+class Sampler:
+    """
+    Samples the stacks of the loop thread (while `task` runs) and of busy worker threads.
+    """
+
+    def __init__(self, loop, loop_thread_id, task, interval_ms=PROFILING_INTERVAL_MS):
+        self.loop = loop
+        self.loop_thread_id = loop_thread_id
+        self.task = task
+        self.interval = interval_ms / 1000
+        self.samples = Counter()  # stack -> count
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration_ms = (time.perf_counter() - self.started) * 1000
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.sample(own_id)
+
+    def sample(self, own_id=None):
+        self.sample_count += 1
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            if thread_id == self.loop_thread_id:
+                # Only the time the profiled request holds the loop
+                if asyncio.current_task(self.loop) is not self.task:
+                    continue
+                self.samples[("[event loop]",) + _stack(frame)] += 1
+            elif not frame.f_code.co_filename.endswith(_IDLE_FILES):
+                self.samples[("[worker]",) + _stack(frame)] += 1
+
+    def collapsed(self) -> str:
+        """
+        Collapsed-stack text: one `frame;frame;frame count` line per distinct stack.
+        """
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.samples.most_common())
+
+    def speedscope(self, name) -> dict:
+        """
+        Speedscope "sampled" profile (https://www.speedscope.app/file-format-schema.json).
+        """
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, count in self.samples.items():
+            ids = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame})
+                ids.append(index[frame])
+            samples.append(ids)
+            weights.append(count * self.interval * 1000)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "exporter": "todoapp-profiler",
+            "name": name,
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled", "name": name, "unit": "milliseconds",
+                "startValue": 0, "endValue": sum(weights), "samples": samples, "weights": weights,
+            }],
+        }
+
+
+class Profiler:
+    """
+    Keeps the settings, the active count and the index of recent profiles.
+    """
+
+    def __init__(self, enabled=PROFILING_ENABLED, sample_rate=PROFILING_SAMPLE_RATE,
+                 interval_ms=PROFILING_INTERVAL_MS, directory=PROFILING_DIR, keep=PROFILING_KEEP,
+                 max_active=PROFILING_MAX_ACTIVE):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.interval_ms = interval_ms
+        self.directory = directory
+        self.keep = keep
+        self.max_active = max_active
+        self.active = 0
+        self.recent = deque(maxlen=keep)  # newest last
+
+    def path(self, profile_id, fmt):
+        suffix = "speedscope.json" if fmt == "speedscope" else "collapsed.txt"
+        return os.path.join(self.directory, f"{profile_id}.{suffix}")
+
+    def get(self, profile_id):
+        return next((entry for entry in self.recent if entry["id"] == profile_id), None)
+
+    def save(self, sampler, entry):
+        """
+        Writes both files of a finished profile and drops the files of the oldest ones.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(entry["id"], "collapsed"), "w") as file:
+            file.write(sampler.collapsed())
+        with open(self.path(entry["id"], "speedscope"), "w") as file:
+            json.dump(sampler.speedscope(f"{entry['method']} {entry['path']}"), file)
+
+        if len(self.recent) == self.recent.maxlen:
+            oldest = self.recent[0]
+            for fmt in ("collapsed", "speedscope"):
+                try:
+                    os.remove(self.path(oldest["id"], fmt))
+                except FileNotFoundError:
+                    pass
+        self.recent.append(entry)
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling flagged (admin) or sampled requests.
+    """
+
+    def __init__(self, app, profiler=None):
+        self.app = app
+        self.profiler = profiler if profiler is not None else profiler_state
+
+    async def __call__(self, scope, receive, send):
+        profiler = self.profiler
+        # Step 1: Disabled (the common case), nothing else to do
+        if not profiler.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Step 2: Decide whether this request is profiled
+        reason = await self._reason(scope)
+        if reason is None or profiler.active >= profiler.max_active:
+            await self.app(scope, receive, send)
+            return
+
+        # Step 3: Sample while the request runs
+        status_code = None
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        sampler = Sampler(asyncio.get_running_loop(), threading.get_ident(), asyncio.current_task(),
+                          profiler.interval_ms)
+        profiler.active += 1
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            profiler.active -= 1
+
+            # Step 4: Write the files off the loop, after the response went out
+            entry = {
+                "id": uuid.uuid4().hex[:12],
+                "created_at": datetime.utcnow().isoformat(),
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "reason": reason,
+                "duration_ms": round(sampler.duration_ms, 1),
+                "samples": sampler.sample_count,
+                "stacks": len(sampler.samples),
+            }
+            await run_in_threadpool(profiler.save, sampler, entry)
+            metrics.inc("profiling.profiles")
+
+    async def _reason(self, scope):
+        headers = dict(scope["headers"])
+        if headers.get(PROFILE_HEADER) == b"1" and await _is_admin(scope, headers):
+            return "requested"
+        if self.profiler.sample_rate and random.random() < self.profiler.sample_rate:
+            return "sampled"
+        return None
+
+
+async def _is_admin(scope, headers) -> bool:
+    """
+    Same check as the admin routes: the bearer token decoded by `get_current_user` has `user_role == "admin"`.
+    """
+    from .routers.auth import get_current_user
+
+    scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        user = await get_current_user(token)
+    except Exception:
+        return False
+    return user is not None and user.get("user_role") == "admin"
+
+
+# Shared profiler state (settings and recent profiles) used by the middleware and the admin routes
+profiler_state = Profiler()
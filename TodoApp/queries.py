@@ -0,0 +1,35 @@
+"""
+Prebuilt statements for the queries run on (nearly) every request.
+
+`db.query(Todos).filter(...)` builds a new Query, a new Select and new
+criteria objects on every call, then computes the cache key of that whole
+tree to find the compiled SQL. These statements are built once at import
+time with bound parameters. Their cache key is memoized on the statement
+object, so a call only binds the parameter values and looks up the
+engine's compiled cache (`query_cache_size` in database.py).
+
+Run them with `db.scalars(statement, {...}).first()` / `.all()`.
+`python -m TodoApp.benchmarks.bench_queries` compares both styles.
+"""
+# == Import necessary libraries ==
+from sqlalchemy import bindparam, select
+
+from .models import Todos, TodosArchive, Users
+
+# Todos
+todo_by_id = select(Todos).where(Todos.id == bindparam("todo_id")).limit(1)
+todo_of_owner = select(Todos) \
+    .where(Todos.id == bindparam("todo_id")).where(Todos.owner_id == bindparam("owner_id")).limit(1)
+todos_of_owner = select(Todos).where(Todos.owner_id == bindparam("owner_id"))
+archived_todos_of_owner = select(TodosArchive) \
+    .where(TodosArchive.owner_id == bindparam("owner_id")).order_by(TodosArchive.id)
+archived_todo_of_owner = select(TodosArchive) \
+    .where(TodosArchive.id == bindparam("todo_id")).where(TodosArchive.owner_id == bindparam("owner_id")).limit(1)
+next_todos_of_owner = select(Todos) \
+    .where(Todos.owner_id == bindparam("owner_id")).where(Todos.complete == False) \
+    .order_by(Todos.priority.desc(), Todos.id).limit(bindparam("limit"))
+
+# Users
+user_by_id = select(Users).where(Users.id == bindparam("user_id")).limit(1)
+user_by_username = select(Users).where(Users.username == bindparam("username")).limit(1)
+user_by_email = select(Users).where(Users.email == bindparam("email")).limit(1)
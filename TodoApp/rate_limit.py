@@ -0,0 +1,165 @@
+# == Import necessary libraries ==
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request, status
+
+from .metrics import metrics
+
+# Settings (can be overridden through environment variables)
+# Per client IP: sustained requests per second and burst size
+AUTH_RATE_PER_IP = float(os.getenv("TODO_AUTH_RATE_PER_IP", "5"))
+AUTH_BURST_PER_IP = float(os.getenv("TODO_AUTH_BURST_PER_IP", "20"))
+# Per username and client IP (login) or per username (password change): sustained requests per second and burst size
+AUTH_RATE_PER_USER = float(os.getenv("TODO_AUTH_RATE_PER_USER", "1"))
+AUTH_BURST_PER_USER = float(os.getenv("TODO_AUTH_BURST_PER_USER", "10"))
+# Password hashing running at the same time, waiting callers and their wait limit
+HASHING_CONCURRENCY = int(os.getenv("TODO_HASHING_CONCURRENCY", str(os.cpu_count() or 1)))
+HASHING_QUEUE_SIZE = int(os.getenv("TODO_HASHING_QUEUE_SIZE", "64"))
+HASHING_QUEUE_TIMEOUT = float(os.getenv("TODO_HASHING_QUEUE_TIMEOUT", "2"))
+# Upper bound on tracked keys (IPs / usernames) per limiter
+RATE_LIMIT_MAX_KEYS = int(os.getenv("TODO_RATE_LIMIT_MAX_KEYS", "100000"))
+
+
+class TokenBucketLimiter:
+    """
+    One token bucket per key (client IP, username, ...).
+
+    Buckets refill at `rate` tokens per second up to `burst`. The least
+    recently used buckets are dropped past `max_keys`, so memory stays bounded.
+    """
+
+    def __init__(self, name, rate, burst, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """
+        Takes one token for `key`. Returns 0 when allowed, otherwise the
+        number of seconds until a token is available.
+        """
+        now = time.monotonic()
+        with self._lock:
+            # Step 1: Refill the bucket for the time elapsed since the last call
+            tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+
+            # Step 2: Take a token if there is one
+            retry_after = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                retry_after = (1 - tokens) / self.rate if self.rate > 0 else 60.0
+
+            # Step 3: Store it back as most recently used, evict the oldest buckets
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+        if retry_after:
+            metrics.inc(f"rate_limit.{self.name}.rejected")
+        return retry_after
+
+    def check(self, key):
+        """
+        Raises a 429 with `Retry-After` when `key` is over its limit.
+        """
+        retry_after = self.acquire(key)
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests.",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class ConcurrencyLimiter:
+    """
+    Admission control: at most `limit` callers run at once, at most
+    `max_queue` wait for a slot, and nobody waits longer than `timeout`.
+    Callers that cannot be admitted get a fast 503 with `Retry-After`.
+    """
+
+    def __init__(self, name, limit, max_queue, timeout):
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = None
+        self._loop = None
+
+    def _reject(self, reason):
+        metrics.inc(f"admission.{self.name}.{reason}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry.",
+            headers={"Retry-After": str(max(1, math.ceil(self.timeout)))},
+        )
+
+    async def __aenter__(self):
+        # The semaphore is created lazily so it binds to the running event loop
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.limit)
+            self._loop = loop
+
+        # Step 1: Refuse right away when the queue is full
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self._reject("queue_full")
+
+        # Step 2: Take a free slot, or wait for one but not forever
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()  # Returns immediately
+        else:
+            self.waiting += 1
+            try:
+                # Not wait_for: before Python 3.12 it can time out after the acquire succeeded and leak the slot.
+                # A cancelled acquire gives a slot it was handed back itself
+                async with asyncio.timeout(self.timeout):
+                    await self._semaphore.acquire()
+            except TimeoutError:
+                self._reject("timeout")
+            finally:
+                self.waiting -= 1
+
+        self.active += 1
+        metrics.inc(f"admission.{self.name}.admitted")
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.active -= 1
+        self._semaphore.release()
+        return False
+
+    def stats(self):
+        return {"active": self.active, "waiting": self.waiting, "limit": self.limit, "max_queue": self.max_queue}
+
+
+# Shared limiters protecting the password hashing endpoints
+ip_limiter = TokenBucketLimiter("ip", AUTH_RATE_PER_IP, AUTH_BURST_PER_IP)
+username_limiter = TokenBucketLimiter("username", AUTH_RATE_PER_USER, AUTH_BURST_PER_USER)
+hashing_limiter = ConcurrencyLimiter("hashing", HASHING_CONCURRENCY, HASHING_QUEUE_SIZE, HASHING_QUEUE_TIMEOUT)
+metrics.register_collector("hashing_limiter", hashing_limiter.stats)
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+# Dependency: per-IP limit for the password hashing endpoints
+def limit_by_ip(request: Request):
+    ip_limiter.check(client_ip(request))
@@ -0,0 +1,108 @@
+# == Import necessary libraries ==
+import asyncio
+import logging
+import os
+from datetime import datetime
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.dialects.sqlite import insert
+
+from .bus import bus
+from .models import RevokedTokens
+
+logger = logging.getLogger(__name__)
+
+# How often the in-memory list is reloaded from the database (seconds)
+REVOCATION_SYNC_INTERVAL = float(os.getenv("TODO_REVOCATION_SYNC_INTERVAL", "30"))
+
+
+class RevocationList:
+    """
+    In-memory copy of the `revoked_tokens` table.
+
+    `is_revoked` is a dict lookup, so checking a token never costs a DB
+    round trip. Revocations made by this process are visible immediately,
+    revocations made by other processes after the next `sync`.
+    """
+
+    def __init__(self, sync_interval=REVOCATION_SYNC_INTERVAL):
+        self.sync_interval = sync_interval
+        self._revoked = {}  # jti -> expires_at
+        self.last_sync = None
+
+    def is_revoked(self, jti) -> bool:
+        return jti in self._revoked
+
+    def revoke(self, db, jti: str, expires_at: datetime):
+        # Step 1: Persist the revocation so other processes pick it up. A concurrent
+        # logout / refresh of the same token (in another worker) may have inserted it already
+        db.execute(insert(RevokedTokens).values(jti=jti, expires_at=expires_at).on_conflict_do_nothing())
+        db.commit()
+
+        # Step 2: Reject the token in this process (and the other workers) right away
+        self.mark_revoked(jti, expires_at)
+
+    def mark_revoked(self, jti: str, expires_at: datetime, broadcast: bool = True):
+        self._revoked[jti] = expires_at
+        if broadcast:
+            bus.publish("revocation.revoke", jti=jti, expires_at=expires_at.isoformat())
+
+    def sync(self, db):
+        """
+        Reloads the revocation list and purges rows of tokens that have expired anyway.
+        """
+        self._apply(self._load(db))
+
+    async def sync_in_thread(self, session_factory):
+        """
+        `sync` with its queries in a worker thread, the event loop only swaps the list in.
+        """
+        self._apply(await run_in_threadpool(self._load_in_session, session_factory))
+
+    def _load_in_session(self, session_factory):
+        db = session_factory()
+        try:
+            return self._load(db)
+        finally:
+            db.close()
+
+    def _load(self, db):
+        now = datetime.utcnow()
+
+        # Step 1: Expired tokens fail the signature check on their own, drop them
+        db.query(RevokedTokens).filter(RevokedTokens.expires_at < now).delete()
+        db.commit()
+
+        # Step 2: Read the revocations made by every process
+        return now, dict(db.query(RevokedTokens.jti, RevokedTokens.expires_at).all())
+
+    def _apply(self, loaded):
+        now, revoked = loaded
+        # Swap in a fresh dict (a single assignment, readers never see a partial list).
+        # Revocations are final: the unexpired ones marked while the rows were read are kept
+        self._revoked = {**{jti: expires_at for jti, expires_at in self._revoked.items() if expires_at >= now},
+                         **revoked}
+        self.last_sync = now
+
+    def clear(self):
+        self._revoked = {}
+
+    def __len__(self):
+        return len(self._revoked)
+
+    async def run_sync_loop(self, session_factory):
+        """
+        Background task: sync now, then every `sync_interval` seconds.
+        """
+        while True:
+            try:
+                await self.sync_in_thread(session_factory)
+            except Exception:
+                logger.exception("Could not sync the token revocation list")
+            await asyncio.sleep(self.sync_interval)
+
+
+# Shared revocation list checked by `get_current_user`
+revocation_list = RevocationList()
+bus.subscribe("revocation.revoke", lambda jti, expires_at: revocation_list.mark_revoked(
+    jti, datetime.fromisoformat(expires_at), broadcast=False))
@@ -1,16 +1,27 @@
 # == Import necessary libraries ==
+import os
 # TODO 1: Import necessary libraries from typing and Pydantic
-from typing import Annotated
+from typing import Annotated, Literal
 from pydantic import BaseModel, Field
 # TODO 2: Import necessary modules from SQLAlchemy and FastAPI
 from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, HTTPException, Path, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Path, Query, Request, status
+from fastapi.responses import FileResponse
 # TODO 3: Import the Todos model
 from ..models import Todos
-# TODO 4: Import database connection details (engine and session factory)
-from ..database import SessionLocal
+from .. import queries
+# TODO 4: Import the shared request-scoped database session dependency
+from ..database import get_db
+from ..metrics import metrics
+from ..profiling import profiler_state
+from ..single_flight import coalesced_json
+from ..admin_jobs import admin_jobs, count_todos
+from ..events import event_hub
+from ..inactive_users import inactive_users
+from ..user_cache import user_cache
 
 from .auth import get_current_user 
+from .todos import _notify_change
 
 # TODO 5: Create an instance of APIRouter with prefix and tags
 router = APIRouter(
@@ -18,27 +29,19 @@ router = APIRouter(
     tags=["admin"]
 )
 
-# TODO 6: Define a dependency function to provide a database session
-def get_db():
-    """
-    Creates a database session, yields it for use,
-    and closes the session to ensure proper resource management.
-    """
-
-    db = SessionLocal()  # Step 1: Create a database session object
-    try:
-        yield db  # Step 2: Yield the session object to the caller
-    finally:
-        db.close()  # Step 3: Close the session to release resources
-
 # TODO 7: Define a dependency object for type hinting and injection
 db_dependency = Annotated[Session, Depends(get_db)]
 user_dendency = Annotated[dict, Depends(get_current_user)]
 
+# TODO 8: Create Pydantic Request models
+class DeactivateRequest(BaseModel):
+    todos: Literal["keep", "purge", "reassign"] = "keep"  # What happens to the user's todos
+    reassign_to: int | None = Field(default=None, gt=0)  # Required by reassign
+
 
 # Endpoint to retrieve all Todo items
 @router.get("/todo", status_code=status.HTTP_200_OK)
-async def read_all(user: user_dendency, db: db_dependency):
+async def read_all(user: user_dendency, db: db_dependency, request: Request):
     """
     Retrieves all Todo items from the database if the user is authenticated as an admin.
     If authentication fails, raises HTTP 401 Unauthorized error.
@@ -48,7 +51,8 @@ async def read_all(user: user_dendency, db: db_dependency):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
     
     # Return all Todo items
-    return db.query(Todos).all()
+    # (concurrent dashboard refreshes share one full-table query and one serialization)
+    return await coalesced_json(request, "admin", db.get_bind(), lambda session: session.query(Todos).all())
 
 
 
@@ -60,11 +64,164 @@ async def delete_todo_by_id(user: user_dendency, db: db_dependency, todo_id: int
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
     
     # [2] Delete Todo
-    todo_item = db.query(Todos).filter(Todos.id == todo_id).first()
+    todo_item = db.scalars(queries.todo_by_id, {"todo_id": todo_id}).first()
     if not todo_item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo Not Found")
 
+    owner_id = todo_item.owner_id
     db.delete(todo_item)
     db.commit()
+
+    # [3] Notify the owner's event streams
+    _notify_change("deleted", owner_id, todo_id=todo_id)
     
     return {"Message": "Delete Item Successfully"}
+
+
+# Endpoint to read the in-process metrics (batching, caches, limiters, ...)
+@router.get("/metrics", status_code=status.HTTP_200_OK)
+async def read_metrics(user: user_dendency):
+    # [1] Validation
+    if user is None or user.get("user_role") != "admin":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
+
+    # [2] Snapshot of every counter, histogram and collector
+    return metrics.snapshot()
+
+
+# Endpoint to list the recent request profiles (see profiling.py)
+@router.get("/profiles", status_code=status.HTTP_200_OK)
+async def read_profiles(user: user_dendency):
+    # [1] Validation
+    if user is None or user.get("user_role") != "admin":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
+
+    # [2] Newest first
+    return {
+        "enabled": profiler_state.enabled,
+        "sample_rate": profiler_state.sample_rate,
+        "profiles": list(reversed(profiler_state.recent)),
+    }
+
+
+# Endpoint to download one profile, for speedscope.app or flamegraph.pl
+@router.get("/profiles/{profile_id}", status_code=status.HTTP_200_OK)
+async def read_profile(user: user_dendency, profile_id: str = Path(pattern="^[0-9a-f]{12}$"),
+                       format: str = Query(default="speedscope", pattern="^(speedscope|collapsed)$")):
+    # [1] Validation
+    if user is None or user.get("user_role") != "admin":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
+
+    # [2] Only profiles still listed (their files are kept)
+    if profiler_state.get(profile_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile Not Found")
+
+    media_type = "application/json" if format == "speedscope" else "text/plain"
+    return FileResponse(profiler_state.path(profile_id, format), media_type=media_type,
+                        filename=os.path.basename(profiler_state.path(profile_id, format)))
+
+
+# Endpoint to deactivate a user, and purge or reassign their todos in a background job
+@router.post("/users/{user_id}/deactivate", status_code=status.HTTP_200_OK)
+async def deactivate_user(user: user_dendency, db: db_dependency, background_tasks: BackgroundTasks,
+                          user_id: int = Path(gt=0), deactivate_req: DeactivateRequest | None = None):
+    """
+    Deactivates the user right away: their tokens and logins are rejected.
+    With `todos` set to `purge` or `reassign`, their todos are processed in
+    chunks by a background job, followed at GET /admin/jobs/{job_id}.
+    """
+    # [1] Validation
+    if user is None or user.get("user_role") != "admin":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
+    deactivate_req = deactivate_req or DeactivateRequest()
+    if user_id == user.get("id"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Admins cannot deactivate themselves.")
+    target_user = db.scalars(queries.user_by_id, {"user_id": user_id}).first()
+    if target_user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User Not Found")
+    if deactivate_req.todos == "reassign":
+        if deactivate_req.reassign_to is None or deactivate_req.reassign_to == user_id:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="reassign needs another user in 'reassign_to'.")
+        new_owner = db.scalars(queries.user_by_id, {"user_id": deactivate_req.reassign_to}).first()
+        if new_owner is None or new_owner.is_active is False:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Active user to reassign to Not Found")
+
+    # [2] Deactivate and record the job in one transaction, effective immediately in this process
+    target_user.is_active = False
+    job = None
+    if deactivate_req.todos != "keep":
+        job = admin_jobs.create(db, deactivate_req.todos, user_id, deactivate_req.reassign_to, count_todos(db, user_id))
+        if job is None:
+            db.rollback()
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A job is already running for this user.")
+    db.commit()
+    inactive_users.mark(user_id)
+    user_cache.invalidate(user_id)
+    # Open event streams (in every worker) end, their reconnect is refused
+    event_hub.resync(user_id)
+
+    # [3] Purge / reassign the todos after the response, chunk by chunk
+    if job is not None:
+        background_tasks.add_task(admin_jobs.run, job, db.get_bind())
+
+    return {"user_id": user_id, "is_active": False, "job": job.to_dict() if job is not None else None}
+
+
+# Endpoint to reactivate a user
+@router.post("/users/{user_id}/activate", status_code=status.HTTP_200_OK)
+async def activate_user(user: user_dendency, db: db_dependency, user_id: int = Path(gt=0)):
+    # [1] Validation
+    if user is None or user.get("user_role") != "admin":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
+    target_user = db.scalars(queries.user_by_id, {"user_id": user_id}).first()
+    if target_user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User Not Found")
+
+    # [2] Activate
+    target_user.is_active = True
+    db.commit()
+    inactive_users.mark(user_id, inactive=False)
+    user_cache.invalidate(user_id)
+
+    return {"user_id": user_id, "is_active": True}
+
+
+# Endpoint to list the admin jobs (newest first)
+@router.get("/jobs", status_code=status.HTTP_200_OK)
+async def read_jobs(user: user_dendency, db: db_dependency):
+    # [1] Validation
+    if user is None or user.get("user_role") != "admin":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
+
+    return admin_jobs.list(db)
+
+
+# Endpoint to follow the progress of one admin job
+@router.get("/jobs/{job_id}", status_code=status.HTTP_200_OK)
+async def read_job(user: user_dendency, db: db_dependency, job_id: str = Path(pattern="^[0-9a-f]{12}$")):
+    # [1] Validation
+    if user is None or user.get("user_role") != "admin":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
+
+    job = admin_jobs.get(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job Not Found")
+    return job.to_dict()
+
+
+# Endpoint to cancel an admin job (it stops after the chunk in progress)
+@router.post("/jobs/{job_id}/cancel", status_code=status.HTTP_202_ACCEPTED)
+async def cancel_job(user: user_dendency, db: db_dependency, job_id: str = Path(pattern="^[0-9a-f]{12}$")):
+    # [1] Validation
+    if user is None or user.get("user_role") != "admin":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
+
+    job = admin_jobs.get(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job Not Found")
+    if job.finished:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job already {job.status}.")
+
+    # [2] Ask the job to stop
+    admin_jobs.cancel(db, job)
+    return job.to_dict()
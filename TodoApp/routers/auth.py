@@ -1,15 +1,22 @@
 # == Import necessary libraries ==
 # TODO 1: Import necessary libraries
+import uuid
 from datetime import datetime, timedelta
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, status  # Import necessary modules from FastAPI
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status  # Import necessary modules from FastAPI
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel  # Import BaseModel from Pydantic for data validation
 from ..models import Users  # Import the Users model
-from passlib.context import CryptContext
-from ..database import SessionLocal 
+from .. import queries
+from ..database import get_db
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from jose import JWTError, jwt
+from ..revocation import revocation_list
+from ..inactive_users import inactive_users
+from ..rate_limit import client_ip, hashing_limiter, limit_by_ip, username_limiter
+from ..passwords import password_context, rehash_password
+from ..user_cache import user_cache
 
 # TODO 2: Create an instance of APIRouter
 router = APIRouter(
@@ -21,9 +28,11 @@ router = APIRouter(
 # TODO 3: Define JWT settings
 SECRET_KEY = "e5a6dbbdaeb1bcf184223e137bce2795f35ab1ed5b86f7a6a1d44457e2078a11"
 ALG = "HS256"
+ACCESS_TOKEN_EXPIRES = timedelta(minutes=20)
+REFRESH_TOKEN_EXPIRES = timedelta(days=7)
 
-# TODO 4: Initialize the CryptContext for password hashing using bcrypt
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# TODO 4: Use the shared CryptContext for password hashing (bcrypt, cost calibrated at startup)
+bcrypt_context = password_context
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl='auth/token')
 
 # TODO 5: Define Pydantic models for user input and token
@@ -39,38 +48,37 @@ class UserIn(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: str | None = None
 
-# TODO 6: Define dependency function to provide database session
-def get_db():
-    """
-    Creates a database session, yields it for use,
-    and closes the session to ensure proper resource management.
-    """
-    db = SessionLocal()  # Step 1: Create a database session object
-    try:
-        yield db  # Step 2: Yield the session object to the caller
-    finally:
-        db.close()  # Step 3: Close the session to release resources
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 # Dependency object for type hinting and injection
 db_dependency = Annotated[Session, Depends(get_db)]
 
 # TODO 3.5: Helper Method to find the User
-def _auth_user(username: str, password: str, db):
-    user = db.query(Users).filter(Users.username == username).first()  # Step 1: Query the user by username
+def _auth_user(username: str, password: str, db, background_tasks: BackgroundTasks | None = None):
+    user = db.scalars(queries.user_by_username, {"username": username}).first()  # Step 1: Query the user by username
 
     # Step 2: Check if user exists and password is correct
     if not user: 
         return False 
     if not bcrypt_context.verify(password, user.hashed_password): 
         return False 
+    if user.is_active is False:  # Deactivated by an admin
+        return False
+
+    # Step 3: Hashed with an outdated cost, rehash after the response is sent
+    if background_tasks is not None and bcrypt_context.needs_update(user.hashed_password):
+        background_tasks.add_task(rehash_password, db.get_bind(), user.id, password, user.hashed_password)
 
-    return user  # Step 3: Return the user if authentication is successful
+    return user  # Step 4: Return the user if authentication is successful
 
 # TODO 3.5: Helper Method to Create an Access token
-def _create_access_token(username: str, user_id: int,role : str,  expires_delta: timedelta):
+def _create_access_token(username: str, user_id: int,role : str,  expires_delta: timedelta, token_type: str = "access"):
     # Step 1: Initialize the payload with user details
-    encode = {"username": username, "id": user_id, 'role' : role}
+    # (`jti` is a unique token id, used to revoke this token before it expires)
+    encode = {"username": username, "id": user_id, 'role' : role, "jti": uuid.uuid4().hex, "type": token_type}
     
     # Step 2: Calculate the expiration time for the token
     expiers = datetime.utcnow() + expires_delta
@@ -81,6 +89,25 @@ def _create_access_token(username: str, user_id: int,role : str,  expires_delta:
     # Step 4: Encode the payload into a JWT using the secret key and algorithm
     return jwt.encode(encode, SECRET_KEY, algorithm=ALG)
 
+# TODO 3.6: Helper Method to Create a Refresh token (only accepted by /auth/refresh)
+def _create_refresh_token(username: str, user_id: int, role: str, expires_delta: timedelta = REFRESH_TOKEN_EXPIRES):
+    return _create_access_token(username, user_id, role, expires_delta, token_type="refresh")
+
+# TODO 3.7: Helper Method to issue a new access / refresh token pair
+def _issue_tokens(username: str, user_id: int, role: str):
+    return {
+        'access_token': _create_access_token(username, user_id, role, ACCESS_TOKEN_EXPIRES),
+        'refresh_token': _create_refresh_token(username, user_id, role),
+        'token_type': 'bearer',
+    }
+
+# TODO 3.8: Helper Method to revoke a decoded token by its `jti`
+def _revoke_payload(db, payload: dict):
+    jti = payload.get("jti")
+    if jti is None:
+        return
+    revocation_list.revoke(db, jti, datetime.utcfromtimestamp(payload.get("exp", 0)))
+
 # find current User 
 async def get_current_user(token : Annotated[str, Depends(oauth2_bearer)]): 
     try : 
@@ -91,47 +118,109 @@ async def get_current_user(token : Annotated[str, Depends(oauth2_bearer)]):
         
         if username is None or user_id is None : 
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate user.")
+        # Refresh tokens can only be exchanged at /auth/refresh
+        if payload.get("type") == "refresh":
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate user.")
+        # In-memory lookup, no DB round trip on the request path
+        if revocation_list.is_revoked(payload.get("jti")):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has been revoked.")
+        # Same for deactivated users (in-memory set)
+        if inactive_users.is_inactive(user_id):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User has been deactivated.")
         return {"username" : username , "id" : user_id , "user_role" : user_role}
     except JWTError : 
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate user.")
 
 # TODO 7: Define a POST endpoint to create a new user
-@router.post("", status_code=status.HTTP_201_CREATED)
+@router.post("", status_code=status.HTTP_201_CREATED, dependencies=[Depends(limit_by_ip)])
 async def create_user(db: db_dependency, UserReq: UserIn):
     # Step 1: Check if the email already exists in the database
-    if db.query(Users).filter(Users.email == UserReq.email).first():
+    if db.scalars(queries.user_by_email, {"email": UserReq.email}).first():
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
    
-    # Step 2: Create a new user model instance with the provided user input
+    # Step 2: Hash the password in a worker thread (bcrypt is CPU heavy), admission controlled
+    async with hashing_limiter:
+        hashed_password = await run_in_threadpool(bcrypt_context.hash, UserReq.password)
+
+    # Step 3: Create a new user model instance with the provided user input
     user_model = Users(
         email=UserReq.email,
         username=UserReq.username,
         first_name=UserReq.first_name,
         last_name=UserReq.last_name,
         role=UserReq.role,
-        hashed_password=bcrypt_context.hash(UserReq.password),
+        hashed_password=hashed_password,
         is_active=True,
         phone_number=UserReq.phone_number
     )
-    # Step 3: Save the new user to the database
+    # Step 4: Save the new user to the database (a reused id must not be served from the user cache)
     db.add(user_model)
     db.commit()
+    user_cache.invalidate(user_model.id)
         
-    # Step 4: Return a success message
+    # Step 5: Return a success message
     return {"Message": "Added User Successfully"}
 
 # TODO 8: Define a POST endpoint to handle user login and generate access tokens
-@router.post("/token", response_model=Token)
-async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: db_dependency):
+@router.post("/token", response_model=Token, dependencies=[Depends(limit_by_ip)])
+async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: db_dependency,
+                                 background_tasks: BackgroundTasks, request: Request):
+    # Step 0: Limit login attempts per username and client IP (per username only, anyone spraying
+    # wrong passwords could lock the user out)
+    username_limiter.check((form_data.username, client_ip(request)))
+
     # Step 1: Authenticate the user using the provided username and password
-    user = _auth_user(form_data.username, form_data.password, db)
+    # (bcrypt runs in a worker thread, at most HASHING_CONCURRENCY at once)
+    async with hashing_limiter:
+        user = await run_in_threadpool(_auth_user, form_data.username, form_data.password, db, background_tasks)
     
     # Step 2: If authentication fails, raise an HTTP 404 error with a relevant message
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Username or password is incorrect.")
     
-    # Step 3: Create an access token for the authenticated user
-    token = _create_access_token(user.username, user.id, user.role,timedelta(minutes=20))
-    
-    # Step 4: Return the access token and token type
-    return {'access_token': token, 'token_type': 'bearer'}
+    # Step 3: Create and return an access token and a refresh token for the authenticated user
+    return _issue_tokens(user.username, user.id, user.role)
+
+# TODO 9: Define a POST endpoint to exchange a refresh token for a new token pair
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(db: db_dependency, refresh_req: RefreshRequest):
+    # Step 1: Decode the refresh token
+    try:
+        payload = jwt.decode(refresh_req.refresh_token, SECRET_KEY, algorithms=[ALG])
+    except JWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate refresh token.")
+
+    # Step 2: Only unrevoked refresh tokens are accepted
+    if payload.get("type") != "refresh" or payload.get("id") is None or revocation_list.is_revoked(payload.get("jti")) \
+            or inactive_users.is_inactive(payload.get("id")):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate refresh token.")
+
+    # Step 3: Reload the user, the new tokens carry its current username and role (not the old token's)
+    user = db.scalars(queries.user_by_id, {"user_id": payload.get("id")}).first()
+    if user is None or user.is_active is False:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate refresh token.")
+
+    # Step 4: Rotate, the used refresh token cannot be used again
+    _revoke_payload(db, payload)
+
+    # Step 5: Return a new token pair
+    return _issue_tokens(user.username, user.id, user.role)
+
+# TODO 10: Define a POST endpoint to revoke the current access token (and optionally a refresh token)
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(token: Annotated[str, Depends(oauth2_bearer)], db: db_dependency, refresh_req: RefreshRequest | None = None):
+    # Step 1: The access token must still be valid to be revoked
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALG])
+    except JWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate user.")
+    _revoke_payload(db, payload)
+
+    # Step 2: Revoke the refresh token of the same user, if given
+    if refresh_req is not None:
+        try:
+            refresh_payload = jwt.decode(refresh_req.refresh_token, SECRET_KEY, algorithms=[ALG])
+        except JWTError:
+            refresh_payload = None
+        if refresh_payload is not None and refresh_payload.get("id") == payload.get("id"):
+            _revoke_payload(db, refresh_payload)
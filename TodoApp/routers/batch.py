@@ -0,0 +1,149 @@
+# == Import necessary libraries ==
+# TODO 1: Import necessary libraries from typing and Pydantic
+from typing import Annotated, Literal
+from pydantic import BaseModel, Field
+# TODO 2: Import necessary modules from SQLAlchemy and FastAPI
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status
+# TODO 3: Import the shared request-scoped database session dependency
+from ..database import begin_transaction, get_db
+
+from .auth import get_current_user
+from .todos import TodoRequest, _create_todo, _update_todo, _delete_todo, _notify_change
+from .user import _change_phone_number
+from ..user_cache import user_cache
+
+# TODO 4: Create an instance of APIRouter with prefix and tags
+router = APIRouter(
+    prefix="/batch",
+    tags=["batch"]
+)
+
+# TODO 5: Define a dependency object for type hinting and injection
+db_dependency = Annotated[Session, Depends(get_db)]
+user_dendency = Annotated[dict, Depends(get_current_user)]
+
+# Maximum number of operations in one batch request
+MAX_BATCH_OPERATIONS = 100
+
+# TODO 6: Create Pydantic Request models for the batch
+class BatchOperation(BaseModel):
+    op: Literal["create_todo", "update_todo", "delete_todo", "change_phone_number"]
+    todo_id: int | None = Field(default=None, gt=0)  # Required by update_todo / delete_todo
+    todo: TodoRequest | None = None  # Required by create_todo / update_todo
+    phone_number: str | None = None  # Required by change_phone_number
+
+class BatchRequest(BaseModel):
+    atomic: bool = False  # All operations succeed, or none is applied
+    operations: list[BatchOperation] = Field(min_length=1, max_length=MAX_BATCH_OPERATIONS)
+
+
+class _OperationError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        self.status_code = status_code
+        self.detail = detail
+
+
+# Helper Method to run one operation in the session, returns (status, result, notification)
+def _run_operation(db: Session, user_id: int, operation: BatchOperation):
+    if operation.op == "create_todo":
+        if operation.todo is None:
+            raise _OperationError(status.HTTP_400_BAD_REQUEST, "create_todo needs 'todo'.")
+        todo_model = _create_todo(db, user_id, operation.todo)
+        db.flush()  # Assigns the id
+        return status.HTTP_201_CREATED, {"id": todo_model.id}, ("created", todo_model, None)
+
+    if operation.op == "update_todo":
+        if operation.todo is None or operation.todo_id is None:
+            raise _OperationError(status.HTTP_400_BAD_REQUEST, "update_todo needs 'todo_id' and 'todo'.")
+        todo_model = _update_todo(db, user_id, operation.todo_id, operation.todo)
+        if todo_model is None:
+            raise _OperationError(status.HTTP_404_NOT_FOUND, "Todo not found.")
+        db.flush()
+        return status.HTTP_204_NO_CONTENT, None, ("updated", todo_model, None)
+
+    if operation.op == "delete_todo":
+        if operation.todo_id is None:
+            raise _OperationError(status.HTTP_400_BAD_REQUEST, "delete_todo needs 'todo_id'.")
+        if not _delete_todo(db, user_id, operation.todo_id):
+            raise _OperationError(status.HTTP_404_NOT_FOUND, "Todo not found.")
+        db.flush()
+        return status.HTTP_204_NO_CONTENT, None, ("deleted", None, operation.todo_id)
+
+    # change_phone_number
+    if operation.phone_number is None:
+        raise _OperationError(status.HTTP_400_BAD_REQUEST, "change_phone_number needs 'phone_number'.")
+    if _change_phone_number(db, user_id, operation.phone_number) is None:
+        raise _OperationError(status.HTTP_404_NOT_FOUND, "User Not Found")
+    db.flush()
+    return status.HTTP_204_NO_CONTENT, None, None
+
+
+# TODO 7: Define a POST endpoint running many operations in one request and one transaction
+@router.post("", status_code=status.HTTP_200_OK)
+async def run_batch(user: user_dendency, db: db_dependency, batch_req: BatchRequest):
+    """
+    Runs a list of todo / user operations for the authenticated user with a single commit.
+
+    Every operation gets its own result (`status` is the HTTP status the single
+    endpoint would have answered). Without `atomic`, a failing operation is
+    rolled back on its own (savepoint) and the others are still committed.
+    With `atomic`, the first failure rolls back the whole batch.
+    """
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
+
+    user_id = user.get("id")
+    results = []
+    notifications = []
+    failed = False
+
+    # Step 1: Run the operations in order, in one transaction (savepoints would commit on their own otherwise)
+    begin_transaction(db)
+    for index, operation in enumerate(batch_req.operations):
+        if failed and batch_req.atomic:
+            results.append({"index": index, "op": operation.op, "status": status.HTTP_424_FAILED_DEPENDENCY,
+                            "detail": "Not run, an earlier operation failed."})
+            continue
+
+        savepoint = None if batch_req.atomic else db.begin_nested()
+        try:
+            status_code, result, notification = _run_operation(db, user_id, operation)
+        except (_OperationError, SQLAlchemyError) as error:
+            failed = True
+            if savepoint is not None:
+                savepoint.rollback()
+            if isinstance(error, SQLAlchemyError):
+                # e.g. a constraint violation or "database is locked", the batch goes on (or rolls back if atomic)
+                error = _OperationError(
+                    status.HTTP_409_CONFLICT if isinstance(error, IntegrityError) else status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    "Database error.",
+                )
+            results.append({"index": index, "op": operation.op, "status": error.status_code, "detail": error.detail})
+            continue
+
+        if savepoint is not None:
+            savepoint.commit()
+        results.append({"index": index, "op": operation.op, "status": status_code, "result": result})
+        if notification is not None:
+            notifications.append(notification)
+
+    # Step 2: One commit for the whole batch (or nothing at all for a failed atomic batch)
+    committed = not (failed and batch_req.atomic)
+    if committed:
+        db.commit()
+        for event_type, todo_model, todo_id in notifications:
+            _notify_change(event_type, user_id, todo_model, todo_id=todo_id)
+        if any(operation.op == "change_phone_number" for operation in batch_req.operations):
+            user_cache.invalidate(user_id)
+    else:
+        db.rollback()
+        for result in results:
+            if result["status"] < 300:
+                result["status"] = status.HTTP_424_FAILED_DEPENDENCY
+                result["detail"] = "Rolled back, an operation of the atomic batch failed."
+                result.pop("result", None)
+
+    # Step 3: Return the per-operation results
+    return {"atomic": batch_req.atomic, "committed": committed, "results": results}
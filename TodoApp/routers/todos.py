@@ -4,13 +4,21 @@ from typing import Annotated
 from pydantic import BaseModel, Field
 # TODO 2: Import necessary modules from SQLAlchemy and FastAPI
 from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, HTTPException, Path, status
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, status
+from fastapi.responses import StreamingResponse
 # TODO 3: Import the Todos model
-from ..models import Todos
-# TODO 4: Import database connection details (engine and session factory)
-from ..database import SessionLocal
+from ..models import Todos, TodoTombstones
+from ..changes import current_version, record_tombstones
+from .. import queries
+# TODO 4: Import the shared request-scoped database session dependency
+from ..database import get_db
 
 from .auth import get_current_user 
+from ..write_batcher import write_batcher
+from ..events import event_hub, todo_payload
+from ..single_flight import coalesced_json
+from ..next_cache import next_todos_cache
+from ..importer import detect_format, import_todos
 
 # TODO 5: Create an instance of APIRouter with prefix and tags
 router = APIRouter(
@@ -18,19 +26,6 @@ router = APIRouter(
     tags=["todo"]
 )
 
-# TODO 6: Define a dependency function to provide a database session
-def get_db():
-    """
-    Creates a database session, yields it for use,
-    and closes the session to ensure proper resource management.
-    """
-
-    db = SessionLocal()  # Step 1: Create a database session object
-    try:
-        yield db  # Step 2: Yield the session object to the caller
-    finally:
-        db.close()  # Step 3: Close the session to release resources
-
 # TODO 7: Define a dependency object for type hinting and injection
 db_dependency = Annotated[Session, Depends(get_db)]
 user_dendency = Annotated[dict, Depends(get_current_user)]
@@ -42,24 +37,203 @@ class TodoRequest(BaseModel):
     priority: int = Field(gt=0, lt=6)  # Define the priority field with a range of 1-5
     complete: bool  # Define the complete field as a boolean
 
+# Helper Method to add a new Todo to a session (the caller commits)
+def _create_todo(db: Session, owner_id: int, todo_item: TodoRequest):
+    todo_model = Todos(**todo_item.model_dump(), owner_id=owner_id)
+    db.add(todo_model)
+    return todo_model
+
+# Helper Method to move an owned archived Todo back to the hot table in a session (the caller commits)
+def _restore_todo(db: Session, owner_id: int, todo_id: int):
+    archived = db.scalars(queries.archived_todo_of_owner, {"todo_id": todo_id, "owner_id": owner_id}).first()
+    if archived is None:
+        return None
+    # Same id, the insert gives it a new version so delta sync clients fetch it again
+    todo_model = Todos(id=archived.id, title=archived.title, description=archived.description,
+                       priority=archived.priority, complete=archived.complete, owner_id=owner_id)
+    db.delete(archived)
+    db.add(todo_model)
+    return todo_model
+
+# Helper Method to update an owned Todo in a session (the caller commits)
+def _update_todo(db: Session, owner_id: int, todo_id: int, todo_req: TodoRequest):
+    todo_model = db.scalars(queries.todo_of_owner, {"todo_id": todo_id, "owner_id": owner_id}).first()
+    if todo_model is None:
+        # An archived todo is edited (or reopened) in the hot table
+        todo_model = _restore_todo(db, owner_id, todo_id)
+    if todo_model is None:
+        return None
+
+    todo_model.title = todo_req.title
+    todo_model.description = todo_req.description
+    todo_model.priority = todo_req.priority
+    todo_model.complete = todo_req.complete
+    return todo_model
+
+# Helper Method to delete an owned Todo in a session (the caller commits)
+def _delete_todo(db: Session, owner_id: int, todo_id: int) -> bool:
+    todo_model = db.scalars(queries.todo_of_owner, {"todo_id": todo_id, "owner_id": owner_id}).first()
+    if todo_model is None:
+        # An archived todo has no ORM delete event, write its tombstone here
+        archived = db.scalars(queries.archived_todo_of_owner, {"todo_id": todo_id, "owner_id": owner_id}).first()
+        if archived is None:
+            return False
+        db.delete(archived)
+        record_tombstones(db.connection(), [(todo_id, owner_id)])
+        return True
+    # Delete through the ORM, so a tombstone is recorded
+    db.delete(todo_model)
+    return True
+
+# Helper Method to push a committed change to the owner's event streams and caches
+def _notify_change(event_type: str, owner_id: int, todo_model=None, todo_id: int = None):
+    # Step 1: Keep the cached top of the open todos current
+    if next_todos_cache.enabled:
+        next_todos_cache.apply(owner_id, todo_payload(todo_model) if todo_model is not None else None, todo_id)
+    # Step 2: Nobody is listening, skip building the payload
+    if not event_hub.has_subscribers(owner_id):
+        return
+    # Step 3: Publish the full todo (created / updated) or only its id (deleted)
+    data = todo_payload(todo_model) if todo_model is not None else {"id": todo_id}
+    event_hub.publish(owner_id, event_type, data)
+
 # TODO 9: Define a GET endpoint to fetch all todos
 @router.get("", status_code=status.HTTP_200_OK)
-async def read_all_todo(user: user_dendency,db: db_dependency):
+async def read_all_todo(user: user_dendency,db: db_dependency, request: Request,
+                        include_archived: bool = Query(default=False)):
     """
     This endpoint retrieves all todos from the database.
+    Archived todos (old completed ones) are only included with `include_archived=true`.
     """
     if user is None : 
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
     # TODO 9.1: Query the database to get all todos
-    todo_models = db.query(Todos).filter(Todos.owner_id == user.get("id")).all()
-
-    # TODO 9.2: Check if todos exist
-    if todo_models is not None:
-        # Step 1: Return the list of todos if they are found
+    # (in a session of the shared load, not the request's `db`)
+    def load(session):
+        todo_models = session.scalars(queries.todos_of_owner, {"owner_id": user.get("id")}).all()
+        if include_archived:
+            todo_models += session.scalars(queries.archived_todos_of_owner, {"owner_id": user.get("id")}).all()
         return todo_models
 
-    # TODO 9.3: Raise an HTTP 404 error if no todos are found
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todos not found")
+    # (identical concurrent requests of the same user share one query and one serialization)
+    return await coalesced_json(request, user.get("id"), db.get_bind(), load)
+
+# TODO 9.4: Define a GET endpoint streaming the user's todo changes (server-sent events)
+@router.get("/events", status_code=status.HTTP_200_OK)
+async def stream_todo_events(user: user_dendency):
+    """
+    Server-sent events stream of `created`, `updated` and `deleted` todo events.
+    A `resync` event means events were dropped, the client should catch up
+    with /todo/changes and reconnect.
+    """
+    if user is None : 
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
+
+    return StreamingResponse(
+        event_hub.subscribe_and_stream(user.get("id")),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# TODO 9.5: Define a GET endpoint returning only the todos changed since a version (delta sync)
+@router.get("/changes", status_code=status.HTTP_200_OK)
+async def read_todo_changes(user: user_dendency, db: db_dependency,
+                            since: int | None = Query(default=None, ge=0),
+                            limit: int = Query(default=500, gt=0, le=5000)):
+    """
+    Returns the todos created or updated, and the ids of the todos deleted,
+    after the client-held version `since` (everything when `since` is omitted).
+
+    Keep `next_version` and pass it as `since` on the next call.
+    While `has_more` is true, call again right away to get the next page.
+    """
+    if user is None : 
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
+
+    # Step 1: Take the snapshot version first, writes committed later show up next time
+    snapshot = current_version(db)
+    after = -1 if since is None else since
+
+    # Step 2: Changed rows and tombstones, both served by the (owner_id, version) indexes
+    changed = db.query(Todos).filter(Todos.owner_id == user.get("id")) \
+        .filter(Todos.version > after).filter(Todos.version <= snapshot) \
+        .order_by(Todos.version).limit(limit + 1).all()
+    deleted = []
+    if since is not None:
+        deleted = db.query(TodoTombstones).filter(TodoTombstones.owner_id == user.get("id")) \
+            .filter(TodoTombstones.version > after).filter(TodoTombstones.version <= snapshot) \
+            .order_by(TodoTombstones.version).limit(limit + 1).all()
+
+    # Step 3: Merge both streams by version and cut the page
+    page = sorted([(todo.version, "todo", todo) for todo in changed]
+                  + [(tomb.version, "deleted", tomb) for tomb in deleted], key=lambda change: change[0])
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    return {
+        "since": since,
+        "next_version": page[-1][0] if has_more else snapshot,
+        "has_more": has_more,
+        "todos": [item for _, kind, item in page if kind == "todo"],
+        "deleted": [item.todo_id for _, kind, item in page if kind == "deleted"],
+    }
+
+# TODO 9.6: Define a GET endpoint returning the N highest-priority open todos
+@router.get("/next", status_code=status.HTTP_200_OK)
+async def read_next_todos(user: user_dendency, db: db_dependency, n: int = Query(default=5, gt=0, le=100)):
+    """
+    Returns the `n` open todos to do next: highest priority first, oldest first within a priority.
+    """
+    if user is None : 
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
+
+    # Step 1: Served from the per-user cache when enabled and deep enough
+    cached = next_todos_cache.get(user.get("id"), n)
+    if cached is not None:
+        return cached
+
+    # Step 2: Read the first entries of the (owner_id, complete, priority DESC, id) index,
+    # one more than the cache depth to know whether the cached list is the whole open list
+    limit = max(n, next_todos_cache.depth + 1) if next_todos_cache.enabled else n
+    todo_models = db.scalars(queries.next_todos_of_owner, {"owner_id": user.get("id"), "limit": limit}).all()
+    todos = [todo_payload(todo) for todo in todo_models]
+    next_todos_cache.fill(user.get("id"), todos)
+    return todos[:n]
+
+# TODO 9.7: Define a POST endpoint importing many todos from a CSV / NDJSON body
+@router.post("/import", status_code=status.HTTP_200_OK)
+async def import_todo_file(user: user_dendency, db: db_dependency, request: Request,
+                           format: str | None = Query(default=None, pattern="^(csv|ndjson)$")):
+    """
+    Imports todos from the raw request body, read as a stream.
+
+    - CSV (`Content-Type: text/csv`): a header line naming the `TodoRequest`
+      fields (title, description, priority, complete), then one todo per record.
+    - NDJSON (`Content-Type: application/x-ndjson`): one JSON todo object per line.
+
+    `format` overrides the content type. Valid rows are committed in batches,
+    invalid rows are listed (with their line number) in `errors`.
+    """
+    if user is None : 
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
+
+    # Step 1: Pick the parser
+    fmt = format or detect_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail="Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson.")
+
+    # Step 2: Parse, validate and insert batch by batch while the body arrives
+    summary, last_version = await import_todos(db, user.get("id"), request.stream(), fmt, TodoRequest)
+
+    # Step 3: One notification for the whole import instead of one event per todo,
+    # clients catch up with /todo/changes
+    if summary["imported"]:
+        next_todos_cache.invalidate(user.get("id"))
+        if event_hub.has_subscribers(user.get("id")):
+            event_hub.publish(user.get("id"), "imported", {"count": summary["imported"], "version": last_version})
+
+    return summary
 
 # TODO 10: Define a GET endpoint to fetch a todo by ID
 @router.get("/{todo_id}", status_code=status.HTTP_200_OK)
@@ -75,9 +249,10 @@ async def read_todo_id(user: user_dendency ,db: db_dependency, todo_id: int = Pa
     if user is None : 
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Athuentication Failed")
     
-    # TODO 10.1: Query the database to get the todo by ID
-    todo_model = db.query(Todos).filter(Todos.id == todo_id).filter(Todos.owner_id == user.get("id")).first()
-    
+    # TODO 10.1: Query the database to get the todo by ID (an old completed one may be archived)
+    todo_model = db.scalars(queries.todo_of_owner, {"todo_id": todo_id, "owner_id": user.get("id")}).first()
+    if todo_model is None:
+        todo_model = db.scalars(queries.archived_todo_of_owner, {"todo_id": todo_id, "owner_id": user.get("id")}).first()
 
     # TODO 10.2: Check if the todo exists
     if todo_model is not None:
@@ -104,15 +279,19 @@ async def create_todo(user : user_dendency ,db: db_dependency, todo_item: TodoRe
 
     if user is None : 
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
-    # TODO 11.1: Create a new todo model instance with the provided todo input
-    todo_model = Todos(**todo_item.model_dump(), owner_id = user.get("id"))
-    
-    # TODO 11.2: Add the new todo to the database session
-    db.add(todo_model)
-    # TODO 11.3: Commit the transaction to save the new todo in the database
-    db.commit()  # Consider adding error handling here
+    # TODO 11.1: Use the group-commit batcher when write batching is enabled
+    if write_batcher.enabled:
+        todo_model = await write_batcher.submit(lambda session: _create_todo(session, user.get("id"), todo_item))
+    else:
+        # TODO 11.2: Create a new todo model instance and add it to the database session
+        todo_model = _create_todo(db, user.get("id"), todo_item)
+        # TODO 11.3: Commit the transaction to save the new todo in the database
+        db.commit()  # Consider adding error handling here
 
-    # TODO 11.4: Return a success message
+    # TODO 11.4: Notify the user's event streams
+    _notify_change("created", user.get("id"), todo_model)
+
+    # TODO 11.5: Return a success message
     return {"Message": "Added New Todo Item Successfully"}
 
 # TODO 12: Define a PUT endpoint to update an existing Todo item
@@ -133,24 +312,24 @@ async def update_todo(user: user_dendency ,db: db_dependency, todo_req: TodoRequ
     if user is None : 
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
     
-    # TODO 12.1: Query the database to get the todo by ID
-    todo_model = db.query(Todos).filter(Todos.id == todo_id).filter(Todos.owner_id == user.get("id")).first()
-    # TODO 12.2: Check if the todo exists
+    # TODO 12.1: Update the todo through the batcher or in the request session
+    if write_batcher.enabled:
+        todo_model = await write_batcher.submit(
+            lambda session: _update_todo(session, user.get("id"), todo_id, todo_req)
+        )
+    else:
+        todo_model = _update_todo(db, user.get("id"), todo_id, todo_req)
+        # TODO 12.2: Commit the transaction to save the updated todo in the database
+        db.commit()
+
+    # TODO 12.3: Check if the todo exists
     if todo_model is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found.")
 
-    # TODO 12.3: Update the todo attributes with the provided data
-    todo_model.title = todo_req.title
-    todo_model.description = todo_req.description
-    todo_model.priority = todo_req.priority
-    todo_model.complete = todo_req.complete
+    # TODO 12.4: Notify the user's event streams
+    _notify_change("updated", user.get("id"), todo_model)
 
-    # TODO 12.4: Add the updated todo model to the session
-    db.add(todo_model)  # Not strictly necessary in this case
-    # TODO 12.5: Commit the transaction to save the updated todo in the database
-    db.commit()
-
-    # TODO 12.6: Return a success message
+    # TODO 12.5: Return a success message
     return {"Message": "Updated Todo Successfully"}
 
 # TODO 13: Define a DELETE endpoint to delete a Todo item
@@ -170,16 +349,17 @@ async def delete_todo(user: user_dendency , db: db_dependency, todo_id: int = Pa
     if user is None : 
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found.")
 
-    # TODO 13.1: Query the database to get the todo by ID
-    todo_model = db.query(Todos).filter(Todos.id == todo_id).filter(Todos.owner_id == user.get('id')).first()
-    # TODO 13.2: Check if the todo exists
-    if todo_model is None:
+    # TODO 13.1: Query the database to get the todo by ID and delete it
+    deleted = _delete_todo(db, user.get('id'), todo_id)
+    # TODO 13.2: Check if the todo existed
+    if not deleted:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found.")
 
-    # TODO 13.3: Delete the todo from the database
-    db.query(Todos).filter(Todos.id == todo_id).filter(Todos.owner_id == user.get('id')).delete()
-    # TODO 13.4: Commit the transaction to save the changes in the database
+    # TODO 13.3: Commit the transaction to save the changes in the database
     db.commit()
 
+    # TODO 13.4: Notify the user's event streams
+    _notify_change("deleted", user.get("id"), todo_id=todo_id)
+
     # TODO 13.5: Return a success message
     return {"Message": "Successfully Deleted Todo item"}
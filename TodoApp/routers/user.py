@@ -5,13 +5,17 @@ from pydantic import BaseModel, Field
 # TODO 2: Import necessary modules from SQLAlchemy and FastAPI
 from sqlalchemy.orm import Session
 from fastapi import APIRouter, Body, Depends, HTTPException, Path, status
+from fastapi.concurrency import run_in_threadpool
 
 # TODO 3: Import the Todos model
 from ..models import Users
-# TODO 4: Import database connection details (engine and session factory)
-from ..database import SessionLocal
-from passlib.context import CryptContext
+from .. import queries
+# TODO 4: Import the shared request-scoped database session dependency
+from ..database import get_db
 from .auth import get_current_user 
+from ..rate_limit import hashing_limiter, limit_by_ip, username_limiter
+from ..passwords import password_context
+from ..user_cache import user_cache
 
 # TODO 5: Create an instance of APIRouter with prefix and tags
 router = APIRouter(
@@ -19,39 +23,38 @@ router = APIRouter(
     tags=["user"]
 )
 
-# TODO 6: Define a dependency function to provide a database session
-def get_db():
-    """
-    Creates a database session, yields it for use,
-    and closes the session to ensure proper resource management.
-    """
-
-    db = SessionLocal()  # Step 1: Create a database session object
-    try:
-        yield db  # Step 2: Yield the session object to the caller
-    finally:
-        db.close()  # Step 3: Close the session to release resources
-
 # TODO 7: Define a dependency object for type hinting and injection
 db_dependency = Annotated[Session, Depends(get_db)]
 user_dendency = Annotated[dict, Depends(get_current_user)]
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+bcrypt_context = password_context
 
 class UserVerification(BaseModel):
     password : str 
     new_password : str = Field(min_length=6)
 
+# Helper Method to read a user row by id (the loader of the user cache)
+def _load_user(db: Session, user_id: int):
+    return db.scalars(queries.user_by_id, {"user_id": user_id}).first()
+
+# Helper Method to change the phone number of a user in a session (the caller commits)
+def _change_phone_number(db: Session, user_id: int, phone_number: str):
+    current_user = db.scalars(queries.user_by_id, {"user_id": user_id}).first()
+    if current_user is None:
+        return None
+    current_user.phone_number = phone_number
+    return current_user
+
 # Endpoint to retrieve user information
 @router.get("")
 async def get_user_info(user: user_dendency, db : db_dependency): 
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
-    # Query the user by their ID
-    return  db.query(Users).filter(Users.id == user.get("id")).first()
+    # Read the user by their ID, from the cache when possible (without the password hash)
+    return user_cache.get(user.get("id"), lambda user_id: _load_user(db, user_id))
 
     
 # Endpoint to change the user's password
-@router.put("/password", status_code=status.HTTP_204_NO_CONTENT)
+@router.put("/password", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(limit_by_ip)])
 async def change_password(
     user: user_dendency, 
     db: db_dependency,  
@@ -65,21 +68,27 @@ async def change_password(
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
     
     # Query the user by their ID
-    current_user = db.query(Users).filter(Users.id == user.get("id")).first()
+    current_user = db.scalars(queries.user_by_id, {"user_id": user.get("id")}).first()
     
     # If user not found, raise 404 error
     if not current_user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    # Verify the current password
-    if not bcrypt_context.verify(user_verification.password, current_user.hashed_password):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Error on password change")
-    
-    # Hash the new password and update the user record
-    current_user.hashed_password = bcrypt_context.hash(user_verification.new_password)
+    # Limit password attempts per user
+    username_limiter.check(current_user.username)
+
+    # Verify the current password and hash the new one in a worker thread (admission controlled)
+    async with hashing_limiter:
+        verified = await run_in_threadpool(bcrypt_context.verify, user_verification.password, current_user.hashed_password)
+        if not verified:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Error on password change")
+
+        # Hash the new password and update the user record
+        current_user.hashed_password = await run_in_threadpool(bcrypt_context.hash, user_verification.new_password)
     
-    # Commit the changes to the database
+    # Commit the changes to the database, then drop the cached record
     db.commit()
+    user_cache.invalidate(current_user.id)
         
     return {"message": "Password changed successfully"}
 
@@ -94,18 +103,16 @@ async def change_phone_number(user: user_dendency, db: db_dependency, p_phone_nu
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication Failed")
     
-    # Query the database for the current user
-    current_user = db.query(Users).filter(Users.id == user.get("id")).first()
+    # Query the database for the current user and update the phone number
+    current_user = _change_phone_number(db, user.get("id"), p_phone_number)
     
     # If the user is not found in the database, raise an authentication error
     if current_user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User Not Found")
     
-    # Update the phone number for the current user
-    current_user.phone_number = p_phone_number
-    
-    # Commit the changes to the database
+    # Commit the changes to the database, then drop the cached record
     db.commit()
+    user_cache.invalidate(current_user.id)
     
     # Return a success message
     return {"message": "Phone number changed successfully"}
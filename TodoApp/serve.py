@@ -0,0 +1,372 @@
+"""
+Production launcher: several uvicorn worker processes on one listening socket.
+
+Run from the repository root:
+    python -m TodoApp.serve --workers 4 --host 0.0.0.0 --port 8000
+
+- The master process binds the socket, imports the app once (`--preload`,
+  the default) and forks the workers. They share the imported code and the
+  calibrated bcrypt cost, and the kernel spreads connections over them.
+- Worker processes that crash are started again.
+- SIGHUP restarts the workers one at a time. Each new worker has to be
+  ready before the old one stops, and the old one finishes its in-flight
+  requests (graceful shutdown). With `--no-preload` every worker imports
+  the app itself, so SIGHUP also picks up new code.
+- SIGTERM / SIGINT stop all workers gracefully, then the master.
+- The master relays the invalidation bus (see bus.py): revocations,
+  deactivations and cache invalidations made by one worker reach the
+  others right away. Change versions and rows live in the database and
+  are shared anyway.
+
+Process-wide background jobs (archival) only run in worker 0.
+Admin jobs run in the worker that started them, their state and cancel
+flag are rows of `admin_jobs`, so any worker reports and cancels them.
+Still per worker: rate limits (each worker allows the configured rate)
+and request profiles.
+"""
+# == Import necessary libraries ==
+import argparse
+import errno
+import importlib
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import time
+
+logger = logging.getLogger("TodoApp.serve")
+
+# Settings (can be overridden through environment variables or arguments)
+SERVE_WORKERS = int(os.getenv("TODO_WORKERS", str(os.cpu_count() or 1)))
+SERVE_HOST = os.getenv("TODO_HOST", "127.0.0.1")
+SERVE_PORT = int(os.getenv("TODO_PORT", "8000"))
+# Seconds a stopping worker gets to finish its requests, and a new worker to become ready
+SERVE_GRACEFUL_TIMEOUT = float(os.getenv("TODO_GRACEFUL_TIMEOUT", "30"))
+SERVE_STARTUP_TIMEOUT = float(os.getenv("TODO_STARTUP_TIMEOUT", "60"))
+
+APP = "TodoApp.main:app"
+# A worker dying sooner than this after its start is restarted after a pause (no fork loop)
+MIN_WORKER_LIFETIME = 1.0
+BUS_MESSAGE_BYTES = 64 * 1024
+
+
+def load_app(path=APP):
+    module_name, _, attribute = path.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def bind_socket(host, port, backlog=2048) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Worker:
+    __slots__ = ("index", "pid", "bus", "ready_fd", "ready", "retiring", "lagging", "started_at", "stop_deadline")
+
+    def __init__(self, index, pid, bus_sock, ready_fd):
+        self.index = index
+        self.pid = pid
+        self.bus = bus_sock  # master end of the worker's bus socket pair
+        self.ready_fd = ready_fd  # readable once the worker serves requests
+        self.ready = False
+        self.retiring = False  # replaced, stopping gracefully
+        self.lagging = False  # missed bus messages, gets a `reset`
+        self.started_at = time.monotonic()
+        self.stop_deadline = None
+
+
+def run_worker(listen_sock, bus_sock, ready_fd, app, uvicorn_options):
+    """
+    Body of a worker process: serves the app on the inherited socket until told to stop.
+    """
+    import uvicorn
+
+    from .bus import bus
+
+    master_pid = os.getppid()
+    if app is None:
+        app = load_app()
+    else:
+        # Connections opened by the master (create_all at import) belong to it
+        from .database import engine
+        engine.dispose(close=False)
+
+    class WorkerServer(uvicorn.Server):
+        async def startup(self, sockets=None):
+            # Listen to the bus before the lifespan runs, no message is missed
+            import asyncio
+            bus.attach(bus_sock, asyncio.get_running_loop())
+            await super().startup(sockets=sockets)
+            if not self.should_exit:
+                os.write(ready_fd, b"1")
+            os.close(ready_fd)
+
+        async def on_tick(self, counter):
+            # The master is gone, stop too
+            if counter % 10 == 0 and os.getppid() != master_pid:
+                self.should_exit = True
+            return await super().on_tick(counter)
+
+    config = uvicorn.Config(app, lifespan="on", **uvicorn_options)
+    WorkerServer(config).run(sockets=[listen_sock])
+
+
+class Master:
+    def __init__(self, workers=SERVE_WORKERS, host=SERVE_HOST, port=SERVE_PORT, preload=True,
+                 graceful_timeout=SERVE_GRACEFUL_TIMEOUT, startup_timeout=SERVE_STARTUP_TIMEOUT,
+                 uvicorn_options=None):
+        self.worker_count = workers
+        self.host = host
+        self.port = port
+        self.preload = preload
+        self.graceful_timeout = graceful_timeout
+        self.startup_timeout = startup_timeout
+        self.uvicorn_options = uvicorn_options or {}
+        self.app = None
+        self.workers = {}  # pid -> Worker
+        self.restart_queue = []  # workers waiting for their replacement (SIGHUP)
+        self.replacement = None  # (old worker, new worker) while one is being replaced
+        self.stopping = False
+        self._signals = []
+
+    # == Process management ==
+    def spawn(self, index) -> Worker:
+        parent_bus, child_bus = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # Child: default signal handling (SIGHUP is for the master, a terminal sends it to the whole group),
+            # only its own ends of the pipes
+            for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+                signal.signal(sig, signal.SIG_DFL)
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            signal.set_wakeup_fd(-1)
+            os.close(self._wakeup_r)
+            os.close(self._wakeup_w)
+            os.close(ready_r)
+            parent_bus.close()
+            for worker in self.workers.values():
+                worker.bus.close()
+                if worker.ready_fd is not None:
+                    os.close(worker.ready_fd)
+            os.environ["TODO_WORKER_INDEX"] = str(index)
+            status = 0
+            try:
+                run_worker(self.sock, child_bus, ready_w, self.app, self.uvicorn_options)
+            except BaseException:
+                logger.exception("Worker %d failed", index)
+                status = 1
+            finally:
+                os._exit(status)
+
+        child_bus.close()
+        os.close(ready_w)
+        parent_bus.setblocking(False)
+        worker = Worker(index, pid, parent_bus, ready_r)
+        self.workers[pid] = worker
+        logger.info("Started worker %d (pid %d)", index, pid)
+        return worker
+
+    def stop_worker(self, worker, sig=signal.SIGTERM):
+        worker.retiring = True
+        worker.stop_deadline = time.monotonic() + self.graceful_timeout
+        try:
+            os.kill(worker.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            worker.bus.close()
+            if worker.ready_fd is not None:
+                os.close(worker.ready_fd)
+            if worker.retiring or self.stopping:
+                logger.info("Worker %d (pid %d) stopped", worker.index, pid)
+                continue
+
+            # Crashed: start it again
+            logger.warning("Worker %d (pid %d) exited with status %d, restarting", worker.index, pid,
+                           os.waitstatus_to_exitcode(status))
+            if self.replacement is not None and self.replacement[1] is worker:
+                # The replacement of a rolling restart died, keep the old worker
+                self.replacement = None
+                self.restart_queue.clear()
+                continue
+            if time.monotonic() - worker.started_at < MIN_WORKER_LIFETIME:
+                time.sleep(MIN_WORKER_LIFETIME)
+            self.spawn(worker.index)
+
+    def _on_ready(self, worker):
+        try:
+            ready = os.read(worker.ready_fd, 1) == b"1"
+        except OSError:
+            ready = False
+        os.close(worker.ready_fd)
+        worker.ready_fd = None
+        worker.ready = ready
+        if not ready:
+            return
+        logger.info("Worker %d (pid %d) ready", worker.index, worker.pid)
+
+        # A replacement is ready: stop the worker it replaces
+        if self.replacement is not None and self.replacement[1] is worker:
+            self.stop_worker(self.replacement[0])
+            self.replacement = None
+
+    def _step_restart(self):
+        if self.replacement is not None or not self.restart_queue:
+            return
+        old = self.restart_queue.pop(0)
+        if old.pid in self.workers and not old.retiring:
+            self.replacement = (old, self.spawn(old.index))
+
+    # == Bus ==
+    def relay(self, sender):
+        """
+        Forwards the messages of `sender` to every other worker.
+        """
+        while True:
+            try:
+                message = sender.bus.recv(BUS_MESSAGE_BYTES)
+            except (BlockingIOError, OSError):
+                return
+            for worker in self.workers.values():
+                if worker is sender or worker.lagging:
+                    continue
+                try:
+                    worker.bus.send(message)
+                except BlockingIOError:
+                    # Its queue is full: drop, and reset it when it reads again
+                    worker.lagging = True
+                except OSError:
+                    pass
+
+    def _send_reset(self, worker):
+        from .bus import encode_message
+
+        try:
+            worker.bus.send(encode_message("reset", {}))
+            worker.lagging = False
+        except (BlockingIOError, OSError):
+            pass
+
+    # == Main loop ==
+    def _on_signal(self, sig, frame):
+        self._signals.append(sig)
+
+    def _handle_signals(self):
+        while self._signals:
+            sig = self._signals.pop(0)
+            if sig in (signal.SIGTERM, signal.SIGINT) and not self.stopping:
+                logger.info("Stopping %d workers", len(self.workers))
+                self.stopping = True
+                self.restart_queue.clear()
+                for worker in list(self.workers.values()):
+                    self.stop_worker(worker)
+            elif sig == signal.SIGHUP and not self.stopping:
+                logger.info("Rolling restart of %d workers", len(self.workers))
+                self.restart_queue = [worker for worker in self.workers.values() if not worker.retiring]
+
+    def _kill_overdue(self):
+        now = time.monotonic()
+        for worker in list(self.workers.values()):
+            if worker.stop_deadline is not None and now > worker.stop_deadline:
+                logger.warning("Worker %d (pid %d) did not stop in time, killing it", worker.index, worker.pid)
+                worker.stop_deadline = None
+                os.kill(worker.pid, signal.SIGKILL)
+            elif not worker.ready and worker.ready_fd is not None and now - worker.started_at > self.startup_timeout:
+                logger.warning("Worker %d (pid %d) did not start in time, killing it", worker.index, worker.pid)
+                os.kill(worker.pid, signal.SIGKILL)
+
+    def run(self):
+        # Step 1: Bind, then preload the app and calibrate bcrypt once for all workers
+        self.sock = bind_socket(self.host, self.port)
+        if self.preload:
+            self.app = load_app()
+            from . import passwords
+            passwords.calibrate()
+
+        # Step 2: Signals wake up the loop through a pipe
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(self._wakeup_w, False)
+        signal.set_wakeup_fd(self._wakeup_w)
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(sig, self._on_signal)
+
+        # Step 3: Start the workers
+        logger.info("Listening on %s:%d with %d workers", self.host, self.port, self.worker_count)
+        for index in range(self.worker_count):
+            self.spawn(index)
+
+        # Step 4: Relay the bus, react to signals and to workers starting or exiting
+        while self.workers or not self.stopping:
+            by_fd = {worker.bus.fileno(): worker for worker in self.workers.values()}
+            ready_fds = {worker.ready_fd: worker for worker in self.workers.values() if worker.ready_fd is not None}
+            lagging = [worker.bus.fileno() for worker in self.workers.values() if worker.lagging]
+            try:
+                readable, writable, _ = select.select([self._wakeup_r, *by_fd, *ready_fds], lagging, [], 1.0)
+            except InterruptedError:
+                continue
+            except OSError as error:
+                if error.errno == errno.EBADF:  # a worker exited meanwhile
+                    continue
+                raise
+
+            if self._wakeup_r in readable:
+                try:
+                    os.read(self._wakeup_r, 512)
+                except BlockingIOError:
+                    pass
+            self._handle_signals()
+            for fd in readable:
+                if fd in by_fd:
+                    self.relay(by_fd[fd])
+                elif fd in ready_fds:
+                    self._on_ready(ready_fds[fd])
+            for fd in writable:
+                if fd in by_fd:
+                    self._send_reset(by_fd[fd])
+            self.reap()
+            self._kill_overdue()
+            self._step_restart()
+
+        self.sock.close()
+        logger.info("Stopped")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Todo app with several worker processes.")
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--preload", action=argparse.BooleanOptionalAction, default=True,
+                        help="import the app once in the master (default), or in every worker")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--no-access-log", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s [%(process)d] %(levelname)s %(message)s")
+    options = {"log_level": args.log_level, "access_log": not args.no_access_log,
+               "timeout_graceful_shutdown": SERVE_GRACEFUL_TIMEOUT}
+    Master(args.workers, args.host, args.port, args.preload, uvicorn_options=options).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+# == Import necessary libraries ==
+import asyncio
+import json
+
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from .metrics import metrics
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: while a call for `key` is running,
+    later callers with the same key wait for its result instead of running
+    it again. Nothing is kept once the call has finished (no caching).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}  # key -> asyncio.Task
+        self.executed = 0
+        self.shared = 0
+
+    async def do(self, key, fn):
+        """
+        Runs `await fn()` once for all concurrent callers of `key`.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            # Step 1: First caller, start the shared call in its own task so a
+            # caller that goes away does not cancel it for the others
+            self.executed += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            # Step 2: Same call already running, wait for its result
+            self.shared += 1
+            metrics.inc(f"single_flight.{self.name}.shared")
+
+        return await asyncio.shield(task)
+
+    def stats(self):
+        total = self.executed + self.shared
+        return {
+            "executed": self.executed,
+            "shared": self.shared,
+            "in_flight": len(self._calls),
+            "coalescing_ratio": self.shared / total if total else 0.0,
+        }
+
+
+def encode_json(content) -> bytes:
+    # Same encoding as FastAPI's default JSONResponse
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+# Shared coalescer for the read endpoints
+read_coalescer = SingleFlight("reads")
+metrics.register_collector("single_flight", read_coalescer.stats)
+
+
+async def coalesced_json(request: Request, scope, bind, loader) -> Response:
+    """
+    Runs `loader(db)` (a blocking DB query) in a worker thread and serializes its
+    result, sharing the query and the serialization with every concurrent
+    request on the same route, user scope and query parameters.
+
+    `db` is a session of its own on `bind`, opened and closed in the thread: the
+    shared load outlives the request that started it, whose session is closed
+    as soon as that request is cancelled.
+    """
+    key = (request.url.path, scope, tuple(sorted(request.query_params.multi_items())))
+
+    def load():
+        with Session(bind) as db:
+            return encode_json(loader(db))
+
+    body = await read_coalescer.do(key, lambda: run_in_threadpool(load))
+    return Response(content=body, media_type="application/json")
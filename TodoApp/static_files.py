@@ -0,0 +1,196 @@
+"""
+Static asset serving.
+
+`PrecompressedStaticFiles` is a `StaticFiles` mount that:
+
+- serves `name.br` / `name.gz` next to `name` when the client accepts
+  them. Run `python -m TodoApp.build_static` to write these files.
+- sends a strong ETag (the content hash of the file) and answers
+  `If-None-Match` with 304.
+- marks hashed file names (`app.3f9a1c2e.js`) as `immutable` for a year.
+  Other files must be revalidated (`no-cache`).
+- keeps small files in memory. Larger files go through `FileResponse`,
+  which hands the path to the server (`http.response.pathsend`, zero copy)
+  when the server supports it, and streams 64 KB chunks otherwise.
+"""
+# == Import necessary libraries ==
+import hashlib
+import os
+import re
+import stat
+import threading
+from collections import OrderedDict
+from email.utils import formatdate
+from mimetypes import guess_type
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+
+from .compression import select_encoding
+from .metrics import metrics
+
+# Settings (can be overridden through environment variables)
+# Files up to this size are kept in memory once read (bytes)
+STATIC_CACHE_FILE_MAX = int(os.getenv("TODO_STATIC_CACHE_FILE_MAX", str(64 * 1024)))
+# Memory used by cached file bodies, least recently used are evicted (bytes)
+STATIC_CACHE_MAX_BYTES = int(os.getenv("TODO_STATIC_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+# Cache-Control of hashed file names, and of the others
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# Precompressed variants, in order of preference
+VARIANTS = (("br", ".br"), ("gzip", ".gz"))
+# "name.<8+ hex digits>.ext", as written by bundlers
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.[A-Za-z0-9]+$")
+
+
+class _Asset:
+    __slots__ = ("key", "etag", "media_type", "last_modified", "variants", "bodies", "size")
+
+    def __init__(self, key, etag, media_type, last_modified, variants):
+        self.key = key
+        self.etag = etag
+        self.media_type = media_type
+        self.last_modified = last_modified
+        self.variants = variants  # encoding ("identity", "br", "gzip") -> (path, stat_result)
+        self.bodies = {}  # encoding -> bytes, small variants only
+        self.size = 0
+
+
+def _file_hash(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()[:32]
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    def __init__(self, *, cache_file_max=STATIC_CACHE_FILE_MAX, cache_max_bytes=STATIC_CACHE_MAX_BYTES, **kwargs):
+        super().__init__(**kwargs)
+        self.cache_file_max = cache_file_max
+        self.cache_max_bytes = cache_max_bytes
+        self._assets = OrderedDict()  # full path -> _Asset
+        self._cached_bytes = 0
+        self._lock = threading.Lock()  # responses are built in worker threads
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        # Resolved by `get_response` below, off the event loop
+        return FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+
+    async def get_response(self, path, scope):
+        response = await super().get_response(path, scope)
+        if not isinstance(response, FileResponse) or response.status_code != 200:
+            return response
+        return await anyio.to_thread.run_sync(self._asset_response, response.path, response.stat_result, scope)
+
+    def _asset(self, full_path, stat_result) -> _Asset:
+        """
+        Returns the (cached) description of a file, rebuilt when the file changed.
+        """
+        key = (stat_result.st_mtime_ns, stat_result.st_size)
+        with self._lock:
+            asset = self._assets.get(full_path)
+            if asset is not None and asset.key == key:
+                self._assets.move_to_end(full_path)
+                return asset
+
+        # Step 1: Precompressed variants, only when at least as new as the file
+        variants = {"identity": (full_path, stat_result)}
+        for encoding, suffix in VARIANTS:
+            try:
+                variant_stat = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            if stat.S_ISREG(variant_stat.st_mode) and variant_stat.st_mtime_ns >= stat_result.st_mtime_ns:
+                variants[encoding] = (full_path + suffix, variant_stat)
+
+        # Step 2: Strong ETag from the content (computed once per file version)
+        asset = _Asset(
+            key, _file_hash(full_path), guess_type(full_path)[0] or "application/octet-stream",
+            formatdate(stat_result.st_mtime, usegmt=True), variants,
+        )
+        with self._lock:
+            if full_path in self._assets:
+                self._forget(full_path)
+            self._assets[full_path] = asset
+        return asset
+
+    def _body(self, full_path, asset, encoding):
+        """
+        Bytes of a small variant, from memory when possible (None for large files).
+        """
+        variant_path, variant_stat = asset.variants[encoding]
+        if variant_stat.st_size > self.cache_file_max:
+            return None
+        body = asset.bodies.get(encoding)
+        if body is not None:
+            metrics.inc("static.cache_hits")
+            return body
+
+        with open(variant_path, "rb") as file:
+            body = file.read()
+        metrics.inc("static.cache_misses")
+        with self._lock:
+            # Only cache for the current version of the file
+            if self._assets.get(full_path) is asset and encoding not in asset.bodies:
+                asset.bodies[encoding] = body
+                asset.size += len(body)
+                self._cached_bytes += len(body)
+                self._evict(keep=full_path)
+        return body
+
+    # Called with the lock held
+    def _forget(self, full_path):
+        asset = self._assets.pop(full_path)
+        self._cached_bytes -= asset.size
+
+    # Called with the lock held
+    def _evict(self, keep):
+        while self._cached_bytes > self.cache_max_bytes and len(self._assets) > 1:
+            oldest = next(iter(self._assets))
+            if oldest == keep:
+                self._assets.move_to_end(keep)
+                continue
+            self._forget(oldest)
+
+    def _asset_response(self, full_path, stat_result, scope):
+        asset = self._asset(full_path, stat_result)
+        request_headers = Headers(scope=scope)
+
+        # Step 1: Pick the representation
+        encoding = "identity"
+        if len(asset.variants) > 1:
+            supported = [name for name, _ in VARIANTS if name in asset.variants]
+            encoding = select_encoding(request_headers.get("accept-encoding", ""), supported) or "identity"
+
+        # Step 2: Validators and caching headers (each representation has its own strong ETag)
+        etag = f'"{asset.etag}"' if encoding == "identity" else f'"{asset.etag}-{encoding}"'
+        headers = {
+            "etag": etag,
+            "last-modified": asset.last_modified,
+            "cache-control": IMMUTABLE_CACHE_CONTROL if HASHED_NAME.search(full_path) else REVALIDATE_CACHE_CONTROL,
+        }
+        if len(asset.variants) > 1:
+            headers["vary"] = "Accept-Encoding"
+        if encoding != "identity":
+            headers["content-encoding"] = encoding
+
+        # Step 3: Conditional request
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None and (if_none_match.strip() == "*" or etag in
+                                          [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]):
+            metrics.inc("static.not_modified")
+            return Response(status_code=304, headers=headers)
+
+        # Step 4: Small files from memory, large ones as a file (zero copy when the server supports it)
+        body = self._body(full_path, asset, encoding)
+        if body is not None:
+            return Response(body, media_type=asset.media_type, headers=headers)
+        variant_path, variant_stat = asset.variants[encoding]
+        return FileResponse(variant_path, media_type=asset.media_type, headers=headers, stat_result=variant_stat)
+
+    def stats(self):
+        return {"files": len(self._assets), "cached_bytes": self._cached_bytes}
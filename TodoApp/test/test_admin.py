@@ -11,13 +11,16 @@ app.dependency_overrides[get_current_user] = override_get_current_user
 def test_admin_read_all_auth(test_todo):
     res = client.get("/admin/todo")
     assert res.status_code == status.HTTP_200_OK 
-    assert res.json() == [{
+    todos = res.json()
+    assert todos[0].pop("updated_at") is not None
+    assert todos == [{
         "complete": False,
         "title": "learn to code",
         "description": "need to learn everyday!",
         "priority": 3,
         "id": 1,
-        "owner_id": 1
+        "owner_id": 1,
+        "version": 1
     }]
 
 # TODO: Implement test case for admin delete todo endpoint
@@ -0,0 +1,177 @@
+from .utils import *
+from ..routers.admin import get_db, get_current_user
+from ..routers.auth import _auth_user, _create_access_token, get_current_user as real_get_current_user
+from ..admin_jobs import AdminJobs, admin_jobs
+from ..events import event_hub
+from ..inactive_users import inactive_users
+from ..models import TodosArchive, TodoTombstones
+from datetime import timedelta
+from fastapi import HTTPException, status
+import pytest
+
+# Dependency overrides for testing purposes
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+@pytest.fixture
+def other_user(test_user):
+    # A second user (id 2) owning 5 todos, one of them archived
+    db = TestingSessionLocal()
+    user = Users(id=2, username="Other", email="other@xyz.com", hashed_password=bcrypt_context.hash("123"),
+                 role="user", is_active=True)
+    db.add(user)
+    db.add_all(Todos(title=f"todo {i}", description="bulk", priority=3, complete=False, owner_id=2) for i in range(4))
+    db.add(TodosArchive(id=1000, title="old", description="bulk", priority=1, complete=True, owner_id=2, version=0))
+    db.commit()
+    db.close()
+    yield user
+    with engine.connect() as connection:
+        connection.execute(text("DELETE FROM todos;"))
+        connection.execute(text("DELETE FROM todos_archive;"))
+        connection.execute(text("DELETE FROM todo_tombstones;"))
+        connection.execute(text("DELETE FROM admin_jobs;"))
+        connection.commit()
+    next_todos_cache.invalidate()
+
+
+def owners(model):
+    db = TestingSessionLocal()
+    try:
+        return sorted(row.owner_id for row in db.query(model).all())
+    finally:
+        db.close()
+
+
+# TODO: Deactivated users are rejected by login and by get_current_user
+@pytest.mark.asyncio
+async def test_deactivate_user_rejects_tokens_and_logins(other_user):
+    token = _create_access_token("Other", 2, "user", timedelta(minutes=20))
+    assert (await real_get_current_user(token))["id"] == 2
+
+    res = client.post("/admin/users/2/deactivate")
+    assert res.status_code == status.HTTP_200_OK
+    assert res.json() == {"user_id": 2, "is_active": False, "job": None}
+    assert owners(Todos) == [2, 2, 2, 2]  # todos are kept
+
+    with pytest.raises(HTTPException) as excinfo:
+        await real_get_current_user(token)
+    assert excinfo.value.detail == "User has been deactivated."
+    assert _auth_user("Other", "123", TestingSessionLocal()) is False
+
+    # Reactivation restores access
+    assert client.post("/admin/users/2/activate").status_code == status.HTTP_200_OK
+    assert (await real_get_current_user(token))["id"] == 2
+
+
+# TODO: Deactivation validates its arguments
+def test_deactivate_user_validation(other_user):
+    assert client.post("/admin/users/1/deactivate").status_code == status.HTTP_400_BAD_REQUEST  # self
+    assert client.post("/admin/users/99/deactivate").status_code == status.HTTP_404_NOT_FOUND
+    res = client.post("/admin/users/2/deactivate", json={"todos": "reassign"})
+    assert res.status_code == status.HTTP_400_BAD_REQUEST
+    res = client.post("/admin/users/2/deactivate", json={"todos": "reassign", "reassign_to": 99})
+    assert res.status_code == status.HTTP_404_NOT_FOUND
+    assert not inactive_users.is_inactive(2)
+
+
+# TODO: Purge deletes the hot and archived todos in chunks, with tombstones
+def test_deactivate_and_purge(other_user, monkeypatch):
+    monkeypatch.setattr(admin_jobs, "chunk_size", 2)
+    monkeypatch.setattr(admin_jobs, "chunk_pause_ms", 0)
+    res = client.post("/admin/users/2/deactivate", json={"todos": "purge"})
+    assert res.status_code == status.HTTP_200_OK
+    job_id = res.json()["job"]["id"]
+
+    # The job ran after the response
+    job = client.get(f"/admin/jobs/{job_id}").json()
+    assert job["status"] == "done"
+    assert (job["total"], job["done"], job["progress"]) == (5, 5, 1.0)
+    assert job["chunks"] == 4  # 2 + 2 + 0 hot, 1 archived
+    assert owners(Todos) == [] and owners(TodosArchive) == []
+    assert owners(TodoTombstones) == [2] * 5
+    assert client.get("/admin/jobs").json()[0]["id"] == job_id
+
+
+# TODO: Reassign moves the todos to another user with new versions
+def test_deactivate_and_reassign(other_user):
+    res = client.post("/admin/users/2/deactivate", json={"todos": "reassign", "reassign_to": 1})
+    assert res.json()["job"]["kind"] == "reassign"
+
+    assert owners(Todos) == [1, 1, 1, 1] and owners(TodosArchive) == [1]
+    res = client.get("/todo/changes", params={"since": 4})
+    assert res.status_code == status.HTTP_200_OK
+    assert len(res.json()["todos"]) == 4  # the override user is user 1
+
+
+# TODO: A cancelled job stops between chunks and keeps what it did
+@pytest.mark.asyncio
+async def test_cancel_job(other_user):
+    jobs = AdminJobs(chunk_size=2, chunk_pause_ms=0)
+    db = TestingSessionLocal()
+    try:
+        job = jobs.create(db, "purge", 2, total=5)
+        db.commit()
+        assert jobs.active_for(db, 2).id == job.id
+        jobs.cancel(db, job)
+        await jobs.run(job, engine)
+        assert (job.status, job.done) == ("cancelled", 0)
+        assert owners(Todos) == [2, 2, 2, 2]
+        assert jobs.active_for(db, 2) is None
+    finally:
+        db.close()
+
+    res = client.post(f"/admin/jobs/{'0' * 12}/cancel")
+    assert res.status_code == status.HTTP_404_NOT_FOUND
+
+
+# TODO: A job run by another worker is listed and cancelled through any worker
+@pytest.mark.asyncio
+async def test_job_of_another_worker(other_user):
+    other_worker = AdminJobs(chunk_size=2, chunk_pause_ms=0)
+    db = TestingSessionLocal()
+    try:
+        job = other_worker.create(db, "purge", 2, total=5)
+        db.commit()
+    finally:
+        db.close()
+
+    res = client.get(f"/admin/jobs/{job.id}")
+    assert res.status_code == status.HTTP_200_OK
+    assert res.json()["status"] == "pending"
+    assert client.post(f"/admin/jobs/{job.id}/cancel").status_code == status.HTTP_202_ACCEPTED
+
+    # The other worker sees the cancel flag before its first chunk
+    await other_worker.run(job, engine)
+    assert (job.status, job.done) == ("cancelled", 0)
+    assert client.get(f"/admin/jobs/{job.id}").json()["status"] == "cancelled"
+    assert owners(Todos) == [2, 2, 2, 2]
+
+
+# TODO: Deactivation ends the open event streams of the user
+def test_deactivate_ends_event_streams(other_user):
+    subscriber = event_hub.subscribe(2)
+    try:
+        assert client.post("/admin/users/2/deactivate").status_code == status.HTTP_200_OK
+        assert subscriber.overflowed
+    finally:
+        event_hub.unsubscribe(subscriber)
+
+
+# TODO: Only one unfinished job per user, checked by the insert itself (concurrent deactivations)
+def test_one_job_per_user(other_user):
+    first, second = TestingSessionLocal(), TestingSessionLocal()
+    try:
+        # Another worker recorded its job, this worker's insert sees it
+        assert admin_jobs.create(first, "purge", 2) is not None
+        first.commit()
+        assert admin_jobs.create(second, "reassign", 2, 1) is None
+        second.rollback()
+    finally:
+        first.close()
+        second.close()
+
+    res = client.post("/admin/users/2/deactivate", json={"todos": "purge"})
+    assert res.status_code == status.HTTP_409_CONFLICT
+    assert not inactive_users.is_inactive(2)  # the deactivation was rolled back with it
+    assert owners(Todos) == [2, 2, 2, 2]
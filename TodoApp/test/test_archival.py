@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+from .utils import *
+from ..routers.todos import get_db, get_current_user
+from ..archival import Archiver
+from ..models import TodosArchive
+from fastapi import status
+import pytest
+
+# Dependency overrides for testing purposes
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+def add_todos(db, *todos):
+    for complete, age_days in todos:
+        todo = Todos(title="old", description="old todo", priority=1, complete=complete, owner_id=1)
+        db.add(todo)
+        db.flush()
+        # Backdate with a plain UPDATE, ORM updates stamp `updated_at` again
+        db.execute(text("UPDATE todos SET updated_at = :updated_at WHERE id = :id"),
+                   {"updated_at": datetime.utcnow() - timedelta(days=age_days), "id": todo.id})
+    db.commit()
+
+
+# TODO: Only old completed todos are moved, in chunks
+@pytest.mark.asyncio
+async def test_archive_old_completed_todos(test_todo):
+    db = TestingSessionLocal()
+    add_todos(db, (True, 40), (True, 45), (True, 50), (True, 1), (False, 60))
+
+    archiver = Archiver(after_days=30, chunk_size=2, chunk_pause_ms=0)
+    moved = await archiver.run_once(TestingSessionLocal)
+
+    assert moved == 3
+    assert db.query(Todos).count() == 3  # test_todo, the recent completed one and the open one
+    archived = db.query(TodosArchive).order_by(TodosArchive.id).all()
+    assert [todo.id for todo in archived] == [2, 3, 4]
+    assert archived[0].archive_month == archived[0].updated_at.strftime("%Y-%m")
+    assert archived[0].archived_at is not None
+
+    # Nothing left to move
+    assert await archiver.run_once(TestingSessionLocal) == 0
+
+
+# TODO: Archived todos are only listed on request
+@pytest.mark.asyncio
+async def test_read_all_include_archived(test_todo):
+    db = TestingSessionLocal()
+    add_todos(db, (True, 40))
+    await Archiver(after_days=30, chunk_pause_ms=0).run_once(TestingSessionLocal)
+
+    res = client.get("/todo")
+    assert res.status_code == status.HTTP_200_OK
+    assert [todo["id"] for todo in res.json()] == [1]
+
+    res = client.get("/todo", params={"include_archived": True})
+    assert [todo["id"] for todo in res.json()] == [1, 2]
+    assert res.json()[1]["archive_month"] is not None
+
+
+# TODO: The id of an archived todo is never given to a new todo
+@pytest.mark.asyncio
+async def test_archived_ids_are_not_reused(test_todo):
+    db = TestingSessionLocal()
+    add_todos(db, (True, 40))
+    archiver = Archiver(after_days=30, chunk_pause_ms=0)
+    assert await archiver.run_once(TestingSessionLocal) == 1  # The todo with the highest id, 2
+
+    # The next todo gets a new id, and archiving it later works too
+    add_todos(db, (True, 40))
+    assert db.query(Todos).order_by(Todos.id.desc()).first().id == 3
+    assert await archiver.run_once(TestingSessionLocal) == 1
+
+    res = client.get("/todo", params={"include_archived": True})
+    assert [todo["id"] for todo in res.json()] == [1, 2, 3]
+
+
+# TODO: An archived todo is read, updated (back to the hot table) and deleted by id
+@pytest.mark.asyncio
+async def test_archived_todo_by_id(test_todo):
+    db = TestingSessionLocal()
+    add_todos(db, (True, 40), (True, 40))
+    assert await Archiver(after_days=30, chunk_pause_ms=0).run_once(TestingSessionLocal) == 2
+
+    res = client.get("/todo/2")
+    assert res.status_code == status.HTTP_200_OK
+    assert res.json()["archive_month"] is not None
+
+    # Reopening it brings it back to the hot table with a new version
+    res = client.put("/todo/2", json={"title": "reopened", "description": "back", "priority": 4, "complete": False})
+    assert res.status_code == status.HTTP_204_NO_CONTENT
+    db.expire_all()
+    todo = db.query(Todos).filter(Todos.id == 2).first()
+    assert (todo.title, todo.complete) == ("reopened", False)
+    assert db.query(TodosArchive).filter(TodosArchive.id == 2).first() is None
+    changes = client.get("/todo/changes", params={"since": 0}).json()
+    assert 2 in [todo["id"] for todo in changes["todos"]]
+
+    # Deleting one still in the archive leaves a tombstone
+    res = client.delete("/todo/3")
+    assert res.status_code == status.HTTP_204_NO_CONTENT
+    assert db.query(TodosArchive).count() == 0
+    assert client.get("/todo/3").status_code == status.HTTP_404_NOT_FOUND
+    assert 3 in client.get("/todo/changes", params={"since": 0}).json()["deleted"]
+    db.close()
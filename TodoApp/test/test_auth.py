@@ -1,7 +1,9 @@
 from .utils import *
-from ..routers.auth import get_db, _auth_user, _create_access_token, SECRET_KEY, ALG, get_current_user
+from ..routers.auth import get_db, _auth_user, _create_access_token, _create_refresh_token, SECRET_KEY, ALG, get_current_user
+from ..revocation import revocation_list
+from ..models import RevokedTokens
 from jose import jwt
-from datetime import timedelta
+from datetime import datetime, timedelta
 import pytest
 from fastapi import HTTPException
 
@@ -75,4 +77,113 @@ async def test_get_current_user_missing_payload():
         
     # TODO: Assert the exception status code and detail message
     assert excinfo.value.status_code == 401 
-    assert excinfo.value.detail == "Could not validate user."
\ No newline at end of file
+    assert excinfo.value.detail == "Could not validate user."
+
+# TODO: Define test case for rejecting refresh tokens as access tokens
+@pytest.mark.asyncio
+async def test_get_current_user_rejects_refresh_token():
+    token = _create_refresh_token("Hassan", 1, "admin")
+
+    with pytest.raises(HTTPException) as excinfo:
+        await get_current_user(token)
+
+    assert excinfo.value.status_code == 401
+
+
+# TODO: Define test case for rejecting revoked tokens
+@pytest.mark.asyncio
+async def test_get_current_user_rejects_revoked_token():
+    token = _create_access_token("Hassan", 1, "admin", timedelta(minutes=5))
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALG])
+    db = TestingSessionLocal()
+
+    revocation_list.revoke(db, payload["jti"], datetime.utcnow() + timedelta(minutes=5))
+
+    with pytest.raises(HTTPException) as excinfo:
+        await get_current_user(token)
+    assert excinfo.value.detail == "Token has been revoked."
+
+    # The list survives a reload from the database
+    revocation_list.clear()
+    revocation_list.sync(db)
+    assert revocation_list.is_revoked(payload["jti"])
+
+    # The same token revoked by another worker meanwhile: no duplicate key error, one row
+    other_db = TestingSessionLocal()
+    revocation_list.revoke(other_db, payload["jti"], datetime.utcnow() + timedelta(minutes=5))
+    other_db.close()
+    assert db.query(RevokedTokens).count() == 1
+
+    db.query(RevokedTokens).delete()
+    db.commit()
+    revocation_list.clear()
+
+
+# TODO: Define test case for login, refresh rotation and logout
+@pytest.mark.asyncio
+async def test_login_refresh_and_logout(test_user):
+    # Step 1: Login returns an access and a refresh token
+    res = client.post("/auth/token", data={"username": "Hassan", "password": "123"})
+    assert res.status_code == 200
+    tokens = res.json()
+    assert tokens["refresh_token"] is not None
+
+    # Step 2: The refresh token can be exchanged once
+    res = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert res.status_code == 200
+    new_tokens = res.json()
+    res = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert res.status_code == 401
+
+    # Step 3: Access tokens are not accepted as refresh tokens
+    res = client.post("/auth/refresh", json={"refresh_token": new_tokens["access_token"]})
+    assert res.status_code == 401
+
+    # Step 4: After logout the access token is rejected
+    res = client.post("/auth/logout", headers={"Authorization": f"Bearer {new_tokens['access_token']}"})
+    assert res.status_code == 204
+    with pytest.raises(HTTPException):
+        await get_current_user(new_tokens["access_token"])
+
+    db = TestingSessionLocal()
+    db.query(RevokedTokens).delete()
+    db.commit()
+    revocation_list.clear()
+
+
+# TODO: Define test case for a refresh issuing the user's current role
+@pytest.mark.asyncio
+async def test_refresh_uses_current_user_row(test_user):
+    tokens = client.post("/auth/token", data={"username": "Hassan", "password": "123"}).json()
+
+    # The admin is demoted after logging in
+    db = TestingSessionLocal()
+    db.query(Users).filter(Users.id == test_user.id).update({"role": "user"})
+    db.commit()
+    res = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert res.status_code == 200
+    assert jwt.decode(res.json()["access_token"], SECRET_KEY, algorithms=[ALG])["role"] == "user"
+
+    # A deleted user cannot refresh at all
+    db.query(Users).delete()
+    db.commit()
+    res = client.post("/auth/refresh", json={"refresh_token": res.json()["refresh_token"]})
+    assert res.status_code == 401
+
+    db.query(RevokedTokens).delete()
+    db.commit()
+    revocation_list.clear()
+
+
+# TODO: Define test case for the background sync keeping revocations marked while it reads
+@pytest.mark.asyncio
+async def test_sync_in_thread_keeps_concurrent_revocations():
+    expires_at = datetime.utcnow() + timedelta(minutes=5)
+
+    def slow_session():
+        revocation_list.mark_revoked("marked-meanwhile", expires_at, broadcast=False)
+        return TestingSessionLocal()
+
+    await revocation_list.sync_in_thread(slow_session)
+    assert revocation_list.is_revoked("marked-meanwhile")
+    revocation_list.clear()
@@ -0,0 +1,101 @@
+from .utils import *
+from ..routers import batch
+from ..routers.batch import get_db, get_current_user, run_batch, BatchRequest
+from fastapi import status
+import pytest
+
+# Dependency overrides for testing purposes
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+NEW_TODO = {"title": "From batch", "description": "created in a batch", "priority": 2, "complete": False}
+
+
+# TODO: Define a test case for a batch where one operation fails
+def test_batch_partial_success(test_todo, test_user):
+    res = client.post("/batch", json={"operations": [
+        {"op": "create_todo", "todo": NEW_TODO},
+        {"op": "update_todo", "todo_id": 999, "todo": NEW_TODO},
+        {"op": "update_todo", "todo_id": 1, "todo": {**NEW_TODO, "title": "Updated in batch"}},
+        {"op": "change_phone_number", "phone_number": "(222)222-2222"},
+    ]})
+
+    assert res.status_code == status.HTTP_200_OK
+    body = res.json()
+    assert body["committed"] is True
+    assert [result["status"] for result in body["results"]] == [201, 404, 204, 204]
+    assert body["results"][1]["detail"] == "Todo not found."
+
+    db = TestingSessionLocal()
+    assert db.query(Todos).filter(Todos.id == body["results"][0]["result"]["id"]).first().title == "From batch"
+    assert db.query(Todos).filter(Todos.id == 1).first().title == "Updated in batch"
+    assert db.query(Users).filter(Users.id == 1).first().phone_number == "(222)222-2222"
+
+
+# TODO: Define a test case for an atomic batch rolled back by one failure
+def test_batch_atomic_rollback(test_todo):
+    res = client.post("/batch", json={"atomic": True, "operations": [
+        {"op": "create_todo", "todo": NEW_TODO},
+        {"op": "delete_todo", "todo_id": 1},
+        {"op": "delete_todo", "todo_id": 999},
+        {"op": "create_todo", "todo": NEW_TODO},
+    ]})
+
+    body = res.json()
+    assert body["committed"] is False
+    assert [result["status"] for result in body["results"]] == [424, 424, 404, 424]
+
+    # Nothing was applied
+    db = TestingSessionLocal()
+    assert db.query(Todos).count() == 1
+
+
+# TODO: Define a test case for invalid batches
+def test_batch_validation(test_todo):
+    res = client.post("/batch", json={"operations": []})
+    assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    res = client.post("/batch", json={"operations": [{"op": "delete_todo"}]})
+    assert res.json()["results"][0]["status"] == status.HTTP_400_BAD_REQUEST
+
+
+# TODO: Define a test case for the single commit of a non-atomic batch
+@pytest.mark.asyncio
+async def test_batch_commits_once(test_todo):
+    db = TestingSessionLocal()
+    reader = create_engine(SQLALCHEMY_DATABASE_URL)  # Own connection, only sees committed rows
+    committed_rows = []
+    commit = db.commit
+
+    def counting_commit():
+        with reader.connect() as connection:
+            committed_rows.append(connection.execute(text("SELECT count(*) FROM todos")).scalar_one())
+        commit()
+
+    db.commit = counting_commit
+    body = await run_batch(override_get_current_user(), db, BatchRequest(operations=[
+        {"op": "create_todo", "todo": NEW_TODO}, {"op": "create_todo", "todo": NEW_TODO},
+    ]))
+    db.close()
+    reader.dispose()
+
+    # The released savepoints were not committed before the final commit
+    assert body["committed"] is True
+    assert committed_rows == [1]
+
+
+# TODO: Define a test case for a database error in one operation
+def test_batch_database_error_is_isolated(test_todo, monkeypatch):
+    def conflicting_create(db, user_id, todo_request):
+        db.execute(text("INSERT INTO todos (id, title) VALUES (1, 'duplicate id')"))
+
+    monkeypatch.setattr(batch, "_create_todo", conflicting_create)
+    res = client.post("/batch", json={"operations": [
+        {"op": "create_todo", "todo": NEW_TODO},
+        {"op": "update_todo", "todo_id": 1, "todo": {**NEW_TODO, "title": "Updated in batch"}},
+    ]})
+
+    assert res.status_code == status.HTTP_200_OK
+    assert [result["status"] for result in res.json()["results"]] == [409, 204]
+    db = TestingSessionLocal()
+    assert db.query(Todos).filter(Todos.id == 1).first().title == "Updated in batch"
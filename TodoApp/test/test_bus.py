@@ -0,0 +1,90 @@
+from .utils import *
+from ..bus import InvalidationBus, bus, encode_message
+from ..serve import Master, Worker
+from ..revocation import revocation_list
+from ..inactive_users import inactive_users
+from ..events import event_hub
+from datetime import datetime, timedelta
+import asyncio
+import socket
+import pytest
+
+
+def attached_worker(master, pid, worker_bus, loop):
+    # A worker's socket pair: the master keeps one end, the worker's bus the other
+    parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    parent.setblocking(False)
+    worker_bus.attach(child, loop)
+    master.workers[pid] = Worker(pid, pid, parent, None)
+    return master.workers[pid]
+
+
+# TODO: The master relays a worker's messages to the other workers only
+@pytest.mark.asyncio
+async def test_bus_relay():
+    loop = asyncio.get_running_loop()
+    master = Master(workers=2)
+    sender, receiver = InvalidationBus(), InvalidationBus()
+    received = {"sender": [], "receiver": []}
+    sender.subscribe("user_cache.invalidate", lambda user_id: received["sender"].append(user_id))
+    receiver.subscribe("user_cache.invalidate", lambda user_id: received["receiver"].append(user_id))
+    sending_worker = attached_worker(master, 1, sender, loop)
+    attached_worker(master, 2, receiver, loop)
+    try:
+        assert sender.publish("user_cache.invalidate", user_id=7)
+        assert not sender.publish("user_cache.invalidate", user_id="x" * 70_000)  # too large
+        await asyncio.sleep(0.01)
+        master.relay(sending_worker)
+        await asyncio.sleep(0.01)
+        assert received == {"sender": [], "receiver": [7]}
+    finally:
+        sender.detach()
+        receiver.detach()
+        for worker in master.workers.values():
+            worker.bus.close()
+
+
+# TODO: Messages from other workers update the local state without being sent back
+@pytest.mark.asyncio
+async def test_bus_handlers(test_user):
+    token_expiry = datetime.utcnow() + timedelta(minutes=5)
+    bus.dispatch(encode_message("revocation.revoke", {"jti": "remote-jti", "expires_at": token_expiry.isoformat()}))
+    assert revocation_list.is_revoked("remote-jti")
+
+    bus.dispatch(encode_message("inactive_users.mark", {"user_id": 5, "inactive": True}))
+    assert inactive_users.is_inactive(5)
+
+    # Events of another worker reach this worker's streams
+    subscriber = event_hub.subscribe(9)
+    try:
+        bus.dispatch(encode_message("events.publish", {"owner_id": 9, "event_type": "deleted", "data": {"id": 3}}))
+        assert subscriber.queue.get_nowait() == b'event: deleted\ndata: {"id":3}\n\n'
+        bus.dispatch(encode_message("events.resync", {"owner_id": 9}))
+        assert subscriber.overflowed
+    finally:
+        event_hub.unsubscribe(subscriber)
+        revocation_list.clear()
+
+
+# TODO: A malformed message is logged, an empty read (master gone) detaches the bus
+@pytest.mark.asyncio
+async def test_bus_bad_message_and_closed_master():
+    loop = asyncio.get_running_loop()
+    worker_bus = InvalidationBus()
+    received = []
+    worker_bus.subscribe("user_cache.invalidate", lambda user_id: received.append(user_id))
+    parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    worker_bus.attach(child, loop)
+    try:
+        parent.send(b"not json")
+        parent.send(encode_message("user_cache.invalidate", {"user_id": 3}))
+        await asyncio.sleep(0.01)
+        assert received == [3] and worker_bus.attached
+
+        parent.send(b"")
+        await asyncio.sleep(0.01)
+        assert not worker_bus.attached
+    finally:
+        worker_bus.detach()
+        parent.close()
+        child.close()
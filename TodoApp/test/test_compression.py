@@ -0,0 +1,105 @@
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.testclient import TestClient as tc
+from .utils import *
+from ..compression import CompressionMiddleware, select_encoding
+
+# A tiny app so the tests do not depend on the database content
+demo_app = FastAPI()
+demo_app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+BIG_LIST = [{"id": i, "title": "learn to code", "complete": False} for i in range(200)]
+
+
+@demo_app.get("/big")
+async def big():
+    return BIG_LIST
+
+
+@demo_app.get("/small")
+async def small():
+    return {"Message": "tiny"}
+
+
+@demo_app.get("/stream")
+async def stream():
+    async def lines():
+        for i in range(50):
+            yield f'{{"id": {i}, "title": "streamed todo"}}\n'
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@demo_app.get("/tagged")
+async def tagged():
+    return JSONResponse(BIG_LIST, headers={"ETag": '"v1"', "Vary": "Authorization"})
+
+
+@demo_app.get("/events")
+async def events():
+    async def stream_events():
+        for i in range(3):
+            yield f"event: created\ndata: {{\"id\": {i}}}\n\n"
+    return StreamingResponse(stream_events(), media_type="text/event-stream")
+
+
+demo_client = tc(demo_app)
+
+
+# TODO: Test content negotiation through Accept-Encoding
+def test_select_encoding():
+    assert select_encoding("gzip, deflate", supported=["br", "gzip"]) == "gzip"
+    assert select_encoding("gzip;q=0.5, br", supported=["br", "gzip"]) == "br"
+    assert select_encoding("br;q=0.5, gzip;q=0.5", supported=["br", "gzip"]) == "br"
+    assert select_encoding("*", supported=["gzip"]) == "gzip"
+    assert select_encoding("gzip;q=0", supported=["gzip"]) is None
+    assert select_encoding("", supported=["gzip"]) is None
+
+
+# TODO: Large JSON responses are compressed
+def test_large_response_is_compressed():
+    res = demo_client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert res.status_code == 200
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.headers["vary"] == "Accept-Encoding"
+    assert int(res.headers["content-length"]) < len(res.content)
+    assert res.json() == BIG_LIST
+
+
+# TODO: Small responses and clients without gzip get the raw body
+def test_small_or_unaccepted_response_is_not_compressed():
+    res = demo_client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in res.headers
+
+    res = demo_client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in res.headers
+    assert res.json() == BIG_LIST
+
+
+# TODO: Streaming responses are compressed chunk by chunk
+def test_streaming_response_is_compressed():
+    res = demo_client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert "content-length" not in res.headers
+    assert len(res.text.splitlines()) == 50
+
+
+# TODO: The Todo app root stays uncompressed (below the threshold)
+def test_app_root_not_compressed():
+    res = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in res.headers
+    assert res.json() == {"Message": "Welcome to Todo App V0.0"}
+
+
+# TODO: The app's Vary is kept and its strong ETag weakened on a compressed body
+def test_compressed_response_headers():
+    res = demo_client.get("/tagged", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.headers["vary"] == "Authorization, Accept-Encoding"
+    assert res.headers["etag"] == 'W/"v1"'
+
+
+# TODO: Event streams are never compressed
+def test_event_stream_not_compressed():
+    res = demo_client.get("/events", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in res.headers
+    assert res.text.count("event: created") == 3
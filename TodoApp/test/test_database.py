@@ -0,0 +1,39 @@
+from typing import Annotated
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient as tc
+from .utils import *
+from ..database import LazySession, get_db
+from ..metrics import metrics
+
+
+# TODO: The session is only created on first use
+def test_lazy_session_opens_on_first_use(test_todo):
+    db = LazySession(TestingSessionLocal)
+    assert db.opened is False
+
+    assert db.query(Todos).count() == 1
+    assert db.opened is True
+    assert db.checkouts == 1
+
+    db.close()
+
+
+# TODO: Every dependency in one request shares the same lazy session
+def test_get_db_shared_within_request():
+    demo_app = FastAPI()
+
+    def other_dependency(db: Annotated[object, Depends(get_db)]):
+        return db
+
+    @demo_app.get("/shared")
+    async def shared(db: Annotated[object, Depends(get_db)], other: Annotated[object, Depends(other_dependency)]):
+        return {"same": db is other, "opened": db.opened}
+
+    metrics.reset()
+    res = tc(demo_app).get("/shared")
+
+    # One session object, never opened because the handler did not use it
+    assert res.json() == {"same": True, "opened": False}
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"].get("db.sessions_opened", 0) == 0
+    assert snapshot["histograms"]["db.checkouts_per_request"]["max"] == 0
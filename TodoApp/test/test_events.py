@@ -0,0 +1,90 @@
+import asyncio
+import json
+from .utils import *
+from ..routers.todos import get_db, get_current_user, stream_todo_events
+from ..events import EventHub, event_hub, HEARTBEAT, RESYNC
+import pytest
+
+# Dependency overrides for testing purposes
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+# TODO: Events only reach the streams of their owner
+@pytest.mark.asyncio
+async def test_publish_fans_out_per_user():
+    hub = EventHub(queue_size=10, heartbeat_interval=5)
+    first, second, other = hub.subscribe(1), hub.subscribe(1), hub.subscribe(2)
+    streams = [hub.stream(sub) for sub in (first, second, other)]
+    for stream in streams:
+        assert await stream.__anext__() == b": connected\n\n"
+
+    hub.publish(1, "created", {"id": 7, "version": 3})
+
+    for stream in streams[:2]:
+        message = await stream.__anext__()
+        assert message.startswith(b"id: 3\nevent: created\ndata: ")
+        assert json.loads(message.split(b"data: ")[1]) == {"id": 7, "version": 3}
+    assert other.queue.empty()
+
+    for stream in streams:
+        await stream.aclose()
+    assert hub.subscriber_count() == 0
+
+
+# TODO: Idle streams get keep-alive comments
+@pytest.mark.asyncio
+async def test_heartbeat_on_idle_stream():
+    hub = EventHub(queue_size=10, heartbeat_interval=0.01)
+    stream = hub.stream(hub.subscribe(1))
+    await stream.__anext__()
+
+    assert await stream.__anext__() == HEARTBEAT
+    await stream.aclose()
+
+
+# TODO: A slow consumer is cut off with a resync event
+@pytest.mark.asyncio
+async def test_slow_consumer_gets_resync():
+    hub = EventHub(queue_size=2, heartbeat_interval=5)
+    subscriber = hub.subscribe(1)
+    stream = hub.stream(subscriber)
+    await stream.__anext__()
+
+    for i in range(5):
+        hub.publish(1, "updated", {"id": i})
+
+    assert subscriber.overflowed is True
+    assert await stream.__anext__() == RESYNC
+    with pytest.raises(StopAsyncIteration):
+        await stream.__anext__()
+    assert not hub.has_subscribers(1)
+
+
+# TODO: The todo handlers publish create, update and delete events
+def test_handlers_publish_events(test_todo):
+    subscriber = event_hub.subscribe(1)
+    try:
+        client.post("/todo", json={"title": "Evented", "description": "published", "priority": 2, "complete": False})
+        client.put("/todo/1", json={"title": "learn to code", "description": "changed", "priority": 3, "complete": True})
+        client.delete("/admin/todo/2")
+
+        events = []
+        while not subscriber.queue.empty():
+            events.append(subscriber.queue.get_nowait())
+        assert [event.split(b"event: ")[1].split(b"\n")[0] for event in events] == [b"created", b"updated", b"deleted"]
+    finally:
+        event_hub.unsubscribe(subscriber)
+
+
+# TODO: The /todo/events response only subscribes once its body is streamed
+@pytest.mark.asyncio
+async def test_events_endpoint_subscribes_in_the_body():
+    response = await stream_todo_events({"username": "Hassan", "id": 1, "user_role": "admin"})
+    # A client gone before the body starts leaves no subscriber behind
+    assert not event_hub.has_subscribers(1)
+
+    assert await response.body_iterator.__anext__() == b": connected\n\n"
+    assert event_hub.has_subscribers(1)
+    await response.body_iterator.aclose()
+    assert not event_hub.has_subscribers(1)
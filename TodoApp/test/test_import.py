@@ -0,0 +1,59 @@
+import json
+from .utils import *
+from ..routers.todos import get_db, get_current_user
+from ..changes import current_version
+from fastapi import status
+
+# Dependency overrides for testing purposes
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+# TODO: Define a test case for a CSV import with invalid rows
+def test_import_csv(test_todo):
+    body = (
+        "title,description,priority,complete\r\n"
+        "Buy milk,From the shop,2,false\r\n"
+        "\"Multi\nline\",\"with, comma\",5,true\r\n"
+        "Bad priority,Out of range,9,false\r\n"
+        "Too,few\r\n"
+        "Call mom,Sunday,3,no\r\n"
+    )
+    res = client.post("/todo/import", content=body.encode(), headers={"Content-Type": "text/csv"})
+
+    assert res.status_code == status.HTTP_200_OK
+    summary = res.json()
+    assert summary["rows"] == 5 and summary["imported"] == 3 and summary["failed"] == 2
+    assert summary["completed"] is True
+    assert [error["line"] for error in summary["errors"]] == [5, 6]
+    assert "priority" in summary["errors"][0]["detail"]
+
+    db = TestingSessionLocal()
+    imported = db.query(Todos).filter(Todos.id > 1).order_by(Todos.id).all()
+    assert [todo.title for todo in imported] == ["Buy milk", "Multi\nline", "Call mom"]
+    assert imported[1].description == "with, comma" and imported[1].complete is True
+    # Every imported todo got its own change version
+    assert [todo.version for todo in imported] == [2, 3, 4]
+    assert current_version(db) == 4
+
+
+# TODO: Define a test case for an NDJSON import
+def test_import_ndjson(test_todo):
+    lines = [json.dumps({"title": f"todo {i}", "description": "imported", "priority": 1, "complete": False})
+             for i in range(1200)]
+    lines.insert(10, "{not json")
+    res = client.post("/todo/import", params={"format": "ndjson"}, content="\n".join(lines).encode())
+
+    summary = res.json()
+    assert summary["imported"] == 1200 and summary["failed"] == 1
+    assert summary["errors"][0]["line"] == 11
+    assert summary["batches"] == 3
+
+    db = TestingSessionLocal()
+    assert db.query(Todos).count() == 1201
+
+
+# TODO: Define a test case for an unsupported body
+def test_import_unsupported_type(test_todo):
+    res = client.post("/todo/import", json=[{"title": "x"}])
+    assert res.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
@@ -0,0 +1,137 @@
+import os
+import sqlalchemy as sa
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from ..migration_helpers import chunked_backfill, online_rebuild_table, load_progress
+import pytest
+
+
+@pytest.fixture
+def big_engine(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'migrate.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE items (id INTEGER PRIMARY KEY, title VARCHAR, version INTEGER)")
+        connection.exec_driver_sql("CREATE INDEX ix_items_version ON items (version)")
+        connection.execute(sa.text("INSERT INTO items (title, version) VALUES (:title, :version)"),
+                           [{"title": f"item {i}", "version": None if i % 2 else i} for i in range(1, 101)])
+    yield engine
+    engine.dispose()
+
+
+items = sa.table("items", sa.column("id"), sa.column("title"), sa.column("version"))
+
+
+# TODO: A backfill runs in chunks and resumes after an interruption
+def test_chunked_backfill_resumes(big_engine):
+    chunks = []
+
+    def interrupt_after_two_chunks(*args):
+        chunks.append(args)
+        if len(chunks) == 2:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        chunked_backfill("items_version", items, {"version": 0}, where=items.c.version.is_(None),
+                         chunk_size=10, pause_ms=0, bind=big_engine, log=interrupt_after_two_chunks)
+
+    with big_engine.connect() as connection:
+        assert connection.execute(sa.text("SELECT count(*) FROM items WHERE version IS NULL")).scalar() == 40
+        assert load_progress(connection, "items_version")["last_key"] == 20
+
+    # Second run continues from id 20 and finishes
+    rows = chunked_backfill("items_version", items, {"version": 0}, where=items.c.version.is_(None),
+                            chunk_size=10, pause_ms=0, bind=big_engine, log=lambda *args: None)
+    assert rows == 50
+    with big_engine.connect() as connection:
+        assert connection.execute(sa.text("SELECT count(*) FROM items WHERE version IS NULL")).scalar() == 0
+        assert load_progress(connection, "items_version")["done"]
+
+
+# TODO: A rebuild keeps the writes made while it copies
+def test_online_rebuild_table_mirrors_writes(big_engine):
+    new_items = sa.Table(
+        "items_new", sa.MetaData(),
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("title", sa.String, nullable=False),
+        sa.Column("version", sa.Integer),
+        sa.Column("archived", sa.Boolean, nullable=False, server_default=sa.false()),
+        sa.Index("ix_items_title_v2", "title"),
+    )
+    progress = []
+
+    def write_during_copy(*args):
+        progress.append(args)
+        if len(progress) == 1:
+            # Writes by the app while the copy is running: on copied rows, on rows not copied yet, new rows
+            with big_engine.begin() as connection:
+                connection.exec_driver_sql("UPDATE items SET title = 'renamed' WHERE id = 5")
+                connection.exec_driver_sql("UPDATE items SET title = 'renamed too' WHERE id = 80")
+                connection.exec_driver_sql("DELETE FROM items WHERE id = 90")
+                connection.exec_driver_sql("INSERT INTO items (title, version) VALUES ('new', 7)")
+
+    rows = online_rebuild_table("items_v2", "items", new_items, chunk_size=25, pause_ms=0,
+                                bind=big_engine, log=write_during_copy)
+
+    with big_engine.connect() as connection:
+        inspector = sa.inspect(connection)
+        assert not inspector.has_table("items_new")
+        assert {column["name"] for column in inspector.get_columns("items")} == {"id", "title", "version", "archived"}
+        assert [index["name"] for index in inspector.get_indexes("items")] == ["ix_items_title_v2"]
+        titles = dict(connection.execute(sa.text("SELECT id, title FROM items")).all())
+    assert len(titles) == 100  # 100 - 1 deleted + 1 inserted
+    assert titles[5] == "renamed" and titles[80] == "renamed too" and titles[101] == "new"
+    assert 90 not in titles
+    assert rows > 0
+
+
+# TODO: `alembic upgrade head` runs the whole chain on a database of the baseline schema
+def test_upgrade_head_from_baseline(tmp_path):
+    url = f"sqlite:///{tmp_path / 'baseline.db'}"
+    engine = sa.create_engine(url)
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR UNIQUE, username VARCHAR, first_name VARCHAR, "
+            "last_name VARCHAR, hashed_password VARCHAR, is_active BOOLEAN, role VARCHAR)")
+        connection.exec_driver_sql(
+            "CREATE TABLE todos (id INTEGER PRIMARY KEY, title VARCHAR, description VARCHAR, priority INTEGER, "
+            "complete BOOLEAN, owner_id INTEGER REFERENCES users (id))")
+        connection.exec_driver_sql("CREATE INDEX ix_todos_id ON todos (id)")
+        connection.exec_driver_sql("INSERT INTO users (id, username, is_active, role) VALUES (1, 'Hassan', 1, 'user')")
+        connection.exec_driver_sql("INSERT INTO todos (title, priority, complete, owner_id) VALUES "
+                                   "('old todo', 1, 0, 1), ('old done todo', 2, 1, 1)")
+
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    config = Config()
+    config.set_main_option("script_location", os.path.join(app_dir, "alembic"))
+    config.set_main_option("prepend_sys_path", app_dir)
+    config.set_main_option("sqlalchemy.url", url)
+    command.upgrade(config, "head")
+
+    with engine.connect() as connection:
+        rows = connection.execute(sa.text("SELECT version, updated_at FROM todos")).all()
+        revision = connection.execute(sa.text("SELECT version_num FROM alembic_version")).scalar_one()
+        todos_sql = connection.execute(sa.text("SELECT sql FROM sqlite_master WHERE name = 'todos'")).scalar_one()
+        indexes = {index["name"] for index in sa.inspect(connection).get_indexes("todos")}
+    engine.dispose()
+    # The todos created before versioning are seen by delta sync and archival
+    assert len(rows) == 2 and all(version == 0 and updated_at is not None for version, updated_at in rows)
+    assert revision == ScriptDirectory.from_config(config).get_current_head()
+    # Rebuilt with AUTOINCREMENT (ids are never reused), under the index names of the models
+    assert "AUTOINCREMENT" in todos_sql
+    assert indexes == {"ix_todos_id", "ix_todos_owner_id_version", "ix_todos_owner_id_complete_priority"}
+
+    # The downgrade rebuilds the plain table under the same indexes, and upgrading again works
+    def todos_schema():
+        with engine.connect() as connection:
+            todos_sql = connection.execute(sa.text("SELECT sql FROM sqlite_master WHERE name = 'todos'")).scalar_one()
+            indexes = {index["name"] for index in sa.inspect(connection).get_indexes("todos")}
+            sequence = connection.execute(sa.text("SELECT seq FROM sqlite_sequence WHERE name = 'todos'")).scalar()
+            count = connection.execute(sa.text("SELECT count(*) FROM todos")).scalar_one()
+        engine.dispose()
+        return "AUTOINCREMENT" in todos_sql, indexes, sequence, count
+
+    command.downgrade(config, "f0c3b8a61e27")
+    assert todos_schema() == (False, indexes, None, 2)
+    command.upgrade(config, "head")
+    assert todos_schema() == (True, indexes, 2, 2)
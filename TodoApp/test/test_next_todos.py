@@ -0,0 +1,52 @@
+from .utils import *
+from ..routers.todos import get_db, get_current_user
+from ..next_cache import NextTodosCache, next_todos_cache
+from fastapi import status
+import pytest
+
+# Dependency overrides for testing purposes
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+def todo(todo_id, priority, complete=False):
+    return {"id": todo_id, "priority": priority, "complete": complete}
+
+
+# TODO: The cache follows writes and knows when its prefix is too short
+def test_next_cache_apply():
+    cache = NextTodosCache(enabled=True, depth=3)
+    cache.fill(1, [todo(1, 5), todo(2, 4), todo(3, 4), todo(4, 1)])  # depth + 1 rows: a partial prefix
+
+    assert [t["id"] for t in cache.get(1, 3)] == [1, 2, 3]
+    assert cache.get(1, 4) is None
+
+    cache.apply(1, todo(5, 5))  # ranks inside the prefix, the last one drops out
+    assert [t["id"] for t in cache.get(1, 3)] == [1, 5, 2]
+    cache.apply(1, todo(6, 1))  # ranks below the prefix, cannot be placed
+    assert [t["id"] for t in cache.get(1, 3)] == [1, 5, 2]
+    cache.apply(1, todo(1, 5, complete=True))  # completed todos leave
+    cache.apply(1, todo_id=5)  # deleted todos leave
+    assert [t["id"] for t in cache.get(1, 1)] == [2]
+    assert cache.get(1, 2) is None  # the prefix is too short now, reload
+
+
+# TODO: Define a test case for GET /todo/next
+def test_read_next_todos(test_todo, monkeypatch):
+    monkeypatch.setattr(next_todos_cache, "enabled", True)
+    for title, priority, complete in (("urgent", 5, False), ("done", 5, True), ("later", 1, False)):
+        client.post("/todo", json={"title": title, "description": "next test", "priority": priority, "complete": complete})
+
+    res = client.get("/todo/next", params={"n": 2})
+    assert res.status_code == status.HTTP_200_OK
+    assert [t["title"] for t in res.json()] == ["urgent", "learn to code"]
+
+    # Served from the cache, which follows the writes
+    client.put("/todo/1", json={"title": "learn to code", "description": "need to learn everyday!",
+                                "priority": 3, "complete": True})
+    hits = next_todos_cache.hits
+    res = client.get("/todo/next", params={"n": 2})
+    assert [t["title"] for t in res.json()] == ["urgent", "later"]
+    assert next_todos_cache.hits == hits + 1
+
+    assert client.get("/todo/next", params={"n": 0}).status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
@@ -0,0 +1,53 @@
+from .utils import *
+from ..routers.auth import get_db
+from .. import passwords
+from ..passwords import password_context
+from fastapi import status
+import warnings
+
+# TODO: Override get_db dependency in app
+app.dependency_overrides[get_db] = override_get_db
+
+
+# TODO: The calibrated cost is the highest one fitting the target, within bounds
+def test_rounds_for():
+    # 10 ms at cost 8: cost 12 takes 160 ms, cost 13 takes 320 ms
+    assert passwords.rounds_for(250, 10, probe_rounds=8, min_rounds=4, max_rounds=20) == 12
+    assert passwords.rounds_for(320, 10, probe_rounds=8, min_rounds=4, max_rounds=20) == 13
+    # Clamped to the configured bounds
+    assert passwords.rounds_for(1, 10, probe_rounds=8, min_rounds=10, max_rounds=20) == 10
+    assert passwords.rounds_for(10**9, 10, probe_rounds=8, min_rounds=4, max_rounds=14) == 14
+
+
+# TODO: The calibration hashes without passlib's deprecated per-call settings
+def test_measure_ms_without_deprecation_warning():
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        assert passwords.measure_ms(rounds=4, repeat=1) > 0
+    assert not [warning for warning in caught if issubclass(warning.category, DeprecationWarning)]
+    assert passwords.hash_with_rounds("123", 4).startswith("$2b$04$")
+
+
+# TODO: A login with an outdated hash stores a new one at the current cost
+def test_login_rehashes_outdated_hash(test_user):
+    db = TestingSessionLocal()
+    db.execute(text("UPDATE users SET hashed_password = :h"), {"h": passwords.hash_with_rounds("123", 4)})
+    db.commit()
+    passwords.configure(5)
+    try:
+        res = client.post("/auth/token", data={"username": "Hassan", "password": "123"})
+        assert res.status_code == status.HTTP_200_OK
+
+        # The background task ran after the response
+        db.expire_all()
+        stored = db.query(Users).filter(Users.id == test_user.id).first().hashed_password
+        assert stored.startswith("$2b$05$")
+        assert password_context.verify("123", stored)
+        assert not password_context.needs_update(stored)
+
+        # Stronger hashes are kept as they are
+        passwords.configure(4)
+        assert not password_context.needs_update(stored)
+    finally:
+        passwords.configure(passwords.DEFAULT_ROUNDS)
+        db.close()
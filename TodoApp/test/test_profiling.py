@@ -0,0 +1,77 @@
+import asyncio
+import hashlib
+import json
+import threading
+from .utils import *
+from ..routers.admin import get_db, get_current_user
+from ..routers.auth import _create_access_token
+from datetime import timedelta
+from ..profiling import Sampler, profiler_state
+from fastapi import status
+import pytest
+
+# Dependency overrides for testing purposes
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+@pytest.fixture
+def profiling(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiler_state, "enabled", True)
+    monkeypatch.setattr(profiler_state, "directory", str(tmp_path))
+    monkeypatch.setattr(profiler_state, "interval_ms", 1)
+    yield profiler_state
+    profiler_state.recent.clear()
+
+
+def bearer(role):
+    # The middleware decodes the real token, the route dependency override does not apply to it
+    return {"Authorization": f"Bearer {_create_access_token('Hassan', 1, role, timedelta(minutes=5))}"}
+
+
+def burn_cpu():
+    digest = b""
+    for _ in range(20000):
+        digest = hashlib.sha256(digest).digest()
+    return digest
+
+
+# TODO: The sampler records the profiled task on the loop and busy worker threads
+@pytest.mark.asyncio
+async def test_sampler_records_loop_and_workers():
+    sampler = Sampler(asyncio.get_running_loop(), threading.get_ident(), asyncio.current_task(), interval_ms=1)
+    sampler.start()
+    burn_cpu()
+    await asyncio.to_thread(burn_cpu)
+    sampler.stop()
+
+    stacks = sampler.collapsed()
+    assert "[event loop]" in stacks and "burn_cpu" in stacks
+    assert "[worker]" in stacks
+    profile = sampler.speedscope("test")
+    assert profile["profiles"][0]["samples"] and profile["shared"]["frames"]
+
+
+# TODO: A flagged admin request is profiled and listed
+def test_profile_requested_by_admin(test_todo, profiling):
+    res = client.get("/todo", headers={"X-Profile": "1", **bearer("admin")})
+    assert res.status_code == status.HTTP_200_OK
+
+    profiles = client.get("/admin/profiles").json()["profiles"]
+    assert len(profiles) == 1
+    assert profiles[0]["path"] == "/todo" and profiles[0]["reason"] == "requested" and profiles[0]["status"] == 200
+
+    res = client.get(f"/admin/profiles/{profiles[0]['id']}")
+    assert res.status_code == status.HTTP_200_OK
+    assert json.loads(res.content)["profiles"][0]["type"] == "sampled"
+    res = client.get(f"/admin/profiles/{profiles[0]['id']}", params={"format": "collapsed"})
+    assert res.status_code == status.HTTP_200_OK
+
+
+# TODO: Requests are not profiled without the header, or for other users
+def test_profile_not_requested(test_todo, profiling):
+    client.get("/todo", headers=bearer("admin"))
+    client.get("/todo", headers={"X-Profile": "1", **bearer("user")})
+    # The admin override of the routes does not make the middleware profile a request without a token
+    client.get("/todo", headers={"X-Profile": "1"})
+    assert len(profiler_state.recent) == 0
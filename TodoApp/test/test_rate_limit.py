@@ -0,0 +1,111 @@
+import asyncio
+from .utils import *
+from ..routers.auth import get_db
+from ..rate_limit import TokenBucketLimiter, ConcurrencyLimiter, ip_limiter
+from fastapi import HTTPException
+import pytest
+
+# TODO: Override get_db dependency in app
+app.dependency_overrides[get_db] = override_get_db
+
+
+# TODO: Buckets allow a burst, then ask the caller to come back later
+def test_token_bucket_burst_and_retry_after():
+    limiter = TokenBucketLimiter("test", rate=1, burst=3)
+
+    assert [limiter.acquire("1.2.3.4") for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("1.2.3.4") > 0
+
+    # Other keys have their own bucket
+    assert limiter.acquire("5.6.7.8") == 0
+
+    with pytest.raises(HTTPException) as excinfo:
+        limiter.check("1.2.3.4")
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.headers["Retry-After"] == "1"
+
+
+# TODO: The number of tracked keys is bounded
+def test_token_bucket_bounded_keys():
+    limiter = TokenBucketLimiter("test", rate=1, burst=1, max_keys=10)
+    for i in range(100):
+        limiter.acquire(f"user-{i}")
+    assert len(limiter._buckets) == 10
+
+
+# TODO: Callers over the queue size are refused with a 503
+@pytest.mark.asyncio
+async def test_concurrency_limiter_rejects_when_queue_full():
+    limiter = ConcurrencyLimiter("test", limit=1, max_queue=1, timeout=1)
+    release = asyncio.Event()
+
+    async def hold_slot():
+        async with limiter:
+            await release.wait()
+
+    holder = asyncio.create_task(hold_slot())
+    await asyncio.sleep(0.01)
+    waiter = asyncio.create_task(hold_slot())
+    await asyncio.sleep(0.01)
+
+    # One running, one queued: the next caller is turned away immediately
+    with pytest.raises(HTTPException) as excinfo:
+        async with limiter:
+            pass
+    assert excinfo.value.status_code == 503
+    assert "Retry-After" in excinfo.value.headers
+
+    release.set()
+    await asyncio.gather(holder, waiter)
+    assert limiter.active == 0
+
+
+# TODO: Callers waiting longer than the timeout get a 503
+@pytest.mark.asyncio
+async def test_concurrency_limiter_wait_timeout():
+    limiter = ConcurrencyLimiter("test", limit=1, max_queue=10, timeout=0.01)
+
+    async with limiter:
+        with pytest.raises(HTTPException) as excinfo:
+            async with limiter:
+                pass
+    assert excinfo.value.status_code == 503
+
+
+# TODO: Timed out and cancelled waiters never keep a slot
+@pytest.mark.asyncio
+async def test_concurrency_limiter_does_not_leak_slots():
+    limiter = ConcurrencyLimiter("test", limit=2, max_queue=100, timeout=0.005)
+
+    async def hold_slot(delay):
+        async with limiter:
+            await asyncio.sleep(delay)
+
+    for _ in range(20):
+        tasks = [asyncio.create_task(hold_slot(0.005)) for _ in range(6)]
+        await asyncio.sleep(0.003)
+        tasks[-1].cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Both slots are still free
+    assert limiter.active == 0 and limiter.waiting == 0
+    async with limiter:
+        async with limiter:
+            assert not limiter._semaphore._waiters
+
+
+# TODO: The login endpoint answers 429 once the client IP is over its limit
+def test_login_rate_limited_per_ip():
+    burst, rate = ip_limiter.burst, ip_limiter.rate
+    ip_limiter.burst, ip_limiter.rate = 2, 0.01
+    ip_limiter.clear()
+    try:
+        codes = [client.post("/auth/token", data={"username": "nobody", "password": "x"}).status_code for _ in range(3)]
+        assert codes[:2] == [401, 401]
+        assert codes[2] == 429
+
+        res = client.post("/auth/token", data={"username": "nobody", "password": "x"})
+        assert int(res.headers["Retry-After"]) > 0
+    finally:
+        ip_limiter.burst, ip_limiter.rate = burst, rate
+        ip_limiter.clear()
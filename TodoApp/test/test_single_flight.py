@@ -0,0 +1,86 @@
+import asyncio
+import json
+from .utils import *
+from ..routers.admin import get_db, get_current_user
+from ..single_flight import SingleFlight, coalesced_json
+from starlette.requests import Request
+import time
+from fastapi import status
+import pytest
+
+# Dependency overrides for testing purposes
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+# TODO: Concurrent identical calls share one execution
+@pytest.mark.asyncio
+async def test_concurrent_calls_are_coalesced():
+    flight = SingleFlight("test")
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return [1, 2, 3]
+
+    results = await asyncio.gather(*[flight.do("key", load) for _ in range(10)])
+
+    assert calls == 1
+    assert results == [[1, 2, 3]] * 10
+    assert flight.stats()["coalescing_ratio"] == 0.9
+
+    # Nothing is cached once the call has finished
+    await flight.do("key", load)
+    assert calls == 2
+    assert flight.stats()["in_flight"] == 0
+
+
+# TODO: Different keys run separately and errors reach every waiter
+@pytest.mark.asyncio
+async def test_keys_and_errors():
+    flight = SingleFlight("test")
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("query failed")
+
+    async def ok():
+        return "ok"
+
+    results = await asyncio.gather(flight.do("a", fail), flight.do("a", fail), flight.do("b", ok),
+                                   return_exceptions=True)
+    assert isinstance(results[0], ValueError) and isinstance(results[1], ValueError)
+    assert results[2] == "ok"
+
+
+# TODO: The admin list still returns the plain JSON list
+def test_admin_read_all_coalesced_response(test_todo):
+    res = client.get("/admin/todo")
+    assert res.status_code == status.HTTP_200_OK
+    assert res.headers["content-type"] == "application/json"
+    assert [todo["id"] for todo in res.json()] == [1]
+
+
+# TODO: The shared load has its own session, cancelling the first caller does not break the others
+@pytest.mark.asyncio
+async def test_coalesced_load_survives_first_caller(test_todo):
+    request = Request({"type": "http", "method": "GET", "path": "/admin/todo", "query_string": b"", "headers": []})
+    sessions = []
+
+    def load(session):
+        sessions.append(session)
+        time.sleep(0.05)  # The first request goes away meanwhile
+        return session.query(Todos).all()
+
+    first = asyncio.create_task(coalesced_json(request, "admin", engine, load))
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(coalesced_json(request, "admin", engine, load))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    response = await follower
+    assert [todo["id"] for todo in json.loads(response.body)] == [1]
+    # One load, in a session closed once it was done
+    assert len(sessions) == 1 and not sessions[0].in_transaction()
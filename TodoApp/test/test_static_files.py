@@ -0,0 +1,78 @@
+import os
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from ..static_files import PrecompressedStaticFiles, IMMUTABLE_CACHE_CONTROL
+from ..build_static import precompress
+import pytest
+
+SCRIPT = "function hello() { return 'hello from the static files'; }\n" * 50
+
+
+@pytest.fixture
+def static_client(tmp_path):
+    (tmp_path / "app.js").write_text(SCRIPT)
+    (tmp_path / "app.3f9a1c2e.js").write_text(SCRIPT)
+    (tmp_path / "big.txt").write_text("x" * 100_000)
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG" + bytes(1000))
+    precompress(str(tmp_path), log=lambda line: None)
+
+    static_app = FastAPI()
+    files = PrecompressedStaticFiles(directory=str(tmp_path), cache_file_max=64 * 1024)
+    static_app.mount("/static", files)
+    yield TestClient(static_app), files, tmp_path
+
+
+# TODO: The build step writes smaller variants, only for compressible files
+def test_precompress(static_client):
+    _, _, directory = static_client
+    assert os.path.getsize(directory / "app.js.gz") < len(SCRIPT)
+    assert not (directory / "logo.png.gz").exists()
+    # Up-to-date variants are not written again
+    assert precompress(str(directory), log=lambda line: None)[0] == 0
+
+
+# TODO: The precompressed variant is served with its own strong ETag
+def test_serves_precompressed_variant(static_client):
+    client, files, _ = static_client
+    res = client.get("/static/app.js", headers={"Accept-Encoding": "gzip"})
+
+    assert res.status_code == 200
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.headers["vary"] == "Accept-Encoding"
+    assert res.headers["etag"].endswith('-gzip"')
+    assert res.headers["content-type"].startswith(("text/javascript", "application/javascript"))
+    assert res.text == SCRIPT
+
+    res = client.get("/static/app.js", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in res.headers
+    assert res.headers["cache-control"] == "public, no-cache"
+    assert files.stats()["cached_bytes"] > 0
+
+
+# TODO: Conditional requests and immutable hashed names
+def test_etag_and_cache_control(static_client):
+    client, _, directory = static_client
+    res = client.get("/static/app.3f9a1c2e.js", headers={"Accept-Encoding": "identity"})
+    assert res.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+    etag = res.headers["etag"]
+    res = client.get("/static/app.3f9a1c2e.js", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.headers["etag"] == etag
+
+    # A changed file gets a new ETag
+    (directory / "app.3f9a1c2e.js").write_text(SCRIPT + "// changed\n")
+    os.utime(directory / "app.3f9a1c2e.js", ns=(1, os.stat(directory / "app.3f9a1c2e.js").st_mtime_ns + 10**9))
+    res = client.get("/static/app.3f9a1c2e.js", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["etag"] != etag
+
+
+# TODO: Large files are streamed from disk
+def test_large_file(static_client):
+    client, files, _ = static_client
+    res = client.get("/static/big.txt", headers={"Accept-Encoding": "identity"})
+    assert res.status_code == 200
+    assert len(res.content) == 100_000
+    assert res.headers["content-length"] == "100000"
+    assert client.get("/static/missing.js").status_code == 404
@@ -26,13 +26,16 @@ def test_read_all_auth(test_todo):
     assert response.status_code == status.HTTP_200_OK
 
     # TODO: Assert the response JSON matches the expected output
-    assert response.json() == [{
+    todos = response.json()
+    assert todos[0].pop("updated_at") is not None
+    assert todos == [{
         "complete": False,
         "title": "learn to code",
         "description": "need to learn everyday!",
         "priority": 3,
         "id": 1,
-        "owner_id": 1
+        "owner_id": 1,
+        "version": 1
     }]
 
 # TODO: Define a test function to test the /todo/1 endpoint with authentication
@@ -47,13 +50,16 @@ def test_read_one_auth(test_todo):
     assert response.status_code == status.HTTP_200_OK
 
     # TODO: Assert the response JSON matches the expected output
-    assert response.json() == {
+    todo = response.json()
+    assert todo.pop("updated_at") is not None
+    assert todo == {
         "complete": False,
         "title": "learn to code",
         "description": "need to learn everyday!",
         "priority": 3,
         "id": 1,
-        "owner_id": 1
+        "owner_id": 1,
+        "version": 1
     }
 
 # TODO: Define a test function to handle not found cases
@@ -102,13 +108,16 @@ def test_create_todo(test_todo):
     assert response.status_code == status.HTTP_200_OK
     
     # TODO: Assert the response JSON matches the expected output
-    assert response.json() == {
+    todo = response.json()
+    assert todo.pop("updated_at") is not None
+    assert todo == {
         "complete": False,
         "title": "New todo",
         "description": "this is new todo",
         "priority": 3,
         "id": 2,  
-        "owner_id": 1
+        "owner_id": 1,
+        "version": 2
     }
 
 # TODO: Define a test function to test updating an existing todo item
@@ -182,4 +191,38 @@ def test_delete_todo_not_found(test_todo):
     
     # Ensure the response status is 204 No Content
     assert response.status_code == 404
-    assert response.json() == {"detail" : "Todo not found."}
\ No newline at end of file
+    assert response.json() == {"detail" : "Todo not found."}
+
+
+# TODO: Define a test function for the delta sync endpoint
+def test_read_todo_changes(test_todo):
+    # Full sync: every todo and the version to continue from
+    res = client.get("/todo/changes")
+    assert res.status_code == status.HTTP_200_OK
+    full = res.json()
+    assert [todo["id"] for todo in full["todos"]] == [1]
+    assert full["next_version"] == 1
+    assert full["has_more"] is False
+
+    # Nothing changed since then
+    res = client.get("/todo/changes", params={"since": full["next_version"]})
+    assert res.json()["todos"] == [] and res.json()["deleted"] == []
+
+    # Create, update and delete are reported in order of version
+    client.post("/todo", json={"title": "Second", "description": "second todo", "priority": 2, "complete": False})
+    client.put("/todo/1", json={"title": "learn to code", "description": "updated", "priority": 3, "complete": True})
+    client.post("/todo", json={"title": "Third", "description": "third todo", "priority": 2, "complete": False})
+    client.delete("/todo/3")
+
+    res = client.get("/todo/changes", params={"since": full["next_version"]})
+    changes = res.json()
+    assert [todo["id"] for todo in changes["todos"]] == [2, 1]
+    assert changes["deleted"] == [3]
+    assert changes["next_version"] == 5
+
+    # Paging with a small limit
+    res = client.get("/todo/changes", params={"since": full["next_version"], "limit": 2})
+    page = res.json()
+    assert page["has_more"] is True
+    assert [todo["id"] for todo in page["todos"]] == [2, 1]
+    assert page["next_version"] == 3
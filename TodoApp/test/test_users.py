@@ -1,6 +1,7 @@
 # TODO: Import necessary dependencies
 from .utils import *
 from ..routers.user import get_db, get_current_user
+from ..user_cache import UserCache, user_cache
 from fastapi import status
 
 # TODO: Override get_db and get_current_user dependencies in app
@@ -33,3 +34,37 @@ def test_change_password_invalid_current_password(test_user):
     assert res.status_code == status.HTTP_401_UNAUTHORIZED
     assert res.json() == {"detail": "Error on password change"}
 
+
+
+# TODO: Define test case for the cached user record (no password hash, invalidated on writes)
+def test_return_user_cached(test_user):
+    user_cache.invalidate()
+    res = client.get("/user")
+    assert res.status_code == status.HTTP_200_OK
+    assert "hashed_password" not in res.json()
+
+    # Step 1: The second read is served from the cache
+    hits = user_cache.hits
+    assert client.get("/user").json()["phone_number"] == "(111)111-1111"
+    assert user_cache.hits == hits + 1
+
+    # Step 2: A phone number change (single and batch) is visible right away
+    client.put("/user/phoneNumber", params={"p_phone_number": "(222)222-2222"})
+    assert client.get("/user").json()["phone_number"] == "(222)222-2222"
+    client.post("/batch", json={"operations": [{"op": "change_phone_number", "phone_number": "(333)333-3333"}]})
+    assert client.get("/user").json()["phone_number"] == "(333)333-3333"
+
+
+# TODO: Define test case for the bounds of the user cache
+def test_user_cache_bounds():
+    rows = {user_id: Users(id=user_id, username=f"user{user_id}", hashed_password="secret") for user_id in (1, 2, 3)}
+    cache = UserCache(enabled=True, max_users=2, ttl=60)
+    for user_id in (1, 2, 3):
+        assert cache.get(user_id, rows.get)["username"] == f"user{user_id}"
+    assert cache.stats()["users"] == 2  # user 1 was evicted
+    assert cache.get(99, rows.get) is None
+
+    expired = UserCache(enabled=True, max_users=2, ttl=0)
+    expired.get(1, rows.get)
+    expired.get(1, rows.get)
+    assert expired.hits == 0 and expired.misses == 2
@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+from .utils import *
+from ..routers import todos
+from ..routers.todos import get_db, get_current_user, TodoRequest, _create_todo
+from ..write_batcher import WriteBatcher
+from ..metrics import metrics
+from fastapi import status
+import pytest
+
+# Dependency overrides for testing purposes
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+def _todo_request(title):
+    return TodoRequest(title=title, description="batched todo", priority=2, complete=False)
+
+
+@pytest.fixture
+def clean_todos():
+    yield
+    with engine.connect() as connection:
+        connection.execute(text("DELETE FROM todos;"))
+        connection.commit()
+
+
+# TODO: Concurrent submits are committed together in one batch
+@pytest.mark.asyncio
+async def test_concurrent_writes_share_one_batch(clean_todos):
+    metrics.reset()
+    batcher = WriteBatcher(TestingSessionLocal, max_batch_size=100, max_delay_ms=20)
+
+    results = await asyncio.gather(*[
+        batcher.submit(lambda db, i=i: _create_todo(db, 1, _todo_request(f"todo {i}")))
+        for i in range(10)
+    ])
+
+    # Every caller gets its own committed row back
+    assert sorted(todo.title for todo in results) == [f"todo {i}" for i in range(10)]
+    assert all(todo.id is not None for todo in results)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["write_batcher.batches"] == 1
+    assert snapshot["histograms"]["write_batcher.batch_size"]["max"] == 10
+    # Cumulative buckets: the batch of 10 counts in "16" and every larger bucket
+    buckets = snapshot["histograms"]["write_batcher.batch_size"]["buckets"]
+    assert (buckets["8"], buckets["16"], buckets["32"], buckets["+Inf"]) == (0, 1, 1, 1)
+
+    db = TestingSessionLocal()
+    assert db.query(Todos).count() == 10
+
+
+# TODO: A failing operation only fails its own caller
+@pytest.mark.asyncio
+async def test_failing_write_is_isolated(clean_todos):
+    batcher = WriteBatcher(TestingSessionLocal, max_batch_size=3, max_delay_ms=1000)
+
+    def broken(db):
+        raise ValueError("bad todo")
+
+    results = await asyncio.gather(
+        batcher.submit(lambda db: _create_todo(db, 1, _todo_request("first"))),
+        batcher.submit(broken),
+        batcher.submit(lambda db: _create_todo(db, 1, _todo_request("third"))),
+        return_exceptions=True,
+    )
+
+    assert results[0].title == "first"
+    assert isinstance(results[1], ValueError)
+    assert results[2].title == "third"
+
+    db = TestingSessionLocal()
+    assert db.query(Todos).count() == 2
+
+
+# TODO: The /todo endpoints go through the batcher when it is enabled
+def test_create_and_update_todo_batched(monkeypatch, clean_todos):
+    monkeypatch.setattr(todos, "write_batcher", WriteBatcher(TestingSessionLocal, max_delay_ms=1))
+
+    res = client.post("/todo", json={"title": "Batched", "description": "via batcher", "priority": 4, "complete": False})
+    assert res.status_code == status.HTTP_201_CREATED
+
+    db = TestingSessionLocal()
+    model = db.query(Todos).filter(Todos.title == "Batched").first()
+    assert model is not None
+
+    res = client.put(f"/todo/{model.id}", json={"title": "Batched", "description": "updated", "priority": 4, "complete": True})
+    assert res.status_code == status.HTTP_204_NO_CONTENT
+
+    res = client.put("/todo/999", json={"title": "Batched", "description": "updated", "priority": 4, "complete": True})
+    assert res.status_code == status.HTTP_404_NOT_FOUND
+
+
+# TODO: The batch commits in a worker thread, the event loop keeps running meanwhile
+@pytest.mark.asyncio
+async def test_batch_runs_off_the_event_loop(clean_todos):
+    batcher = WriteBatcher(TestingSessionLocal, max_batch_size=1)
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(asyncio.get_running_loop().time())
+            await asyncio.sleep(0.01)
+
+    def slow(db):
+        time.sleep(0.2)  # A slow commit (fsync) holding the batch
+        return _create_todo(db, 1, _todo_request("slow"))
+
+    _, todo = await asyncio.gather(ticker(), batcher.submit(slow))
+    assert todo.title == "slow"
+    assert max(later - earlier for earlier, later in zip(ticks, ticks[1:])) < 0.1
+
+
+# TODO: Cancelling the writer (shutdown) cancels every waiting caller, not only the batch in flight
+@pytest.mark.asyncio
+async def test_cancelled_writer_releases_every_caller(clean_todos):
+    batcher = WriteBatcher(TestingSessionLocal, max_batch_size=1, max_delay_ms=1000)
+    release = threading.Event()
+
+    def blocked(db):
+        release.wait(5)
+        return _create_todo(db, 1, _todo_request("blocked"))
+
+    submits = [asyncio.ensure_future(batcher.submit(blocked)) for _ in range(3)]
+    await asyncio.sleep(0.05)  # The first batch is in the worker thread, the others wait
+    batcher._writer.cancel()
+    try:
+        async with asyncio.timeout(2):
+            results = await asyncio.gather(*submits, return_exceptions=True)
+    finally:
+        release.set()
+
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+    assert batcher._pending == [] and batcher._timer is None
@@ -7,6 +7,9 @@ from ..models import Todos,Users
 from fastapi.testclient import TestClient as tc
 import pytest 
 from ..routers.auth import bcrypt_context
+from ..next_cache import next_todos_cache
+from ..user_cache import user_cache
+from ..inactive_users import inactive_users
 
 # TODO: Define the test database URL
 SQLALCHEMY_DATABASE_URL = "sqlite:///./testdb.db"  # Test database
@@ -50,6 +53,11 @@ def test_todo():
         complete=False,
         owner_id=1,
     )
+    # TODO: Restart change versions and ids (AUTOINCREMENT never reuses them) so the todo gets version 1 and id 1
+    with engine.connect() as connection:
+        connection.execute(text("DELETE FROM change_counter;"))
+        connection.execute(text("DELETE FROM sqlite_sequence WHERE name = 'todos';"))
+        connection.commit()
     db = TestingSessionLocal()
     # TODO: Add the todo item to the database and commit
     db.add(todo)
@@ -59,7 +67,12 @@ def test_todo():
     # TODO: Clean up the database after the test
     with engine.connect() as connection:
         connection.execute(text("DELETE FROM todos;"))
+        connection.execute(text("DELETE FROM todos_archive;"))
+        connection.execute(text("DELETE FROM todo_tombstones;"))
+        connection.execute(text("DELETE FROM change_counter;"))
         connection.commit()
+    # TODO: Forget the cached todos of the deleted rows
+    next_todos_cache.invalidate()
 
 
 # 
@@ -80,5 +93,8 @@ def test_user() :
     yield user 
     with engine.connect() as connection : 
         connection.execute(text("DELETE FROM users;"))
-        connection.commit() 
+        connection.commit()
+    # TODO: Forget the cached records and the deactivations of the deleted users
+    user_cache.invalidate()
+    inactive_users.clear() 
         
\ No newline at end of file
@@ -0,0 +1,106 @@
+# == Import necessary libraries ==
+import os
+import time
+from collections import OrderedDict
+
+from .bus import bus
+from .metrics import metrics
+from .models import Users
+
+# Settings (can be overridden through environment variables)
+# Enable the in-process cache of user records read by id
+USER_CACHE_ENABLED = os.getenv("TODO_USER_CACHE", "1") == "1"
+# Users kept in the cache (least recently used are evicted)
+USER_CACHE_MAX_USERS = int(os.getenv("TODO_USER_CACHE_MAX_USERS", "10000"))
+# Age after which a cached record is read again, bounds staleness from writes made elsewhere (seconds)
+USER_CACHE_TTL = float(os.getenv("TODO_USER_CACHE_TTL", "60"))
+
+# Columns never kept in the cache
+PRIVATE_COLUMNS = frozenset({"hashed_password"})
+
+
+def user_projection(user: Users) -> dict:
+    """
+    The user's columns, without the password hash (what GET /user returns).
+    """
+    return {column.key: getattr(user, column.key) for column in Users.__table__.columns
+            if column.key not in PRIVATE_COLUMNS}
+
+
+class UserCache:
+    """
+    Sanitized user records by id, for the read paths (GET /user, admin).
+
+    The write handlers (password and phone number changes, user creation)
+    invalidate the user after their commit. A load that raced with an
+    invalidation is not stored, so a reader never puts back the old record.
+    Must be used from the event loop thread.
+    """
+
+    def __init__(self, enabled=USER_CACHE_ENABLED, max_users=USER_CACHE_MAX_USERS, ttl=USER_CACHE_TTL):
+        self.enabled = enabled
+        self.max_users = max_users
+        self.ttl = ttl
+        self._users = OrderedDict()  # user_id -> (loaded_at, projection)
+        self._generation = 0  # bumped by every invalidation
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id, loader):
+        """
+        Returns the projection of the user (None when there is no such user).
+        `loader(user_id)` reads the `Users` row on a miss.
+        """
+        if not self.enabled:
+            user = loader(user_id)
+            return user_projection(user) if user is not None else None
+
+        # Step 1: Fresh cached record
+        cached = self._users.get(user_id)
+        if cached is not None and time.monotonic() - cached[0] < self.ttl:
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            return cached[1]
+
+        # Step 2: Load, store unless the user was invalidated meanwhile
+        self.misses += 1
+        generation = self._generation
+        user = loader(user_id)
+        if user is None:
+            self._users.pop(user_id, None)
+            return None
+        projection = user_projection(user)
+        if generation == self._generation:
+            self._users[user_id] = (time.monotonic(), projection)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return projection
+
+    def invalidate(self, user_id=None, broadcast: bool = True):
+        self._generation += 1
+        self.invalidations += 1
+        if user_id is None:
+            self._users.clear()
+        else:
+            self._users.pop(user_id, None)
+        if broadcast:
+            bus.publish("user_cache.invalidate", user_id=user_id)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "users": len(self._users),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+# Shared cache used by the user, auth and admin routers
+user_cache = UserCache()
+metrics.register_collector("user_cache", user_cache.stats)
+bus.subscribe("user_cache.invalidate", lambda user_id: user_cache.invalidate(user_id, broadcast=False))
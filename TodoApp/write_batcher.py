@@ -0,0 +1,153 @@
+# == Import necessary libraries ==
+import asyncio
+import os
+import time
+
+from fastapi.concurrency import run_in_threadpool
+
+from .database import SessionLocal
+from .metrics import metrics
+
+# Settings (can be overridden through environment variables)
+# Write batching is opt-in, every write commits on its own by default
+WRITE_BATCHING_ENABLED = os.getenv("TODO_WRITE_BATCHING", "0") == "1"
+# Flush as soon as this many writes are waiting ...
+WRITE_BATCH_MAX_SIZE = int(os.getenv("TODO_WRITE_BATCH_MAX_SIZE", "64"))
+# ... or when the oldest waiting write is this old (milliseconds)
+WRITE_BATCH_MAX_DELAY_MS = float(os.getenv("TODO_WRITE_BATCH_MAX_DELAY_MS", "5"))
+
+
+class WriteBatcher:
+    """
+    Group-commit coalescer for write operations.
+
+    Concurrent requests submit an operation (a callable taking a session).
+    Operations collected within `max_delay_ms` (or until `max_batch_size`
+    are waiting) run in one transaction with a single commit, and every
+    caller is resolved with its own result or error.
+
+    A single writer task runs the batches one after the other in a worker
+    thread, so the commit (and its fsync) never blocks the event loop.
+    Writes submitted while a batch is committing form the next batch.
+    """
+
+    def __init__(self, session_factory=SessionLocal, max_batch_size=WRITE_BATCH_MAX_SIZE,
+                 max_delay_ms=WRITE_BATCH_MAX_DELAY_MS, enabled=True):
+        self.session_factory = session_factory
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_delay = max(0.0, max_delay_ms) / 1000
+        self.enabled = enabled
+        self._pending = []  # List of (operation, future, submitted_at)
+        self._timer = None
+        self._writer = None  # Task committing the batches, while there are any
+
+    async def submit(self, operation):
+        """
+        Queues `operation(session)` for the next batch and waits for its result.
+        The returned ORM objects stay readable after the batch session is closed.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((operation, future, time.perf_counter()))
+
+        # Step 1: Flush right away when the batch is full, otherwise arm the timer
+        if len(self._pending) >= self.max_batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self.flush)
+
+        # Step 2: Wait until the batch containing this operation is committed
+        return await future
+
+    def flush(self):
+        """
+        Hands the waiting operations to the writer task (started if it is not running).
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if self._pending and (self._writer is None or self._writer.done()):
+            self._writer = asyncio.get_running_loop().create_task(self._write())
+
+    async def _write(self):
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:len(batch)]
+            try:
+                outcomes = await run_in_threadpool(self._commit, batch)
+            except asyncio.CancelledError:
+                # Server shutdown, the callers must not wait forever: the batch in flight,
+                # the operations still waiting, and no timer starting a new writer
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                for _, future, _ in batch + self._pending:
+                    future.cancel()
+                self._pending.clear()
+                raise
+            self._resolve(batch, outcomes)
+
+    def _commit(self, batch):
+        """
+        Runs a batch in the worker thread, returns a (result, error) pair per operation.
+        """
+        # Step 1: Try the whole batch in a single transaction
+        outcomes = self._run_batch(batch)
+
+        # Step 2: One operation failed, so nothing was committed; run each one
+        # on its own so that only the failing callers get an error
+        if outcomes is None:
+            metrics.inc("write_batcher.fallbacks")
+            outcomes = [self._run_single(operation) for operation, _, _ in batch]
+        return outcomes
+
+    def _resolve(self, batch, outcomes):
+        """
+        Resolves the waiting callers (on the event loop).
+        """
+        now = time.perf_counter()
+        for (_, future, submitted_at), (result, error) in zip(batch, outcomes):
+            metrics.observe("write_batcher.wait_ms", (now - submitted_at) * 1000,
+                            buckets=(1, 2, 5, 10, 20, 50, 100, 250, 500, 1000))
+            if future.done():  # The caller went away (cancelled request)
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        metrics.inc("write_batcher.batches")
+        metrics.inc("write_batcher.items", len(batch))
+        metrics.observe("write_batcher.batch_size", len(batch))
+
+    def _run_batch(self, batch):
+        db = self.session_factory(expire_on_commit=False)
+        try:
+            results = [operation(db) for operation, _, _ in batch]
+            db.commit()
+            return [(result, None) for result in results]
+        except Exception as error:
+            db.rollback()
+            # A lone operation has nothing to retry, report its error directly
+            if len(batch) == 1:
+                return [(None, error)]
+            return None
+        finally:
+            db.close()
+
+    def _run_single(self, operation):
+        db = self.session_factory(expire_on_commit=False)
+        try:
+            result = operation(db)
+            db.commit()
+            return result, None
+        except Exception as error:
+            db.rollback()
+            return None, error
+        finally:
+            db.close()
+
+
+# Shared batcher used by the routers (disabled unless TODO_WRITE_BATCHING=1)
+write_batcher = WriteBatcher(enabled=WRITE_BATCHING_ENABLED)
@@ -0,0 +1,92 @@
+"""
+Small load benchmark comparing requests per second across server modes.
+
+    python bench_http_server.py --clients 16 --duration 5
+
+Each mode is started in a subprocess on 127.0.0.1. Clients are threads
+reusing one connection each (keep-alive), except for the "single" mode
+which closes the connection after every request (HTTP/1.0).
+"""
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "my_http_server.py")
+
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def client_loop(port, method, deadline, counts, index):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    done = 0
+    while time.time() < deadline:
+        try:
+            connection.request(method, "/")
+            response = connection.getresponse()
+            response.read()
+            done += 1
+            if response.will_close:
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    connection.close()
+    counts[index] = done
+
+
+def bench_mode(mode, port, clients, duration, method):
+    process = subprocess.Popen(
+        [sys.executable, SERVER, "--mode", mode, "--host", "127.0.0.1", "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(port)
+        counts = [0] * clients
+        deadline = time.time() + duration
+        threads = [
+            threading.Thread(target=client_loop, args=(port, method, deadline, counts, i))
+            for i in range(clients)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sum(counts) / duration
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--port", type=int, default=19999)
+    parser.add_argument("--method", choices=["GET", "POST"], default="GET")
+    parser.add_argument("--modes", nargs="+", default=["single", "threaded", "asyncio"])
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients, {args.duration:.0f}s per mode, {args.method} /")
+    for offset, mode in enumerate(args.modes):
+        rps = bench_mode(mode, args.port + offset, args.clients, args.duration, args.method)
+        print(f"{mode:<10}{rps:>12,.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
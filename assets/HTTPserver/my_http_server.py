@@ -1,29 +1,216 @@
-from http.server import HTTPServer,BaseHTTPRequestHandler 
+from http.server import HTTPServer, ThreadingHTTPServer, BaseHTTPRequestHandler
+import argparse
+import asyncio
+import os
 import time
-HOST = "192.168.1.7"
-PORT = 9999 
 
-class GamaHTTP(BaseHTTPRequestHandler) : 
-    
-    def do_GET(self) : 
+HOST = os.getenv("GAMA_HTTP_HOST", "0.0.0.0")
+PORT = int(os.getenv("GAMA_HTTP_PORT", "9999"))
+
+# Pre-encoded static responses, built once instead of on every request
+HTML_BODY = b"<html><body><h1>Hello World!</h1></body></html>"
+HTML_HEADERS = (
+    b"Content-Type: text/html\r\n"
+    b"Content-Length: " + str(len(HTML_BODY)).encode() + b"\r\n"
+)
+
+
+class _TimeBody:
+    """
+    `{"time" : "..."}` body, re-encoded at most once per second.
+    """
+
+    def __init__(self):
+        self._second = None
+        self._body = b""
+
+    def get(self):
+        now = int(time.time())
+        if now != self._second:
+            date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+            self._body = bytes('{"time" : "' + date + '"}', "utf-8")
+            self._second = now
+        return self._body
+
+
+time_body = _TimeBody()
+
+
+def parse_content_length(value):
+    """
+    Returns the body length announced by a Content-Length header (0 when absent),
+    or None when the value is not a non-negative integer.
+    """
+    if not value:
+        return 0
+    value = value.strip()
+    if not value.isdigit():  # Also rejects "-1", "+1" and "1 2"
+        return None
+    return int(value)
+
+
+class GamaHTTP(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps the connection open between requests (keep-alive)
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, without TCP_NODELAY the
+    # body waits for the client's delayed ACK (~40ms per request)
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
         self.send_response(200)
-        self.send_header("Content-type","text/html")
-        self.end_headers() 
-        
-        self.wfile.write(bytes("<html><body><h1>Hello World!</h1></body></html>","utf-8"))
-        
-    def do_POST(self): 
+        self.send_header("Content-type", "text/html")
+        self.send_header("Content-Length", str(len(HTML_BODY)))
+        self.end_headers()
+
+        self.wfile.write(HTML_BODY)
+
+    def do_POST(self):
+        # Drain the request body, otherwise it would be read as the next request
+        length = parse_content_length(self.headers.get("Content-Length"))
+        if length is None:
+            # The end of the body is unknown, so is the start of the next request
+            self.close_connection = True
+            self.send_error(400, "Invalid Content-Length")
+            return
+        if length:
+            self.rfile.read(length)
+
+        body = time_body.get()
         self.send_response(200)
         self.send_header("Content-type", "application/json")
-        self.end_headers() 
-        
-        date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time()))
-        
-
-        self.wfile.write(bytes('{"time" : "'+date+'"}',"utf-8 "))
-        
-server  =  HTTPServer((HOST,PORT), GamaHTTP)
-print("Server now running...")
-server.serve_forever() 
-server.server_close()
-print("Server stopped!")
\ No newline at end of file
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Logging every request to stderr costs more than serving it
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class LegacyGamaHTTP(GamaHTTP):
+    # The original behaviour: HTTP/1.0, one connection per request
+    protocol_version = "HTTP/1.0"
+
+
+def run_blocking_server(server_class, handler, host, port, verbose):
+    server = server_class((host, port), handler)
+    server.verbose = verbose
+    print(f"Server now running on {host}:{port} ({server_class.__name__})...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    print("Server stopped!")
+
+
+# == asyncio mode ==
+STATUS_LINE = b"HTTP/1.1 200 OK\r\n"
+NOT_IMPLEMENTED = (
+    b"HTTP/1.1 501 Not Implemented\r\n"
+    b"Content-Length: 0\r\n"
+    b"\r\n"
+)
+BAD_REQUEST = (
+    b"HTTP/1.1 400 Bad Request\r\n"
+    b"Content-Length: 0\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+)
+
+
+async def handle_connection(reader, writer):
+    """
+    Serves requests on one connection until the client closes it
+    or asks for `Connection: close`.
+    """
+    try:
+        while True:
+            # Step 1: Read the request line and headers
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                break
+
+            lines = head.decode("latin-1").split("\r\n")
+            method, _, version = (lines[0].split(" ") + ["", ""])[:3]
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(":")
+                if name:
+                    headers[name.strip().lower()] = value.strip().lower()
+
+            # Step 2: Drain the request body
+            length = parse_content_length(headers.get("content-length"))
+            if length is None:
+                # The end of the body is unknown, so is the start of the next request
+                writer.write(BAD_REQUEST)
+                await writer.drain()
+                break
+            if length:
+                await reader.readexactly(length)
+
+            keep_alive = headers.get("connection") != "close" and (
+                version == "HTTP/1.1" or headers.get("connection") == "keep-alive"
+            )
+            connection = b"Connection: keep-alive\r\n" if keep_alive else b"Connection: close\r\n"
+
+            # Step 3: Write the pre-encoded response
+            if method == "GET":
+                writer.write(STATUS_LINE + HTML_HEADERS + connection + b"\r\n" + HTML_BODY)
+            elif method == "POST":
+                body = time_body.get()
+                writer.write(
+                    STATUS_LINE
+                    + b"Content-Type: application/json\r\n"
+                    + b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+                    + connection + b"\r\n" + body
+                )
+            else:
+                writer.write(NOT_IMPLEMENTED)
+            await writer.drain()
+
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass  # The client went away mid-request
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def run_async_server(host, port):
+    server = await asyncio.start_server(handle_connection, host, port, backlog=1024)
+    print(f"Server now running on {host}:{port} (asyncio)...")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lightweight health / time probe server")
+    parser.add_argument("--host", default=HOST, help="bind address (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=PORT, help="bind port (default: %(default)s)")
+    parser.add_argument("--mode", choices=["threaded", "asyncio", "single"], default="threaded",
+                        help="threaded: one thread per connection, asyncio: event loop, "
+                             "single: the original one-connection-at-a-time server")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    if args.mode == "asyncio":
+        try:
+            asyncio.run(run_async_server(args.host, args.port))
+        except KeyboardInterrupt:
+            print("Server stopped!")
+    elif args.mode == "single":
+        run_blocking_server(HTTPServer, LegacyGamaHTTP, args.host, args.port, args.verbose)
+    else:
+        run_blocking_server(ThreadingHTTPServer, GamaHTTP, args.host, args.port, args.verbose)
+
+
+if __name__ == "__main__":
+    main()